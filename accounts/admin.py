@@ -1,12 +1,32 @@
 from django.contrib import admin
-from .models import Profile
+from django.utils.html import format_html
+
+from qa import renditions
+from .models import Profile, UserStats
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "display_name", "homepage", "created_at")
+    list_display = ("id", "avatar_thumb", "user", "display_name", "homepage", "created_at")
     list_display_links = ("id", "user")
     search_fields = ("user__username", "user__email", "display_name")
     list_filter = ("created_at",)
     date_hierarchy = "created_at"
     readonly_fields = ("created_at",)
     raw_id_fields = ("user",)
+    list_select_related = ("user",)
+
+    @admin.display(description="Аватар")
+    def avatar_thumb(self, obj):
+        if obj.avatar:
+            return format_html('<img src="{}" style="height:32px;width:32px;border-radius:50%" loading="lazy"/>',
+                               renditions.url(obj.avatar, "avatar-64"))
+        return "—"
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ("user", "reputation", "topics_count", "posts_count")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    ordering = ("-reputation",)
+    readonly_fields = ("user", "reputation", "topics_count", "posts_count")
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from qa import caching, renditions
+        from . import signals  # noqa: F401
+        from .models import AVATAR_RENDITIONS, Profile
+        caching.track(get_user_model(), Profile)
+        renditions.register(Profile, "avatar", AVATAR_RENDITIONS)
@@ -0,0 +1,21 @@
+"""Асинхронный рейтинг пользователей (см. qa.async_views)."""
+from asgiref.sync import sync_to_async
+
+from qa import caching
+from qa.async_views import Fallback, json_response
+from . import reputation
+from .views import TopUsersAPIView, leaderboard_data
+
+
+async def leaderboard(request):
+    try:
+        period, limit = TopUsersAPIView.parse(request.query_params)
+    except ValueError:
+        raise Fallback
+
+    async def data():
+        entries = await reputation.aleaderboard(period, limit)
+        # URL аватаров проверяет копии в хранилище (qa.renditions) — это блокирующий ввод-вывод.
+        return await sync_to_async(leaderboard_data)(entries)
+
+    return json_response(*await caching.acached(TopUsersAPIView.get, request, data))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import reputation
+
+
+class Command(BaseCommand):
+    help = "Rebuilds user reputation tables (UserStats, UserStatsDay) from topics and posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        users = reputation.rebuild(batch_size=max(1, opts["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(f"User stats rebuilt: {users}"))
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_user_stats(apps, schema_editor):
+    from accounts.reputation import rebuild
+    rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('qa', '0005_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('reputation', models.IntegerField(default=0, verbose_name='Репутация')),
+                ('topics_count', models.IntegerField(default=0, verbose_name='Тем')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Сообщений')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+                'indexes': [models.Index(fields=['-reputation', '-posts_count'], name='accounts_stats_rep_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStatsDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('reputation', models.IntegerField(default=0, verbose_name='Репутация')),
+                ('topics_count', models.IntegerField(default=0, verbose_name='Тем')),
+                ('posts_count', models.IntegerField(default=0, verbose_name='Сообщений')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats_days', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя за день',
+                'verbose_name_plural': 'Статистика пользователей по дням',
+                'indexes': [models.Index(fields=['day', 'user'], name='accounts_statsday_day_idx')],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,10 @@ from django.utils import timezone
 
 User = get_user_model()
 
+# Размеры аватара (qa.renditions): для списков и для страницы профиля.
+AVATAR_RENDITIONS = ("avatar-64", "avatar-256")
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile", verbose_name="Пользователь")
     display_name = models.CharField("Отображаемое имя", max_length=150, blank=True)
@@ -19,3 +23,46 @@ class Profile(models.Model):
 
     def __str__(self) -> str:
         return self.display_name or f"Профиль {self.user.username}"
+
+
+class UserStats(models.Model):
+    """
+    Репутация пользователя за всё время: сумма рейтингов его тем и сообщений.
+    Поддерживается инкрементально (accounts.reputation), пересобирается
+    командой rebuild_user_stats.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="stats",
+                                verbose_name="Пользователь")
+    reputation = models.IntegerField("Репутация", default=0)
+    topics_count = models.IntegerField("Тем", default=0)
+    posts_count = models.IntegerField("Сообщений", default=0)
+
+    class Meta:
+        verbose_name = "Статистика пользователя"
+        verbose_name_plural = "Статистика пользователей"
+        indexes = [
+            models.Index(fields=["-reputation", "-posts_count"], name="accounts_stats_rep_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Статистика {self.user_id}: {self.reputation}"
+
+
+class UserStatsDay(models.Model):
+    """
+    Вклад пользователя по дням создания тем и сообщений — основа окон
+    «неделя» и «месяц» в рейтинге пользователей.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="stats_days", verbose_name="Пользователь")
+    day = models.DateField("День")
+    reputation = models.IntegerField("Репутация", default=0)
+    topics_count = models.IntegerField("Тем", default=0)
+    posts_count = models.IntegerField("Сообщений", default=0)
+
+    class Meta:
+        verbose_name = "Статистика пользователя за день"
+        verbose_name_plural = "Статистика пользователей по дням"
+        unique_together = (("user", "day"),)
+        indexes = [
+            models.Index(fields=["day", "user"], name="accounts_statsday_day_idx"),
+        ]
@@ -0,0 +1,152 @@
+"""
+Репутация пользователей для рейтинга (leaderboard).
+
+Репутация — сумма рейтингов тем и сообщений пользователя. Таблицы
+``UserStats`` (за всё время) и ``UserStatsDay`` (по дням создания
+контента) меняются инкрементально, в той же транзакции, что и изменение
+рейтинга: при создании/удалении темы или сообщения (qa.signals), при
+голосе (qa.votes) и при сбросе отложенных рейтингов (qa.ratings).
+
+Окна «неделя»/«месяц» считают вклад тем и сообщений, созданных за этот
+период: голос попадает в день создания того, за что проголосовали. Так
+удаление возвращает ровно то, что было начислено, а пересборка с нуля
+(``rebuild``) даёт те же числа.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from qa import caching
+from .models import User, UserStats, UserStatsDay
+
+ALL = "all"
+WEEK = "week"
+MONTH = "month"
+PERIODS = {WEEK: 7, MONTH: 30, ALL: None}
+
+
+def day_of(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def record(user_id, created_at, rating=0, topics=0, posts=0):
+    """Начисляет пользователю изменение за объект, созданный в ``created_at``."""
+    record_many([(user_id, created_at, rating, topics, posts)])
+
+
+def record_many(rows):
+    """rows: (user_id, created_at, rating, topics, posts)."""
+    totals = defaultdict(lambda: [0, 0, 0])
+    days = defaultdict(lambda: [0, 0, 0])
+    for user_id, created_at, rating, topics, posts in rows:
+        if not (rating or topics or posts) or user_id is None:
+            continue
+        for bucket in (totals[user_id], days[(user_id, day_of(created_at))]):
+            bucket[0] += rating
+            bucket[1] += topics
+            bucket[2] += posts
+    if not totals:
+        return
+    with transaction.atomic():
+        _upsert(UserStats, ["user_id"], [(user_id, *values) for user_id, values in totals.items()])
+        _upsert(UserStatsDay, ["user_id", "day"],
+                [(user_id, connection.ops.adapt_datefield_value(day), *values)
+                 for (user_id, day), values in days.items()])
+    caching.bump(UserStats)
+
+
+def _upsert(model, key_columns, rows):
+    """Добавляет значения к существующим строкам или вставляет новые."""
+    value_columns = ["reputation", "topics_count", "posts_count"]
+    if connection.vendor not in ("postgresql", "sqlite"):
+        for row in rows:
+            key = dict(zip(key_columns, row))
+            values = dict(zip(value_columns, row[len(key_columns):]))
+            if not model.objects.filter(**key).update(**{c: F(c) + v for c, v in values.items()}):
+                model.objects.create(**key, **values)
+        return
+
+    table = model._meta.db_table
+    columns = key_columns + value_columns
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+    updates = ", ".join(f"{c} = {table}.{c} + excluded.{c}" for c in value_columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+            f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}",
+            [value for row in rows for value in row])
+
+
+def leaderboard(period=ALL, limit=10):
+    """Топ пользователей: [(user, reputation, topics, posts)], профили подгружены тем же запросом."""
+    days = PERIODS[period]
+    if days is None:
+        return [(s.user, s.reputation, s.topics_count, s.posts_count) for s in top_stats(limit)]
+    rows = list(window_stats(days, limit))
+    users = User.objects.select_related("profile").in_bulk([row["user_id"] for row in rows])
+    return [(users[row["user_id"]], row["rep"], row["topics"], row["posts"]) for row in rows]
+
+
+async def aleaderboard(period=ALL, limit=10):
+    """``leaderboard`` через async ORM (qa.async_views)."""
+    days = PERIODS[period]
+    if days is None:
+        return [(s.user, s.reputation, s.topics_count, s.posts_count) async for s in top_stats(limit)]
+    rows = [row async for row in window_stats(days, limit)]
+    users = await User.objects.select_related("profile").ain_bulk([row["user_id"] for row in rows])
+    return [(users[row["user_id"]], row["rep"], row["topics"], row["posts"]) for row in rows]
+
+
+def top_stats(limit):
+    return (UserStats.objects
+            .select_related("user", "user__profile")
+            .order_by("-reputation", "-posts_count", "user_id")[:limit])
+
+
+def window_stats(days, limit):
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return (UserStatsDay.objects
+            .filter(day__gte=since)
+            .values("user_id")
+            .annotate(rep=Sum("reputation"), topics=Sum("topics_count"), posts=Sum("posts_count"))
+            .order_by("-rep", "-posts", "user_id")[:limit])
+
+
+def rebuild(apps=global_apps, batch_size=5000):
+    """Пересчитывает обе таблицы с нуля по темам и сообщениям."""
+    Topic = apps.get_model("qa", "Topic")
+    Post = apps.get_model("qa", "Post")
+    stats_model = apps.get_model("accounts", "UserStats")
+    day_model = apps.get_model("accounts", "UserStatsDay")
+
+    totals = defaultdict(lambda: [0, 0, 0])
+    days = defaultdict(lambda: [0, 0, 0])
+    for model, slot in ((Topic, 1), (Post, 2)):
+        grouped = (model.objects
+                   .annotate(day=TruncDate("created_at"))
+                   .values("author_id", "day")
+                   .annotate(rating=Sum("rating"), n=Count("id"))
+                   .order_by())
+        for row in grouped.iterator(chunk_size=batch_size):
+            for bucket in (totals[row["author_id"]], days[(row["author_id"], row["day"])]):
+                bucket[0] += row["rating"] or 0
+                bucket[slot] += row["n"]
+
+    with transaction.atomic():
+        day_model.objects.all().delete()
+        stats_model.objects.all().delete()
+        stats_model.objects.bulk_create(
+            (stats_model(user_id=user_id, reputation=r, topics_count=t, posts_count=p)
+             for user_id, (r, t, p) in totals.items()),
+            batch_size=batch_size)
+        day_model.objects.bulk_create(
+            (day_model(user_id=user_id, day=day, reputation=r, topics_count=t, posts_count=p)
+             for (user_id, day), (r, t, p) in days.items()),
+            batch_size=batch_size)
+    caching.bump(stats_model)
+    return len(totals)
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from .models import Profile
+from qa import renditions
+from .models import AVATAR_RENDITIONS, Profile
 
 User = get_user_model()
 
@@ -30,7 +31,14 @@ class RegisterSerializer(serializers.ModelSerializer):
 class ProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
     email = serializers.EmailField(source="user.email", read_only=True)
+    avatar_urls = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ("username", "email", "display_name", "homepage", "avatar", "bio")
+        fields = ("username", "email", "display_name", "homepage", "avatar", "avatar_urls", "bio")
+
+    def get_avatar_urls(self, obj):
+        """Уменьшенные копии аватара по размерам; оригинал — в ``avatar``."""
+        if not obj.avatar:
+            return None
+        return renditions.urls(obj.avatar, AVATAR_RENDITIONS, self.context.get("request"))
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from qa import metrics
+
+REGISTERED = metrics.counter("questudio_users_registered_total", "Зарегистрированные пользователи.")
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def count_registration(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        REGISTERED.inc()
@@ -1,3 +1,129 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from qa import caching, renditions
+from qa.models import Category, Post, Topic
+from qa.querybudget import QueryBudgetTestMixin
+
+from .models import AVATAR_RENDITIONS, Profile
+
+User = get_user_model()
+
+
+class AccountsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"user{i}", password=f"secret-pass-{i}") for i in range(3)]
+        # Профиль создаёт регистрация (RegisterSerializer).
+        Profile.objects.bulk_create(Profile(user=user) for user in cls.users)
+        cls.category = Category.objects.create(name="Общее", slug="general")
+
+    def setUp(self):
+        caching.get_cache().clear()
+
+    def make_topic(self, author, rating=0):
+        count = Topic.objects.count()
+        return Topic.objects.create(category=self.category, author=author, title=f"Тема номер {count}",
+                                    slug=f"topic-{count}", body="Текст темы для проверки.", rating=rating)
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, AccountsTestCase):
+    def test_leaderboard_and_profile(self):
+        for i, user in enumerate(self.users):
+            topic = self.make_topic(user, rating=i)
+            Post.objects.create(topic=topic, author=self.users[0], body="Ответ в теме", rating=1)
+
+        for path in ("/api/v1/accounts/leaderboard/", "/api/v1/accounts/leaderboard/?period=week&limit=2"):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinBudget(response)
+        response = self.client.get("/api/v1/accounts/me/", **self.auth(self.users[1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+
+
+def image_file(size, color, name="avatar.png"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+@override_settings(IMAGE_RENDITION_FORMAT="webp")
+class AvatarRenditionTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.enterContext(mock.patch.object(renditions, "_known", set()))
+        self.enterContext(mock.patch.object(renditions, "_failed", set()))
+        self.profile = self.users[0].profile
+
+    def set_avatar(self, size=(300, 200), color=(200, 0, 0), name="avatar.png"):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.avatar.save(name, image_file(size, color, name))
+        return self.profile.avatar
+
+    def open_rendition(self, avatar, spec):
+        return Image.open(default_storage.open(renditions.rendition_name(avatar.name, spec), "rb"))
+
+    def test_renditions_built_on_save_without_upscaling(self):
+        avatar = self.set_avatar()
+        with self.open_rendition(avatar, "avatar-64") as small, self.open_rendition(avatar, "avatar-256") as large:
+            self.assertEqual((small.format, small.size), ("WEBP", (64, 64)))
+            # Исходник ниже 256 по высоте: обрезка под квадрат без увеличения.
+            self.assertEqual(large.size, (200, 200))
+        response = self.client.get("/api/v1/accounts/me/", **self.auth(self.users[0]))
+        urls = response.json()["avatar_urls"]
+        self.assertEqual(set(urls), set(AVATAR_RENDITIONS))
+        self.assertTrue(urls["avatar-64"].endswith(renditions.rendition_name(avatar.name, "avatar-64")))
+
+    def test_existing_rendition_reused(self):
+        avatar = self.set_avatar()
+        renditions._known.clear()
+        with mock.patch.object(renditions, "render", side_effect=AssertionError("перестроение")):
+            first = renditions.url(avatar, "avatar-64")
+            # Имя запомнено: повторный вызов не обращается к хранилищу.
+            with mock.patch.object(avatar.storage, "exists", side_effect=AssertionError("exists")):
+                self.assertEqual(renditions.url(avatar, "avatar-64"), first)
+
+    def test_changed_avatar_gets_new_renditions(self):
+        old = self.set_avatar().name
+        old_url = renditions.url(self.profile.avatar, "avatar-64")
+        new = self.set_avatar(color=(0, 0, 200)).name
+        self.assertNotEqual(renditions.url(self.profile.avatar, "avatar-64"), old_url)
+        with self.open_rendition(self.profile.avatar, "avatar-64") as image:
+            red, _, blue = image.convert("RGB").getpixel((32, 32))
+            self.assertGreater(blue, red)
+
+        out = io.StringIO()
+        call_command("build_renditions", "--prune", stdout=out)
+        self.assertIn(f"Удалено лишних копий: {len(AVATAR_RENDITIONS)}", out.getvalue())
+        self.assertFalse(default_storage.exists(renditions.rendition_name(old, "avatar-64")))
+        self.assertTrue(default_storage.exists(renditions.rendition_name(new, "avatar-64")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.delete()
+        self.assertFalse(default_storage.exists(renditions.rendition_name(new, "avatar-64")))
+
+    def test_unreadable_image_falls_back_to_original(self):
+        with self.assertLogs("qa.renditions", "WARNING"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.profile.avatar.save("broken.png", ContentFile(b"not an image", name="broken.png"))
+        avatar = self.profile.avatar
+        with mock.patch.object(renditions, "render", side_effect=AssertionError("повторное чтение")):
+            self.assertEqual(renditions.url(avatar, "avatar-64"), avatar.url)
@@ -1,13 +1,19 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from qa.async_views import hybrid, is_enabled as async_read_views
+from . import async_views
 from .views import RegisterAPIView, MeAPIView, TopUsersAPIView
 
 app_name = "accounts"
 
+leaderboard = TopUsersAPIView.as_view()
+if async_read_views():
+    leaderboard = hybrid(async_views.leaderboard, leaderboard)
+
 urlpatterns = [
     path("register/", RegisterAPIView.as_view(), name="register"),
     path("login/", TokenObtainPairView.as_view(), name="login"),
     path("refresh/", TokenRefreshView.as_view(), name="refresh"),
     path("me/", MeAPIView.as_view(), name="me"),
-    path("leaderboard/", TopUsersAPIView.as_view(), name="leaderboard"),
+    path("leaderboard/", leaderboard, name="leaderboard"),
 ]
@@ -2,11 +2,11 @@ from django.contrib.auth import get_user_model
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models.functions import Coalesce
-from django.db.models import Sum, Count, IntegerField, F, Value
 
-
-from .models import Profile
+from qa import renditions
+from qa.caching import cache_response
+from . import reputation
+from .models import Profile, UserStats
 from .serializers import RegisterSerializer, ProfileSerializer
 
 User = get_user_model()
@@ -19,6 +19,7 @@ class RegisterAPIView(generics.CreateAPIView):
 
 class MeAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {"get": 3}
 
     def get(self, request):
         profile, _ = Profile.objects.get_or_create(user=request.user)
@@ -31,25 +32,46 @@ class MeAPIView(APIView):
         serializer.save()
         return Response(serializer.data)
 
+def avatar_url(user):
+    profile = getattr(user, "profile", None)
+    return renditions.url(profile.avatar, "avatar-64") if profile is not None else None
+
+
 class TopUsersAPIView(APIView):
+    """Топ пользователей по репутации: ``?period=week|month|all``, ``?limit=`` (до 100)."""
     permission_classes = [permissions.AllowAny]
+    max_limit = 100
+    query_budget = 3
 
+    @cache_response(User, Profile, UserStats)
     def get(self, request):
-        users = (User.objects
-                 .annotate(topic_rating=Coalesce(Sum("topics__rating"), 0))
-                 .annotate(post_rating=Coalesce(Sum("posts__rating"), 0))
-                 .annotate(total_rating=F("topic_rating") + F("post_rating"))
-                 .annotate(posts_count=Coalesce(Count("posts"), 0))
-                 .annotate(topics_count=Coalesce(Count("topics"), 0))
-                 .order_by("-total_rating", "-posts_count")[:10]
-                 )
-        data = [
-            {
-                "username": u.username,
-                "display_name": getattr(getattr(u, "profile", None), "display_name", "") or u.username,
-                "total_rating": u.total_rating,
-                "posts": u.posts_count,
-                "topics": u.topics_count,
-            } for u in users
-        ]
-        return Response(data)
\ No newline at end of file
+        try:
+            period, limit = self.parse(request.query_params)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response(leaderboard_data(reputation.leaderboard(period, limit)))
+
+    @classmethod
+    def parse(cls, params):
+        """(period, limit) из query-параметров; ValueError с текстом ошибки для ответа 400."""
+        period = params.get("period", reputation.ALL)
+        if period not in reputation.PERIODS:
+            raise ValueError("period должен быть week, month или all.")
+        try:
+            limit = min(max(int(params.get("limit", 10)), 1), cls.max_limit)
+        except ValueError:
+            raise ValueError("limit должен быть числом.")
+        return period, limit
+
+
+def leaderboard_data(entries):
+    return [
+        {
+            "username": u.username,
+            "display_name": getattr(getattr(u, "profile", None), "display_name", "") or u.username,
+            "avatar": avatar_url(u),
+            "total_rating": total_rating,
+            "posts": posts,
+            "topics": topics,
+        } for u, total_rating, topics, posts in entries
+    ]
@@ -55,8 +55,99 @@ INSTALLED_APPS = [
 EXAM_FULL_NAME = "Жетписов Ансат Нурланович"
 EXAM_GROUP = "231-323"
 
+# Страница экзаменов: карточек на страницу, участников в превью карточки, время жизни кэша карточки (с)
+EXAM_PAGE_SIZE = int(os.getenv("EXAM_PAGE_SIZE", "20"))
+EXAM_PARTICIPANTS_PREVIEW = int(os.getenv("EXAM_PARTICIPANTS_PREVIEW", "10"))
+EXAM_CARD_CACHE_TIMEOUT = int(os.getenv("EXAM_CARD_CACHE_TIMEOUT", "3600"))
+
+# Рейтинг «горячих» тем (qa.ranking)
+HOT_DECAY_SECONDS = int(os.getenv("HOT_DECAY_SECONDS", "45000"))
+HOT_WINDOW_DAYS = int(os.getenv("HOT_WINDOW_DAYS", "7"))
+HOT_TOP_K = int(os.getenv("HOT_TOP_K", "100"))
+HOT_POST_WEIGHT = 2
+HOT_VOTE_WEIGHT = 1
+
+# Отложенная запись рейтингов при всплесках голосов (qa.ratings)
+VOTE_WRITE_BEHIND = os.getenv("VOTE_WRITE_BEHIND", "0") == "1"
+VOTE_WRITE_BEHIND_INTERVAL = float(os.getenv("VOTE_WRITE_BEHIND_INTERVAL", "2"))
+VOTE_WRITE_BEHIND_MAX_PENDING = int(os.getenv("VOTE_WRITE_BEHIND_MAX_PENDING", "500"))
+VOTE_WRITE_BEHIND_BUFFER = "qa.ratings.MemoryRatingBuffer"
+
+# Конфигурация полнотекстового поиска PostgreSQL (qa.search)
+SEARCH_CONFIG = os.getenv("SEARCH_CONFIG", "russian")
+
+# Модерация: запрещённые слова (файл — по термину в строке, перечитывается по изменению)
+BANNED_WORDS_FILE = os.getenv("BANNED_WORDS_FILE", "")
+BANNED_WORDS_RELOAD_INTERVAL = float(os.getenv("BANNED_WORDS_RELOAD_INTERVAL", "5"))
+
+# Кэш: по умолчанию в памяти процесса; CACHE_BACKEND=file — общий для воркеров каталог
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "BACKEND": {
+            "locmem": "django.core.cache.backends.locmem.LocMemCache",
+            "file": "django.core.cache.backends.filebased.FileBasedCache",
+        }[CACHE_BACKEND],
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / "var" / "cache") if CACHE_BACKEND == "file" else "questudio"),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000"))},
+    }
+}
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", "300"))
+
+# Бюджеты SQL-запросов на эндпоинт (qa.querybudget); превышение — ошибка в DEBUG, иначе предупреждение
+QUERY_BUDGET_ENABLED = os.getenv("QUERY_BUDGET_ENABLED", "1") == "1"
+QUERY_BUDGET_RAISE = os.getenv("QUERY_BUDGET_RAISE", "1" if DEBUG else "0") == "1"
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "20"))
+QUERY_BUDGET_SERVER_TIMING = True
+
+# Метрики Prometheus (qa.metrics) на /metrics; METRICS_DIR — общий каталог mmap-файлов воркеров
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Списки тем/сообщений/комментариев из .values() без полей DRF (qa.rows)
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "1") == "1"
+
+# Асинхронные представления горячих GET-эндпоинтов на тех же URL (qa.async_views); включать под ASGI-сервером
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", "0") == "1"
+
+# Потоковая выгрузка NDJSON/CSV (qa.export): строк на одно чтение серверного курсора
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+# PDF-выгрузка тем из админки (qa.pdfexport): больше порога — фоновой задачей с файлом в MEDIA
+PDF_EXPORT_INLINE_LIMIT = int(os.getenv("PDF_EXPORT_INLINE_LIMIT", "500"))
+PDF_EXPORT_WORKERS = int(os.getenv("PDF_EXPORT_WORKERS", "1"))
+PDF_EXPORT_CHUNK_SIZE = int(os.getenv("PDF_EXPORT_CHUNK_SIZE", "1000"))
+
+# Вложения (qa.blobs): передача файла веб-серверу — "accel" (nginx X-Accel-Redirect на
+# ATTACHMENT_ACCEL_PREFIX, internal-location на MEDIA_ROOT), "sendfile" (X-Sendfile) или "" — FileResponse с Range
+ATTACHMENT_OFFLOAD = os.getenv("ATTACHMENT_OFFLOAD", "")
+ATTACHMENT_ACCEL_PREFIX = os.getenv("ATTACHMENT_ACCEL_PREFIX", "/protected-media/")
+ATTACHMENT_CACHE_SECONDS = int(os.getenv("ATTACHMENT_CACHE_SECONDS", "86400"))
+
+# Загрузка вложений по частям (qa.uploads): размер части, предел файла, квота открытых сессий
+# пользователя в байтах и срок жизни сессии без новых частей (потом её удаляет clean_uploads)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(1024 * 1024 * 1024)))
+UPLOAD_USER_QUOTA = int(os.getenv("UPLOAD_USER_QUOTA", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Уменьшенные копии аватаров и картинок экзаменов (qa.renditions): имя → (ширина, высота, crop|fit)
+IMAGE_RENDITIONS = {
+    "avatar-64": (64, 64, "crop"),
+    "avatar-256": (256, 256, "crop"),
+    "admin-thumb": (160, 80, "fit"),
+    "exam-480": (480, 240, "fit"),
+}
+IMAGE_RENDITION_FORMAT = os.getenv("IMAGE_RENDITION_FORMAT", "webp")
+IMAGE_RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", "80"))
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    "qa.metrics.MetricsMiddleware",
+    "qa.profiling.ProfilingMiddleware",
+    "qa.querybudget.QueryBudgetMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,14 +155,26 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-
-    "silk.middleware.SilkyMiddleware",
 ]
 
 CORS_ALLOWED_ORIGINS = ["http://localhost:5173", "http://127.0.0.1:5173"]
 
-SILKY_PYTHON_PROFILER = True
-SILKY_INTERCEPT_PERCENT = 100
+# Silk пишет каждый перехваченный запрос в БД синхронно — только для отладки (SILK_ENABLED=1)
+SILK_ENABLED = os.getenv("SILK_ENABLED", "0") == "1"
+SILKY_PYTHON_PROFILER = os.getenv("SILKY_PYTHON_PROFILER", "0") == "1"
+SILKY_INTERCEPT_PERCENT = int(os.getenv("SILKY_INTERCEPT_PERCENT", "5"))
+if SILK_ENABLED:
+    MIDDLEWARE.append("silk.middleware.SilkyMiddleware")
+
+# Выборочное профилирование cProfile (qa.profiling): доля запросов, доли по путям,
+# порог медленных запросов и X-Profile: 1 от сотрудника; запись в фоне, в память или файлы
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_PATH_RATES = {}
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", "200"))
+PROFILING_SINK = os.getenv("PROFILING_SINK", "memory")
+PROFILING_DIR = os.getenv("PROFILING_DIR", str(BASE_DIR / "var" / "profiles"))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
 
 ROOT_URLCONF = 'config.urls'
 
@@ -162,7 +265,11 @@ REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.OrderingFilter",
-        "rest_framework.filters.SearchFilter",
+        "qa.filters.IndexSearchFilter",
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "qa.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
@@ -19,15 +19,24 @@ from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from qa.admin import profile_download, profile_list
+from qa.metrics import metrics_view
+
 
 urlpatterns = [
+    path("admin/profiles/", admin.site.admin_view(profile_list), name="admin-profiles"),
+    path("admin/profiles/<str:profile_id>.<str:fmt>", admin.site.admin_view(profile_download),
+         name="admin-profile-download"),
     path("admin/", admin.site.urls),
     path("api/v1/", include("qa.urls")),
     path("api/v1/accounts/", include("accounts.urls")),
-    path("silk/", include("silk.urls", namespace="silk")),
     path("AZexam/", include("exam.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
+if settings.SILK_ENABLED:
+    urlpatterns.append(path("silk/", include("silk.urls", namespace="silk")))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import DateFieldListFilter
 from django.utils.html import format_html
+from qa import renditions
 from .models import AZexam  
 
 @admin.register(AZexam) 
@@ -17,12 +18,16 @@ class AZexamAdmin(admin.ModelAdmin):
     readonly_fields = ()
     date_hierarchy = "created_at"
 
-    @admin.display(description="Кол-во участников")
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_participants_count()
+
+    @admin.display(description="Кол-во участников", ordering="participants_total")
     def participants_count(self, obj):
-        return obj.participants.count()
+        return obj.participants_total
 
     @admin.display(description="Превью")
     def thumb(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:40px;border-radius:4px"/>', obj.image.url)
+            return format_html('<img src="{}" style="height:40px;border-radius:4px" loading="lazy"/>',
+                               renditions.url(obj.image, "admin-thumb"))
         return "—"
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ExamConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exam'
+
+    def ready(self):
+        from qa import renditions
+        from . import signals  # noqa: F401
+        from .models import IMAGE_RENDITIONS, AZexam
+        renditions.register(AZexam, "image", IMAGE_RENDITIONS)
@@ -0,0 +1,56 @@
+"""
+Карточки экзаменов на публичной странице: HTML каждой карточки кэшируется
+отдельно по id экзамена и ``updated_at``. Промахи рендерятся пачкой — участники
+для превью подгружаются одним запросом только для них.
+
+Версия карточки хранится в строке экзамена, а не в кэше: при изменении
+экзамена, его участников и их имён/почты сигналы (exam.signals) сдвигают
+``updated_at``, и каждый процесс со своим LocMemCache видит новый ключ при
+следующем чтении страницы. Старые записи истекают по таймауту.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .models import AZexam
+
+KEY_PREFIX = "exam:card:"
+
+
+def timeout():
+    return int(getattr(settings, "EXAM_CARD_CACHE_TIMEOUT", 3600))
+
+
+def preview_size():
+    return int(getattr(settings, "EXAM_PARTICIPANTS_PREVIEW", 10))
+
+
+def card_key(exam):
+    return f"{KEY_PREFIX}{exam.pk}:{exam.updated_at.timestamp():.6f}"
+
+
+def touch(pks):
+    """Новая версия карточек экзаменов ``pks`` — одним UPDATE."""
+    if pks:
+        AZexam.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+def render_cards(exams):
+    """HTML карточек в порядке ``exams``; у экзаменов должна быть аннотация ``participants_total``."""
+    cached = cache.get_many([card_key(e) for e in exams])
+    missing = [e for e in exams if card_key(e) not in cached]
+    if missing:
+        participants = get_user_model().objects.only("username", "email").order_by("pk")[:preview_size()]
+        prefetch_related_objects(missing, Prefetch("participants", queryset=participants,
+                                                   to_attr="participants_preview"))
+        fresh = {card_key(e): render_to_string("exam/card.html", {
+            "e": e,
+            "more": e.participants_total - len(e.participants_preview),
+        }) for e in missing}
+        cache.set_many(fresh, timeout())
+        cached.update(fresh)
+    return [mark_safe(cached[card_key(e)]) for e in exams]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='azexam',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,12 +1,32 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 User = get_user_model()
 
+# Размеры изображения с заданием (qa.renditions): превью в админке и карточка на странице.
+IMAGE_RENDITIONS = ("admin-thumb", "exam-480")
+
+
+class AZexamQuerySet(models.QuerySet):
+    def with_participants_count(self):
+        """
+        ``participants_total`` коррелированным подзапросом к таблице связи: без JOIN
+        и GROUP BY по всем колонкам экзамена, не зависит от других фильтров по участникам.
+        """
+        through = AZexam.participants.through
+        counts = (through.objects.filter(azexam=OuterRef("pk")).order_by()
+                  .values("azexam").annotate(n=Count("pk")).values("n"))
+        return self.annotate(participants_total=Coalesce(Subquery(counts, output_field=IntegerField()), 0))
+
+
 class AZexam(models.Model):
     title = models.CharField("Название экзамена", max_length=255)
     created_at = models.DateTimeField("Дата создания записи", auto_now_add=True)
+    # Версия карточки (exam.cards): меняется при сохранении и при изменении участников.
+    updated_at = models.DateTimeField("Дата изменения", auto_now=True)
     exam_date = models.DateTimeField("Дата проведения экзамена")
     image = models.ImageField("Изображение с заданием", upload_to="exam_images/", blank=True, null=True)
     participants = models.ManyToManyField(
@@ -14,6 +34,8 @@ class AZexam(models.Model):
     )
     is_public = models.BooleanField("Опубликовано", default=True)
 
+    objects = AZexamQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Экзамен"
         verbose_name_plural = "Экзамены"
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cards
+from .models import AZexam
+
+Participants = AZexam.participants.through
+
+
+def exams_of(user_id):
+    return list(Participants.objects.filter(user_id=user_id).values_list("azexam_id", flat=True))
+
+
+@receiver(m2m_changed, sender=Participants)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        cards.touch([instance.pk])
+    elif action == "pre_clear":
+        # После clear() связей уже не найти — экзамены пользователя собираем заранее.
+        cards.touch(exams_of(instance.pk))
+    else:
+        cards.touch(pk_set)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def participant_renamed(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    # В карточке — почта или имя участника; вход (update_fields=["last_login"]) кэш не трогает.
+    if created or raw or (update_fields is not None and not {"email", "username"} & set(update_fields)):
+        return
+    cards.touch(exams_of(instance.pk))
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def participant_deleted(sender, instance, **kwargs):
+    cards.touch(exams_of(instance.pk))
@@ -1,3 +1,106 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from qa import renditions
+
+from . import cards
+from .models import AZexam
+
+User = get_user_model()
+
+
+class ExamCardsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("student", email="student@example.com")
+        cls.exam = AZexam.objects.create(title="Алгебра", exam_date=timezone.now())
+        cls.exam.participants.add(cls.user)
+
+    def setUp(self):
+        # Отдельный LocMemCache на «процесс»: как у воркеров gunicorn.
+        self.worker = LocMemCache("exam-cards-test", {})
+        self.addCleanup(self.worker.clear)
+
+    def render(self, worker=None):
+        exams = list(AZexam.objects.with_participants_count().order_by("pk"))
+        with mock.patch.object(cards, "cache", worker or self.worker):
+            return cards.render_cards(exams)[0]
+
+    def test_cached_card_reused_until_exam_changes(self):
+        self.assertIn("Алгебра", self.render())
+        with self.assertNumQueries(1):
+            self.render()
+        self.exam.title = "Геометрия"
+        self.exam.save()
+        self.assertIn("Геометрия", self.render())
+
+    def test_changes_reach_other_worker_caches(self):
+        other = LocMemCache("exam-cards-test-other", {})
+        self.addCleanup(other.clear)
+        self.assertIn("student@example.com", self.render(other))
+        self.render()
+
+        newcomer = User.objects.create_user("newcomer")
+        self.exam.participants.add(newcomer)
+        self.assertIn("newcomer", self.render(other))
+
+        self.user.email = "renamed@example.com"
+        self.user.save(update_fields=["email"])
+        self.assertIn("renamed@example.com", self.render())
+
+        newcomer.xxexam_participants.clear()
+        self.assertNotIn("newcomer", self.render(other))
+        self.assertIn("Участники (1)", self.render())
+
+    def test_login_does_not_bump_version(self):
+        before = AZexam.objects.get().updated_at
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=["last_login"])
+        self.assertEqual(AZexam.objects.get().updated_at, before)
+
+
+class ExamImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media, IMAGE_RENDITION_FORMAT="jpeg"))
+        self.enterContext(mock.patch.object(renditions, "_known", set()))
+        self.exam = AZexam.objects.create(title="Алгебра", exam_date=timezone.now())
+
+    def set_image(self, size, mode="RGB"):
+        buffer = io.BytesIO()
+        Image.new(mode, size).save(buffer, "PNG")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam.image.save("task.png", ContentFile(buffer.getvalue()))
+        return self.exam.image.name
+
+    def rendition_size(self, name, spec):
+        with Image.open(default_storage.open(renditions.rendition_name(name, spec), "rb")) as image:
+            return image.format, image.size
+
+    def test_fit_renditions_follow_image_changes(self):
+        first = self.set_image((1000, 400))
+        self.assertEqual(self.rendition_size(first, "exam-480"), ("JPEG", (480, 192)))
+        self.assertEqual(self.rendition_size(first, "admin-thumb"), ("JPEG", (160, 64)))
+        # Прозрачная картинка в JPEG — на белом фоне; новое имя файла — новые копии.
+        second = self.set_image((200, 400), mode="RGBA")
+        self.assertNotEqual(renditions.rendition_name(first, "exam-480"),
+                            renditions.rendition_name(second, "exam-480"))
+        self.assertEqual(self.rendition_size(second, "exam-480"), ("JPEG", (120, 240)))
+        # Смена качества меняет ключ в имени: копия строится заново, старую не отдаём из кэша.
+        before = renditions.rendition_name(second, "exam-480")
+        with override_settings(IMAGE_RENDITION_QUALITY=50):
+            rebuilt = renditions.rendition_name(second, "exam-480")
+            self.assertNotEqual(rebuilt, before)
+            self.assertTrue(renditions.url(self.exam.image, "exam-480").endswith(rebuilt))
+            self.assertTrue(default_storage.exists(rebuilt))
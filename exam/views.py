@@ -1,14 +1,20 @@
 from django.conf import settings
+from django.core.paginator import Paginator
 from django.shortcuts import render
+
+from . import cards
 from .models import AZexam
 
+
 def azexam_page(request):
     items = (AZexam.objects
              .filter(is_public=True)
-             .prefetch_related("participants")
-             .order_by("-created_at"))
+             .with_participants_count()
+             .order_by("-created_at", "-pk"))
+    page = Paginator(items, getattr(settings, "EXAM_PAGE_SIZE", 20)).get_page(request.GET.get("page"))
     ctx = {
-        "items": items,
+        "page": page,
+        "cards": cards.render_cards(list(page.object_list)),
         "full_name": getattr(settings, "EXAM_FULL_NAME", "ФИО"),
         "group": getattr(settings, "EXAM_GROUP", "Группа"),
     }
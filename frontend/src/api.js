@@ -77,4 +77,12 @@ export async function register(username, email, password) {
   return api.post("/accounts/register/", { username, email, password });
 }
 
+// Keyset-лента: первый запрос с cursor="", дальше — по ссылке next (без COUNT и OFFSET).
+export async function fetchFeed(url, params) {
+  const r = params
+    ? await api.get(url, { params: { ...params, cursor: "" } })
+    : await api.get(url);
+  return { results: r.data?.results || [], next: r.data?.next ?? null };
+}
+
 export default api;
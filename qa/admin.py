@@ -1,47 +1,73 @@
 from django.contrib import admin
-from .models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote
-from django.contrib import admin
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+from .models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, Blob, TopicVote, PostVote, PdfExport
+from .models import UploadSession
+from django import forms
+from accounts import reputation
+
+from . import blobs, caching, pdfexport, profiling, uploads
+from django.http import Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils.html import format_html
 from django.db.models import Count
-from django.contrib import admin, messages
+from django.contrib import messages
 from django.db.models import F
+from django.db import transaction
 
 @admin.action(description="Инкрементировать рейтинг выбранных тем на 1")
 def increment_topic_rating(modeladmin, request, queryset):
-    updated = queryset.update(rating=F("rating") + 1)
+    with transaction.atomic():
+        updated = queryset.update(rating=F("rating") + 1)
+        reputation.record_many((author_id, created_at, 1, 0, 0)
+                               for author_id, created_at in queryset.values_list("author_id", "created_at"))
+    Topic.objects.refresh_hot_scores(queryset)
+    caching.bump(Topic)
     messages.success(request, f"Обновлено записей: {updated}")
 
 @admin.action(description="Экспортировать выбранные темы в PDF")
 def export_topics_to_pdf(modeladmin, request, queryset):
+    count = queryset.count()
+    if count > pdfexport.inline_limit():
+        job = pdfexport.submit(queryset, request.user)
+        link = reverse("admin:qa_pdfexport_change", args=[job.pk])
+        messages.info(request, format_html(
+            'Выгрузка {} тем запущена в фоне: <a href="{}">прогресс и ссылка на файл</a>.', count, link))
+        return None
     response = HttpResponse(content_type="application/pdf")
     response["Content-Disposition"] = 'attachment; filename="topics.pdf"'
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
-    y = height - 50
-    for t in queryset.select_related("category", "author"):
-        lines = [
-            f"Тема: {t.title}",
-            f"Категория: {t.category.name}",
-            f"Автор: {t.author.username}",
-            f"Рейтинг: {t.rating}",
-            f"Постов: {t.posts.count()}",
-            "-" * 60,
-        ]
-        for line in lines:
-            p.drawString(40, y, line)
-            y -= 16
-            if y < 60:
-                p.showPage()
-                y = height - 50
-    p.showPage()
-    p.save()
+    pdfexport.write_pdf(response, pdfexport.topic_rows(queryset))
     return response
 
+class AttachmentForm(forms.ModelForm):
+    upload = forms.FileField(label="Файл", required=False)
+
+    class Meta:
+        model = Attachment
+        fields = ("name", "upload")
+
+    def clean(self):
+        cleaned = super().clean()
+        if not self.instance.blob_id and not cleaned.get("upload"):
+            self.add_error("upload", "Выберите файл.")
+        return cleaned
+
+    def save(self, commit=True):
+        upload = self.cleaned_data.get("upload")
+        if upload:
+            # Содержимое — в blob по SHA-256 (qa.blobs); прежний blob теряет ссылку.
+            previous = self.instance.blob_id
+            self.instance.blob = blobs.store(upload.chunks())
+            self.instance.name = self.cleaned_data.get("name") or upload.name
+            if previous:
+                blobs.release(previous)
+        return super().save(commit)
+
+
 class AttachmentInline(admin.TabularInline):
     model = Attachment
+    form = AttachmentForm
     extra = 0
+    readonly_fields = ("blob",)
 
 
 class PostInline(admin.TabularInline):
@@ -91,12 +117,12 @@ class TopicTagInline(admin.TabularInline):
 
 @admin.register(Topic)
 class TopicAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "category", "author", "status", "rating", "created_at", "posts_total")
+    list_display = ("id", "title", "category", "author", "status", "rating", "created_at", "posts_count")
     list_display_links = ("id", "title")
     list_filter = ("status", "category", "created_at", "updated_at", "is_active")
     date_hierarchy = "created_at"
     search_fields = ("title", "author__username", "author__email", "category__name")
-    readonly_fields = ("rating", "created_at", "updated_at")
+    readonly_fields = ("rating", "created_at", "updated_at", "posts_count", "post_rating_sum", "last_activity")
     raw_id_fields = ("author", "category")
     inlines = (PostInline, TopicTagInline)
     prepopulated_fields = {"slug": ("title",)}
@@ -106,11 +132,7 @@ class TopicAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related("category", "author").annotate(posts_total=Count("posts"))
-
-    @admin.display(description="Сообщений", ordering="posts_total")
-    def posts_total(self, obj):
-        return obj.posts_total
+        return qs.select_related("category", "author")
 
 
 @admin.register(Post)
@@ -123,6 +145,7 @@ class PostAdmin(admin.ModelAdmin):
     readonly_fields = ("created_at", "updated_at")
     raw_id_fields = ("author", "topic")
     inlines = (AttachmentInline,)
+    list_select_related = ("topic__category", "author")
 
 
 @admin.register(Comment)
@@ -134,10 +157,115 @@ class CommentAdmin(admin.ModelAdmin):
     search_fields = ("author__username", "author__email", "body", "topic__title", "post__body")
     raw_id_fields = ("author", "topic", "post")
     readonly_fields = ("created_at",)
+    list_select_related = ("author", "topic__category", "post__topic__category")
+
+
+
+@admin.register(PdfExport)
+class PdfExportAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "progress_display", "created_by", "created_at", "finished_at", "download")
+    list_filter = ("status",)
+    fields = ("status", "progress_display", "download", "error", "created_by", "created_at", "finished_at")
+    readonly_fields = fields
+    list_select_related = ("created_by",)
+
+    @admin.display(description="Прогресс")
+    def progress_display(self, obj):
+        return f"{obj.processed} / {obj.total} ({obj.progress}%)"
+
+    @admin.display(description="Файл")
+    def download(self, obj):
+        if obj.status != PdfExport.Status.DONE or not obj.file:
+            return "—"
+        return format_html('<a href="{}">скачать</a>', obj.file.url)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Attachment)
+class AttachmentAdmin(admin.ModelAdmin):
+    form = AttachmentForm
+    list_display = ("id", "name", "post", "blob", "uploaded_at")
+    raw_id_fields = ("post",)
+    readonly_fields = ("blob",)
+    fields = ("post", "name", "upload", "blob")
+    list_select_related = ("blob",)
 
 
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("id", "sha256", "size", "ref_count", "created_at")
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "size", "file", "ref_count", "created_at")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Blob-ы без ссылок удаляются вместе с файлом (qa.blobs.release, gc_blobs).
+        return False
+
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "size", "status", "chunks_display", "created_by", "created_at", "expires_at")
+    list_filter = ("status",)
+    fields = ("name", "post", "size", "sha256", "chunk_size", "chunks_display", "status", "attachment",
+              "created_by", "created_at", "expires_at")
+    readonly_fields = fields
+    list_select_related = ("created_by",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(chunks_received=Count("chunks"))
+
+    @admin.display(description="Части")
+    def chunks_display(self, obj):
+        return f"{obj.chunks_received} / {obj.chunks_total}"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        uploads.discard(obj)
+
+    def delete_queryset(self, request, queryset):
+        for session in queryset:
+            uploads.discard(session)
 
-admin.site.register(Attachment)
 admin.site.register(TopicTag)
 admin.site.register(TopicVote)
 admin.site.register(PostVote)
+
+
+def profile_list(request):
+    """Сохранённые профили запросов (qa.profiling) со ссылками на скачивание."""
+    sink = profiling.get_sink()
+    context = {
+        **admin.site.each_context(request),
+        "title": "Профили запросов",
+        "profiles": sink.list(),
+        "formats": profiling.FORMATS,
+        "sink": profiling.get_setting("SINK", "memory"),
+        "dropped": sink.dropped,
+    }
+    return TemplateResponse(request, "admin/qa/profiles.html", context)
+
+
+def profile_download(request, profile_id, fmt):
+    if fmt not in profiling.FORMATS:
+        raise Http404
+    meta, data = profiling.get_sink().load(profile_id)
+    if meta is None:
+        raise Http404
+    content_type = "application/octet-stream" if fmt == "prof" else "text/plain; charset=utf-8"
+    response = HttpResponse(profiling.render(data, fmt), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{profile_id}.{fmt}"'
+    return response
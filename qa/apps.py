@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_migrate
 
 
 class QaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'qa'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import caching, search
+        from .models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote
+        from .views import AUTHOR_NAMES_LABEL
+        caching.track(Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote)
+        caching.track_fields(get_user_model(), ("username",), AUTHOR_NAMES_LABEL)
+        # Таблицу индекса создаёт/удаляет миграция 0005 — её наличие перепроверяется.
+        post_migrate.connect(search.reset, sender=self, dispatch_uid="qa.search.reset")
@@ -0,0 +1,252 @@
+"""
+Асинхронное чтение горячих публичных эндпоинтов под ASGI-сервером.
+
+При ``ASYNC_READ_VIEWS = True`` список и карточку темы, ленты hot/new,
+категории, облако тегов (и рейтинг пользователей, accounts.async_views)
+обслуживают ``async def``-представления на тех же URL и с теми же именами
+маршрутов. Строки читаются async ORM (``async for``, ``afirst``, ``acount``,
+``aaggregate``), версии и кэш ответов — тот же кэш (``caching.in_cache_thread``),
+сериализация — ``aserialize`` (qa.rows). Ответ совпадает с синхронным байт в
+байт, включая ETag, а записи кэша у обоих путей общие.
+
+Асинхронно обслуживается только то, что не требует DRF: GET/HEAD без
+``Authorization`` (аутентификация DRF — только JWT) с JSON-ответом и
+параметрами из ``params``. Остальное — запись, JWT, ``?expand=``, фильтры и
+поиск, Browsable API, ошибки (404, неверная страница или курсор) — обрабатывает
+исходное DRF-представление через ``sync_to_async``, поэтому поведение путей не
+расходится.
+
+Под WSGI асинхронное представление выполняется в отдельном цикле событий на
+каждый запрос: включать вместе с ASGI-сервером (``make up-asgi``). Асинхронный
+стек Django переходит в поток на каждый запрос ORM и на каждое синхронное
+middleware, поэтому выигрыш есть, только когда запросы ждут ввода-вывода
+(сетевая база); на одном ядре с локальной базой ASGI медленнее. Проверять на
+целевом окружении командой ``bench_async``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.urls import path
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from . import caching
+from .conditional import make_etag, set_validators, timestamp
+from .models import Topic
+from .pagination import apaginate_queryset
+from .renderers import FastJSONRenderer
+from .serializers import CategoryRows, TopicDetailRows, TopicListRows
+from .views import (
+    TAXONOMY_LABELS, TOPIC_RELATED_MODELS, TOPIC_STATE_COLUMNS,
+    CategoryViewSet, TagCloudAPIView, TopicViewSet,
+    related_state, tag_cloud_rows, topic_list_aggregates, topic_list_state_of, topic_state_of,
+)
+
+JSON_MEDIA_TYPES = ("*/*", "application/*", "application/json")
+LIST_PARAMS = {"page", "cursor", "fields"}
+
+
+class Fallback(Exception):
+    """Запрос должно обработать синхронное DRF-представление."""
+
+
+def is_enabled():
+    return bool(getattr(settings, "ASYNC_READ_VIEWS", False))
+
+
+def accepts_json(request):
+    """Согласование DRF выбрало бы JSON: без ``?format=`` и без других типов в Accept."""
+    if "format" in request.GET:
+        return False
+    accept = request.META.get("HTTP_ACCEPT", "")
+    return all(part.split(";")[0].strip() in JSON_MEDIA_TYPES for part in accept.split(",") if part.strip())
+
+
+def allowed_methods(view):
+    """Заголовок Allow, как у DRF-представления ``view`` (результат ``as_view``)."""
+    actions = getattr(view, "actions", None)
+    view_class = view.cls
+    names = set(actions) if actions else {name for name in view_class.http_method_names if hasattr(view_class, name)}
+    if "get" in names:
+        names.add("head")
+    names.add("options")
+    return ", ".join(name.upper() for name in view_class.http_method_names if name in names)
+
+
+def hybrid(handler, view):
+    """
+    Асинхронное представление: ``handler(request, *args, **kwargs)`` для анонимного
+    JSON GET/HEAD, синхронное DRF-представление ``view`` для всего остального.
+    ``handler`` получает DRF ``Request`` без аутентификаторов (пользователь анонимный)
+    и может отказаться от запроса исключением ``Fallback`` или ``APIException``.
+    """
+    sync_view = sync_to_async(view)
+    allow = allowed_methods(view)
+
+    async def dispatch(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD") and "HTTP_AUTHORIZATION" not in request.META and accepts_json(request):
+            try:
+                response = await handler(Request(request), *args, **kwargs)
+            except (Fallback, APIException):
+                pass
+            else:
+                # Как APIView.finalize_response.
+                patch_vary_headers(response, ("Accept",))
+                response["Allow"] = allow
+                return response
+        return await sync_view(request, *args, **kwargs)
+
+    # Для бюджетов запросов (qa.querybudget) и bench_api — как у исходного представления.
+    dispatch.cls = view.cls
+    dispatch.initkwargs = view.initkwargs
+    if getattr(view, "actions", None):
+        dispatch.actions = view.actions
+    return csrf_exempt(dispatch)
+
+
+def json_response(data, outcome=None):
+    response = HttpResponse(FastJSONRenderer().render(data), content_type="application/json")
+    if outcome in ("hit", "miss"):
+        response["X-Cache"] = outcome.upper()
+    return response
+
+
+def check_conditional(request, state):
+    """(ответ 304/412 или None, ETag, Last-Modified) — как декоратор qa.conditional.conditional."""
+    parts, last_modified = state
+    etag = make_etag(request, parts)
+    last_modified = timestamp(last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if isinstance(response, HttpResponseNotModified):
+        set_validators(response, etag, last_modified)
+    return response, etag, last_modified
+
+
+def only_params(request, allowed):
+    if set(request.query_params) - allowed:
+        raise Fallback
+
+
+def topic_versions():
+    # Версии моделей для отпечатка темы или списка: синхронные обращения к кэшу одним вызовом.
+    return caching.versions(TAXONOMY_LABELS), related_state(TOPIC_RELATED_MODELS)
+
+
+async def atopic_list_state(queryset):
+    queryset, aggregates = topic_list_aggregates(queryset)
+    agg = await queryset.aaggregate(**aggregates)
+    return topic_list_state_of(agg, *await caching.in_cache_thread(topic_versions))
+
+
+async def paginated_rows(paginator, queryset, request, rows):
+    page = await apaginate_queryset(paginator, queryset, request)
+    if page is None:
+        raise Fallback
+    return paginator.get_paginated_response(await rows.aserialize(page)).data
+
+
+def topic_rows(request, serializer_rows=TopicListRows):
+    rows = serializer_rows.for_request(request)
+    if rows is None:
+        raise Fallback
+    return rows
+
+
+async def conditional_list(request, queryset, compute):
+    """Список тем за ETag отпечатка ``queryset``: 304 без выборки страницы."""
+    not_modified, etag, last_modified = check_conditional(request, await atopic_list_state(queryset))
+    if not_modified is not None:
+        return not_modified
+    response = await compute()
+    return set_validators(response, etag, last_modified)
+
+
+async def topic_list(request):
+    """``TopicViewSet.list`` без фильтров, поиска и ``?ordering=`` (сортировка по умолчанию)."""
+    only_params(request, LIST_PARAMS)
+
+    async def compute():
+        rows = topic_rows(request)
+        queryset = rows.values(Topic.objects.order_by(*TopicViewSet.ordering), TopicViewSet.ordering_fields)
+        return json_response(await paginated_rows(TopicViewSet.pagination_class(), queryset, request, rows))
+
+    return await conditional_list(request, Topic.objects.all(), compute)
+
+
+async def topics_new(request):
+    only_params(request, LIST_PARAMS)
+
+    async def data():
+        rows = topic_rows(request)
+        queryset = rows.values(Topic.objects.order_by("-created_at"), TopicViewSet.ordering_fields)
+        return await paginated_rows(TopicViewSet.pagination_class(), queryset, request, rows)
+
+    async def compute():
+        return json_response(*await caching.acached(TopicViewSet.new, request, data))
+
+    return await conditional_list(request, Topic.objects.all(), compute)
+
+
+async def topics_hot(request):
+    only_params(request, {"page", "fields"})
+    pagination_class = TopicViewSet.hot.kwargs["pagination_class"]
+
+    async def data():
+        rows = topic_rows(request)
+        return await paginated_rows(pagination_class(), rows.values(Topic.objects.hot()), request, rows)
+
+    async def compute():
+        return json_response(*await caching.acached(TopicViewSet.hot, request, data))
+
+    return await conditional_list(request, Topic.objects.hot(), compute)
+
+
+async def topic_detail(request, pk):
+    only_params(request, {"fields"})
+    row = await Topic.objects.filter(pk=pk).values_list(*TOPIC_STATE_COLUMNS).afirst()
+    if row is None:
+        raise Fallback
+    state = topic_state_of(pk, row, *await caching.in_cache_thread(topic_versions))
+    not_modified, etag, last_modified = check_conditional(request, state)
+    if not_modified is not None:
+        return not_modified
+
+    rows = topic_rows(request, TopicDetailRows)
+    topic = await rows.values(Topic.objects.filter(pk=pk)).afirst()
+    if topic is None:
+        raise Fallback
+    data = await rows.aserialize([topic])
+    return set_validators(json_response(data[0]), etag, last_modified)
+
+
+async def category_list(request):
+    only_params(request, {"page"})
+
+    async def data():
+        rows = CategoryRows.for_request(request)
+        return await paginated_rows(CategoryViewSet.pagination_class(), rows.values(CategoryViewSet.queryset),
+                                    request, rows)
+
+    return json_response(*await caching.acached(CategoryViewSet.list, request, data))
+
+
+async def tag_cloud(request):
+    async def data():
+        return [{"slug": slug, "name": name, "topics": n} async for slug, name, n in tag_cloud_rows()]
+
+    return json_response(*await caching.acached(TagCloudAPIView.get, request, data))
+
+
+def urlpatterns(router, tag_cloud_view):
+    """Маршруты перед маршрутами ``router``: те же URL и имена, синхронные представления — для остального."""
+    views = {pattern.name: pattern.callback for pattern in router.urls if pattern.name}
+    return [
+        path("topics/hot/", hybrid(topics_hot, views["topic-hot"]), name="topic-hot"),
+        path("topics/new/", hybrid(topics_new, views["topic-new"]), name="topic-new"),
+        path("topics/<int:pk>/", hybrid(topic_detail, views["topic-detail"]), name="topic-detail"),
+        path("topics/", hybrid(topic_list, views["topic-list"]), name="topic-list"),
+        path("categories/", hybrid(category_list, views["category-list"]), name="category-list"),
+        path("tags/cloud/", hybrid(tag_cloud, tag_cloud_view), name="tag-cloud"),
+    ]
@@ -0,0 +1,167 @@
+"""
+Поиск запрещённых слов автоматом Ахо — Корасик.
+
+Автомат строится один раз из списка ``settings.BANNED_WORDS`` и файла
+``settings.BANNED_WORDS_FILE`` (по термину в строке, ``#`` — комментарий)
+и проходит текст за один проход: время проверки зависит от длины текста,
+а не от размера списка. Сравнение — по подстроке без учёта регистра, как
+у прежней проверки.
+
+Файл перечитывается без перезапуска: не чаще раза в
+``BANNED_WORDS_RELOAD_INTERVAL`` секунд сверяется его mtime, и при
+изменении новый автомат собирается и подменяет старый целиком.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORDS = ("spam", "fake", "scam", "дурь", "запрещенка")
+
+
+def normalize(text):
+    return (text or "").lower()
+
+
+class Matcher:
+    """Автомат Ахо — Корасик над набором терминов."""
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        self.size = 0
+        for term in {normalize(t).strip() for t in terms}:
+            if term:
+                self._add(term)
+                self.size += 1
+        self._link()
+
+    def __len__(self):
+        return self.size
+
+    def _add(self, term):
+        state = 0
+        for char in term:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+            state = nxt
+        self.out[state] = (term,)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                if self.out[self.fail[nxt]]:
+                    self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """
+        Совпавшие термины в порядке первого появления в тексте. Автомат только
+        читается: переходы по ссылкам неудачи не запоминаются, поэтому его
+        размер не зависит от проверяемых текстов и он безопасен между потоками.
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        found = {}
+        state = 0
+        for char in normalize(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for term in out[state]:
+                    found.setdefault(term, None)
+        return list(found)
+
+    def find_many(self, texts):
+        return [self.find(text) for text in texts]
+
+
+def read_terms(path):
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+
+class BannedWords:
+    """Текущий автомат с перечитыванием файла по изменению mtime."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.matcher = None
+        self.source = None
+        self.checked_at = 0.0
+
+    def _source(self):
+        path = getattr(settings, "BANNED_WORDS_FILE", "") or None
+        mtime = None
+        if path:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                logger.warning("Banned words file %s is not readable", path)
+        return path, mtime
+
+    def get(self):
+        now = time.monotonic()
+        interval = float(getattr(settings, "BANNED_WORDS_RELOAD_INTERVAL", 5))
+        if self.matcher is not None and now - self.checked_at < interval:
+            return self.matcher
+        with self.lock:
+            self.checked_at = now
+            source = self._source()
+            if self.matcher is None or source != self.source:
+                self.matcher = self.build(*source)
+                self.source = source
+            return self.matcher
+
+    def build(self, path, mtime):
+        terms = list(getattr(settings, "BANNED_WORDS", DEFAULT_WORDS))
+        if path and mtime is not None:
+            terms.extend(read_terms(path))
+        started = time.perf_counter()
+        matcher = Matcher(terms)
+        logger.info("Banned words automaton: %d terms, %d states, %.1f ms",
+                    len(matcher), len(matcher.goto), (time.perf_counter() - started) * 1000)
+        return matcher
+
+    def reload(self):
+        with self.lock:
+            self.matcher = None
+        return self.get()
+
+
+banned_words = BannedWords()
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting.startswith("BANNED_WORDS"):
+        banned_words.reload()
+
+
+def find_banned_words(text):
+    return banned_words.get().find(text)
+
+
+def find_banned_words_many(texts):
+    """Пакетная проверка: для каждого текста — список совпавших терминов."""
+    return banned_words.get().find_many(texts)
@@ -0,0 +1,247 @@
+"""
+Контентно-адресуемое хранение вложений.
+
+Загрузка читается порциями (``UploadedFile.chunks()``): SHA-256 считается по
+ходу записи во временный файл, в памяти целиком файл не бывает. Файл ложится в
+``blobs/ab/cd/<sha256>``; если такой blob уже есть, временный файл удаляется, а
+у blob-а растёт ``ref_count``. Удаление вложения уменьшает счётчик, blob без
+ссылок удаляется вместе с файлом. Расхождения счётчиков и файлы-сироты убирает
+команда ``gc_blobs``.
+
+Выдача (``serve``):
+
+* ``ATTACHMENT_OFFLOAD = "accel"`` — ``X-Accel-Redirect`` на
+  ``ATTACHMENT_ACCEL_PREFIX`` + имя файла (nginx, location с ``internal``);
+* ``"sendfile"`` — ``X-Sendfile`` с абсолютным путём (Apache mod_xsendfile, lighttpd);
+* иначе ``FileResponse`` с поддержкой ``Range``: сервер с ``wsgi.file_wrapper``
+  (gunicorn) отдаёт файл через sendfile без копирования в Python.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, ProtectedError, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .models import Attachment, Blob
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "blobs"
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def blob_name(sha256):
+    return f"{PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class TemporaryFile(File):
+    """Готовый временный файл: FileSystemStorage переносит его rename-ом, без копирования."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+def spool(chunks):
+    """Пишет порции во временный файл; возвращает (путь, sha256, размер)."""
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False) as tmp:
+        try:
+            for chunk in chunks:
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    return tmp.name, digest.hexdigest(), size
+
+
+def store(chunks, expected_sha256=None):
+    """
+    Blob с таким содержимым (новый или существующий) с уже учтённой ссылкой.
+    Если задан ``expected_sha256`` и содержимое с ним не совпало — ``ChecksumMismatch``.
+    """
+    path, sha256, size = spool(chunks)
+    try:
+        if expected_sha256 and sha256 != expected_sha256:
+            raise ChecksumMismatch(sha256)
+        if Blob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1):
+            return Blob.objects.get(sha256=sha256)
+        with open(path, "rb") as fh:
+            name = default_storage.save(blob_name(sha256), TemporaryFile(fh))
+        try:
+            with transaction.atomic():
+                return Blob.objects.create(sha256=sha256, size=size, file=name, ref_count=1)
+        except IntegrityError:
+            # Параллельная загрузка того же содержимого успела создать blob.
+            default_storage.delete(name)
+            Blob.objects.filter(sha256=sha256).update(ref_count=F("ref_count") + 1)
+            return Blob.objects.get(sha256=sha256)
+    finally:
+        discard_temporary(path)
+
+
+def discard_temporary(path):
+    # После rename в хранилище временного файла уже нет.
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def attach(post, upload, name=None):
+    """Вложение к сообщению из загруженного файла (любой объект с ``chunks()``)."""
+    with transaction.atomic():
+        blob = store(upload.chunks())
+        return Attachment.objects.create(post=post, blob=blob, name=name or os.path.basename(upload.name or ""))
+
+
+def release(blob_id):
+    """Снимает одну ссылку; blob без ссылок удаляется, файл — после коммита."""
+    if blob_id is None:
+        return
+    Blob.objects.filter(pk=blob_id, ref_count__gt=0).update(ref_count=F("ref_count") - 1)
+    name = Blob.objects.filter(pk=blob_id, ref_count=0).values_list("file", flat=True).first()
+    if name is None:
+        return
+    try:
+        deleted, _ = Blob.objects.filter(pk=blob_id, ref_count=0).delete()
+    except ProtectedError:
+        # Счётчик разошёлся с вложениями — поправит gc_blobs.
+        logger.warning("Blob %s has ref_count=0 but is still referenced", blob_id)
+        return
+    if deleted:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+def recount():
+    """Пересчитывает ref_count по вложениям; возвращает число исправленных blob-ов."""
+    refs = (Attachment.objects.filter(blob=OuterRef("pk")).order_by()
+            .values("blob").annotate(n=Count("pk")).values("n"))
+    actual = Coalesce(Subquery(refs), 0)
+    return Blob.objects.exclude(ref_count=actual).update(ref_count=actual)
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) для одного диапазона; None — отдать целиком; ValueError — 416."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeFile:
+    """Окно файла для FileResponse: read() не выходит за диапазон, fileno() — для sendfile."""
+
+    def __init__(self, fh, start, length):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fh.fileno()
+
+    def close(self):
+        self.fh.close()
+
+
+def content_type(name):
+    guessed, _ = mimetypes.guess_type(name)
+    return guessed or "application/octet-stream"
+
+
+def is_inline(media_type):
+    # Картинки открываются в браузере; HTML, SVG и прочее — только скачиванием (XSS с нашего домена).
+    return media_type.startswith("image/") and media_type != "image/svg+xml"
+
+
+def serve(request, attachment):
+    blob = attachment.blob
+    etag = quote_etag(blob.sha256)
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    name = attachment.name or blob.sha256
+    media_type = content_type(name)
+    offload = getattr(settings, "ATTACHMENT_OFFLOAD", "")
+    if offload in ("accel", "sendfile"):
+        # Range и передачу байтов берёт на себя веб-сервер; заголовки ответа он сохраняет.
+        response = HttpResponse(content_type=media_type)
+        if offload == "accel":
+            prefix = getattr(settings, "ATTACHMENT_ACCEL_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix + blob.file.name
+        else:
+            response["X-Sendfile"] = default_storage.path(blob.file.name)
+    else:
+        response = file_response(request, blob, etag, media_type)
+        if response.status_code == 416:
+            return response
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(blob.created_at.timestamp())
+    response["Cache-Control"] = f"public, max-age={int(getattr(settings, 'ATTACHMENT_CACHE_SECONDS', 86400))}"
+    response["Content-Disposition"] = content_disposition_header(not is_inline(media_type), name)
+    response["X-Content-Type-Options"] = "nosniff"
+    return response
+
+
+def file_response(request, blob, etag, media_type):
+    size = blob.size
+    header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range.strip() != etag:
+        header = None
+    try:
+        window = parse_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    fh = blob.file.storage.open(blob.file.name, "rb")
+    if window is None:
+        response = FileResponse(fh, content_type=media_type)
+        response["Content-Length"] = str(size)
+    else:
+        start, end = window
+        response = FileResponse(RangeFile(fh, start, end - start + 1), status=206, content_type=media_type)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,275 @@
+"""
+Кэш ответов публичных GET-эндпоинтов для анонимных пользователей.
+
+Ключ строится из пути, нормализованных query-параметров и текущих версий
+моделей, от которых зависит ответ. Версии хранятся в кэше и увеличиваются
+сигналами post_save/post_delete (см. ``track``) и явными ``bump`` там, где
+запись идёт мимо сигналов (голоса, отложенные рейтинги). Старые записи не
+удаляются — они просто перестают совпадать по ключу и истекают по таймауту.
+
+Версия увеличивается после коммита транзакции (``transaction.on_commit``): иначе
+параллельный GET успел бы сохранить под новой версией ещё старые строки.
+
+Асинхронные представления (qa.async_views) читают и пишут те же записи через
+``acached``: ключ и формат значения у обоих путей общие.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from . import metrics
+from .sparse import expansion_models
+
+VERSION_PREFIX = "qa:ver:"
+MTIME_PREFIX = "qa:mtime:"
+RESPONSE_PREFIX = "qa:resp:"
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+RESPONSE_CACHE = metrics.counter("questudio_response_cache_total", "Обращения к кэшу ответов по исходу.",
+                                 ("name", "outcome"))
+
+
+def get_cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def response_timeout():
+    return getattr(settings, "RESPONSE_CACHE_TIMEOUT", 300)
+
+
+def label_of(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def _seed():
+    # Стартовое значение версии зависит от времени: если ключ версии вытеснен
+    # из кэша, новая версия не совпадёт со старыми записями ответов.
+    return int(time.time() * 1000)
+
+
+def bump(*models):
+    """Новые версии моделей — после коммита текущей транзакции (вне транзакции — сразу)."""
+    transaction.on_commit(functools.partial(bump_now, *models))
+
+
+def bump_now(*models):
+    cache = get_cache()
+    for model in models:
+        key = VERSION_PREFIX + label_of(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _seed(), None)
+    cache.set_many({MTIME_PREFIX + label_of(model): time.time() for model in models}, None)
+
+
+def versions(labels):
+    cache = get_cache()
+    keys = [VERSION_PREFIX + label for label in labels]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _seed(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def changed_at(labels):
+    """Время последнего ``bump`` любой из моделей; если отметка потеряна — текущее время."""
+    found = get_cache().get_many([MTIME_PREFIX + label for label in labels])
+    if len(found) < len(labels):
+        return time.time()
+    return max(found.values(), default=0)
+
+
+def _on_change(sender, **kwargs):
+    if not kwargs.get("raw"):
+        bump(sender)
+
+
+def _remember_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields, label = sender._qa_tracked_fields
+    instance.__dict__.pop("_qa_fields_changed", None)
+    if raw or instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)):
+        return
+    stored = sender._default_manager.filter(pk=instance.pk).values_list(*fields).first()
+    if stored is not None and stored != tuple(getattr(instance, field) for field in fields):
+        instance._qa_fields_changed = label
+
+
+def _on_fields_change(sender, instance, **kwargs):
+    label = instance.__dict__.pop("_qa_fields_changed", None)
+    if label is not None:
+        bump(label)
+
+
+def track_fields(model, fields, label):
+    """
+    Версия ``label`` меняется только при изменении ``fields`` уже сохранённого
+    объекта: например, имени автора, которое видно в лентах, — но не входа или
+    правки профиля. Для сравнения перед сохранением читается одна строка.
+    """
+    model._qa_tracked_fields = (tuple(fields), label)
+    uid = f"qa.caching.{label}"
+    pre_save.connect(_remember_fields, sender=model, dispatch_uid=uid + ".pre_save", weak=False)
+    post_save.connect(_on_fields_change, sender=model, dispatch_uid=uid + ".save", weak=False)
+
+
+def track(*models):
+    """Подписывает модели на увеличение версии при сохранении и удалении."""
+    for model in models:
+        uid = f"qa.caching.{label_of(model)}"
+        post_save.connect(_on_change, sender=model, dispatch_uid=uid + ".save", weak=False)
+        post_delete.connect(_on_change, sender=model, dispatch_uid=uid + ".delete", weak=False)
+
+
+def count(name, outcome):
+    with _stats_lock:
+        _stats[(name, outcome)] += 1
+    RESPONSE_CACHE.inc(name=name, outcome=outcome)
+
+
+def stats():
+    """Счётчики попаданий/промахов: {имя: {"hit": n, "miss": n, ...}}."""
+    with _stats_lock:
+        result = {}
+        for (name, outcome), value in _stats.items():
+            result.setdefault(name, {})[outcome] = value
+        return result
+
+
+def cache_key(name, request, labels):
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    raw = json.dumps([request.path, params, versions(labels)], separators=(",", ":"))
+    return f"{RESPONSE_PREFIX}{name}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def cached_response(status, data, outcome):
+    response = Response(data, status=status)
+    response["X-Cache"] = outcome.upper()
+    return response
+
+
+def cache_response(*models, timeout=None, lock_timeout=10, wait=2.0):
+    """
+    Декоратор метода DRF-представления (``get``, ``list``, action).
+
+    Кэширует успешные ответы анонимным GET/HEAD-запросам. Пересчёт
+    однопоточный: ключ блокировки ставится через ``cache.add``, остальные
+    запросы ждут готовый ответ до ``wait`` секунд.
+    """
+    labels = sorted({label_of(model) for model in models})
+
+    def decorator(method):
+        name = method.__qualname__
+
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or request.user.is_authenticated:
+                return method(view, request, *args, **kwargs)
+
+            cache = get_cache()
+            # ?expand= добавляет к ответу данные других моделей — и их версии к ключу.
+            extra = sorted({label_of(model) for model in expansion_models(view, request)} - set(labels))
+            key = cache_key(name, request, labels + extra)
+            hit = cache.get(key)
+            if hit is not None:
+                count(name, "hit")
+                return cached_response(*hit, "hit")
+
+            lock_key = key + ":lock"
+            if not cache.add(lock_key, 1, lock_timeout):
+                deadline = time.monotonic() + wait
+                while time.monotonic() < deadline:
+                    time.sleep(0.02)
+                    hit = cache.get(key)
+                    if hit is not None:
+                        count(name, "hit")
+                        return cached_response(*hit, "hit")
+                count(name, "wait_timeout")
+                return method(view, request, *args, **kwargs)
+
+            try:
+                count(name, "miss")
+                response = method(view, request, *args, **kwargs)
+                if response.status_code == 200 and not response.exception:
+                    data = json.loads(JSONRenderer().render(response.data))
+                    cache.set(key, (response.status_code, data),
+                              response_timeout() if timeout is None else timeout)
+                response["X-Cache"] = "MISS"
+                return response
+            finally:
+                cache.delete(lock_key)
+
+        # Имя и модели нужны асинхронному варианту представления (acached) для того же ключа.
+        wrapper.cache_name = name
+        wrapper.cache_labels = labels
+        return wrapper
+
+    return decorator
+
+
+async def in_cache_thread(function, *args):
+    """
+    Вызов синхронной функции, работающей с кэшем, из асинхронного кода. Кэш в
+    памяти процесса не блокирует — вызывается сразу; остальные бэкенды — одним
+    переходом в поток на всю функцию (a-методы BaseCache переходят на каждый ключ).
+    """
+    if isinstance(get_cache(), LocMemCache):
+        return function(*args)
+    return await sync_to_async(function)(*args)
+
+
+def lookup(name, request, labels):
+    key = cache_key(name, request, labels)
+    return key, get_cache().get(key)
+
+
+async def acached(method, request, compute, timeout=None, lock_timeout=10, wait=2.0):
+    """
+    Асинхронный ``cache_response`` для анонимного GET: ``method`` — метод
+    DRF-представления под этим декоратором (ключ и записи у обоих путей общие),
+    ``compute()`` — корутина, возвращающая данные ответа. Возвращает (данные, исход).
+    """
+    name, labels = method.cache_name, method.cache_labels
+    cache = get_cache()
+    key, hit = await in_cache_thread(lookup, name, request, labels)
+    if hit is not None:
+        count(name, "hit")
+        return hit[1], "hit"
+
+    lock_key = key + ":lock"
+    if not await in_cache_thread(cache.add, lock_key, 1, lock_timeout):
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            hit = await in_cache_thread(cache.get, key)
+            if hit is not None:
+                count(name, "hit")
+                return hit[1], "hit"
+        count(name, "wait_timeout")
+        return await compute(), "wait_timeout"
+
+    try:
+        count(name, "miss")
+        data = await compute()
+        await in_cache_thread(cache.set, key, (200, json.loads(JSONRenderer().render(data))),
+                              response_timeout() if timeout is None else timeout)
+        return data, "miss"
+    finally:
+        await in_cache_thread(cache.delete, lock_key)
@@ -0,0 +1,87 @@
+"""
+Условные GET-запросы: ETag, Last-Modified и ответ 304.
+
+Валидатор (``validator(view, request, *args, **kwargs)``) одним дешёвым
+запросом к индексу собирает «отпечаток» ресурса — метки времени, счётчики,
+суммы рейтингов — и возвращает ``(parts, last_modified)``. ETag — хеш
+отпечатка, query-параметров и пользователя (в ответах есть ``is_editable``).
+Если заголовки ``If-None-Match``/``If-Modified-Since`` совпали, представление
+не вызывается вовсе: ни тяжёлого queryset, ни сериализации.
+
+Рейтинги и счётчики меняются мимо ``updated_at``, поэтому Last-Modified
+дополнительно учитывает время последнего ``caching.bump`` связанных моделей.
+С кэшем в памяти процесса эти отметки у каждого воркера свои — ETag
+(приоритетный по RFC 9110) от этого не зависит.
+"""
+import functools
+import hashlib
+import json
+from calendar import timegm
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, parts):
+    user = request.user
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    raw = json.dumps([parts, params, user.pk, user.is_staff], cls=DjangoJSONEncoder, separators=(",", ":"))
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def timestamp(value):
+    """datetime или число секунд -> целые секунды эпохи (точность HTTP-даты)."""
+    if value is None:
+        return None
+    if hasattr(value, "utctimetuple"):
+        return timegm(value.utctimetuple())
+    return int(value)
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # Браузер должен перепроверять ресурс каждый раз, а не брать его из кэша по эвристике.
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization",))
+    return response
+
+
+def conditional(validator):
+    """Декоратор метода DRF-представления: ETag/Last-Modified и 304 до выполнения метода."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return method(view, request, *args, **kwargs)
+            state = validator(view, request, *args, **kwargs)
+            if state is None:
+                return method(view, request, *args, **kwargs)
+
+            parts, last_modified = state
+            etag = make_etag(request, parts)
+            last_modified = timestamp(last_modified)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if isinstance(not_modified, HttpResponseNotModified):
+                return set_validators(not_modified, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                set_validators(response, etag, last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def latest(*values):
+    """Максимум из меток времени (datetime или секунд эпохи), пропуская пустые."""
+    stamps = [timestamp(value) for value in values if value is not None]
+    return max(stamps) if stamps else None
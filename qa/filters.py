@@ -1,5 +1,7 @@
 import django_filters as df
 from django.db.models import Q
+from rest_framework.filters import SearchFilter
+from . import search
 from .models import Topic
 
 class TopicFilter(df.FilterSet):
@@ -18,7 +20,42 @@ class TopicFilter(df.FilterSet):
         fields = ["category", "author", "tag", "rating_gte", "rating_lte"]
 
     def filter_q(self, queryset, name, value):
-        return queryset.filter(Q(title__icontains=value) | Q(body__icontains=value))
+        ids = search.matching_ids(value, search.TOPIC)
+        if ids is None:
+            return queryset.filter(Q(title__icontains=value) | Q(body__icontains=value))
+        return queryset.filter(pk__in=ids)
 
     def filter_q_cs(self, queryset, name, value):
         return queryset.filter(Q(title__contains=value) | Q(body__contains=value))
+
+
+class IndexSearchFilter(SearchFilter):
+    """
+    SearchFilter, который для представлений с ``search_kind`` ищет по
+    полнотекстовому индексу (qa.search): без LIKE по JOIN-ам и без дублей строк.
+    Поля из ``search_fields``, которых нет в индексе (не перечислены в
+    ``search_indexed_fields``: автор, категория, заголовок темы сообщения),
+    проверяются как в SearchFilter; как и там, каждое слово должно найтись
+    в индексе или в одном из этих полей. Если индекс недоступен, работает как
+    обычный SearchFilter по ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        kind = getattr(view, "search_kind", None)
+        terms = self.get_search_terms(request)
+        if kind is None or not terms or search.get_backend() is None:
+            return super().filter_queryset(request, queryset, view)
+        indexed = set(getattr(view, "search_indexed_fields", ()))
+        lookups = [self.construct_search(str(field), queryset)
+                   for field in self.get_search_fields(view, request) or () if field not in indexed]
+        condition = Q()
+        for term in terms:
+            ids = search.matching_ids(term, kind)
+            if ids is None:
+                # В слове нет ни одной лексемы (одни знаки) — индекс его не учитывает.
+                continue
+            term_condition = Q(pk__in=ids)
+            for lookup in lookups:
+                term_condition |= Q(**{lookup: term})
+            condition &= term_condition
+        return queryset.filter(condition)
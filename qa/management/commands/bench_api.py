@@ -0,0 +1,272 @@
+import json
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from qa.models import Category, Tag, Topic, Post, Comment
+
+User = get_user_model()
+
+NAMESPACES = (("qa", "qa.urls"), ("accounts", "accounts.urls"))
+
+# Дополнительные варианты query-параметров для эндпоинтов; "{topic}" — id выбранной темы.
+VARIANTS = {
+    "qa:topic-list": [{}, {"cursor": ""}, {"ordering": "-rating"}, {"q": "индекс"}],
+    "qa:post-list": [{"topic": "{topic}"}, {"topic": "{topic}", "cursor": ""}],
+    "qa:comment-list": [{}, {"cursor": ""}],
+    "qa:search": [{"q": "индекс"}, {"q": "query", "kind": "post"}],
+    "accounts:leaderboard": [{}, {"period": "week"}],
+}
+
+# Метрики для сравнения с базовым прогоном; strict — регрессией считается любой рост.
+COMPARED = (("p95_ms", False), ("queries", True), ("rows", False), ("bytes", False))
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def walk(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from walk(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern
+
+
+def allows_get(pattern):
+    callback = pattern.callback
+    actions = getattr(callback, "actions", None)
+    if actions is not None:
+        return "get" in actions
+    view_class = getattr(callback, "cls", None) or getattr(callback, "view_class", None)
+    return view_class is None or hasattr(view_class, "get")
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks every GET endpoint in qa.urls and accounts.urls in-process: p50/p95/p99 latency, "
+            "queries, rows fetched and response bytes. Writes JSON and compares against a baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=30, help="Timed requests per endpoint.")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--scale", type=float, default=None,
+                            help="Seed a dataset first (seed_demo --scale) unless the bench prefix already exists.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--only", action="append", default=[], help="Substring filter on endpoint names.")
+        parser.add_argument("--cold", action="store_true", help="Clear caches before every request.")
+        parser.add_argument("--output", help="Write results to this JSON file.")
+        parser.add_argument("--compare", help="Baseline JSON file to diff against.")
+        parser.add_argument("--threshold", type=float, default=0.15,
+                            help="Relative growth of p95 latency treated as a regression (default 15%%).")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **opts):
+        if opts["scale"]:
+            self.seed(opts)
+        if not Topic.objects.exists():
+            raise CommandError("Database has no topics; run seed_demo or pass --scale.")
+
+        middleware = [m for m in settings.MIDDLEWARE if not m.startswith("silk.")]
+        hosts = list(settings.ALLOWED_HOSTS) + ["testserver"]
+        with override_settings(MIDDLEWARE=middleware, ALLOWED_HOSTS=hosts, DEBUG=False, QUERY_BUDGET_RAISE=False,
+                               PROFILING_ENABLED=False):
+            results = self.run(opts)
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "vendor": connection.vendor,
+                "python": platform.python_version(),
+                "repeat": opts["repeat"],
+                "cold": opts["cold"],
+                "topics": Topic.objects.count(),
+                "posts": Post.objects.count(),
+            },
+            "results": results,
+        }
+        self.print_table(results)
+        over_budget = self.check_budgets(results)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Results written to {opts['output']}")
+        if opts["compare"]:
+            regressions = self.compare(opts["compare"], results, opts["threshold"])
+            if regressions and opts["fail_on_regression"]:
+                raise CommandError(f"{regressions} regression(s) beyond threshold.")
+        if over_budget and opts["fail_on_regression"]:
+            raise CommandError(f"{over_budget} endpoint(s) over query budget.")
+
+    def seed(self, opts):
+        if User.objects.filter(username__startswith="bench_").exists():
+            self.stdout.write("Bench dataset already present, skipping seeding.")
+            return
+        call_command("seed_demo", scale=opts["scale"], seed=opts["seed"], prefix="bench",
+                     copy=connection.vendor == "postgresql", stdout=self.stdout)
+
+    def fixtures(self):
+        topic = Topic.objects.order_by("-posts_count", "id").first()
+        post = Post.objects.filter(topic=topic).order_by("id").first() or Post.objects.order_by("id").first()
+        comment = Comment.objects.order_by("id").first()
+        category = Category.objects.order_by("id").first()
+        tag = Tag.objects.order_by("id").first()
+        return {
+            "topic": {"pk": topic.pk},
+            "post": {"pk": post.pk} if post else None,
+            "comment": {"pk": comment.pk} if comment else None,
+            "category": {"slug": category.slug} if category else None,
+            "tag": {"slug": tag.slug} if tag else None,
+            "topic_id": topic.pk,
+        }
+
+    def cases(self, opts):
+        fixtures = self.fixtures()
+        for namespace, module in NAMESPACES:
+            urlconf = import_module(module)
+            for pattern in walk(urlconf.urlpatterns):
+                params = set(pattern.pattern.regex.groupindex)
+                if "format" in params or not allows_get(pattern):
+                    continue
+                name = f"{namespace}:{pattern.name}"
+                kwargs = {}
+                if params:
+                    kwargs = fixtures.get(pattern.name.rsplit("-", 1)[0])
+                    if kwargs is None or set(kwargs) != params:
+                        self.stdout.write(self.style.WARNING(f"Skipping {name}: no sample for {sorted(params)}"))
+                        continue
+                url = reverse(name, kwargs=kwargs)
+                for query in VARIANTS.get(name, [{}]):
+                    query = {k: v.format(topic=fixtures["topic_id"]) for k, v in query.items()}
+                    label = name + ("?" + "&".join(f"{k}={v}" for k, v in query.items()) if query else "")
+                    if opts["only"] and not any(part in label for part in opts["only"]):
+                        continue
+                    yield label, url, query
+
+    def run(self, opts):
+        user = User.objects.filter(is_active=True).order_by("id").first()
+        results = {}
+        for label, url, query in self.cases(opts):
+            client = APIClient()
+            response = client.get(url, query)
+            if response.status_code in (401, 403) and user is not None:
+                client.force_authenticate(user)
+                label += " [auth]"
+                response = client.get(url, query)
+            results[label] = self.measure(client, url, query, opts) | {"status": response.status_code}
+            self.stdout.write(f"  {label}: p95 {results[label]['p95_ms']:.1f} ms")
+        return results
+
+    def request(self, client, url, query, cold):
+        if cold:
+            for alias in settings.CACHES:
+                caches[alias].clear()
+        return client.get(url, query)
+
+    def measure(self, client, url, query, opts):
+        for _ in range(max(0, opts["warmup"])):
+            self.request(client, url, query, opts["cold"])
+        timings = []
+        for _ in range(max(1, opts["repeat"])):
+            started = time.perf_counter()
+            self.request(client, url, query, opts["cold"])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Отдельный прогон с перехватом SQL: запросы и строки не искажают замер времени.
+        with self.capture() as statements:
+            response = self.request(client, url, query, opts["cold"])
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "queries": len(statements),
+            "rows": self.count_rows(statements),
+            "bytes": len(body),
+            "budget": getattr(response, "query_budget", None),
+        }
+
+    @contextmanager
+    def capture(self):
+        statements = []
+
+        def wrapper(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            yield statements
+
+    def count_rows(self, statements):
+        rows = 0
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                    continue
+                try:
+                    cursor.execute(f"SELECT COUNT(*) FROM ({sql}) AS bench_rows", params)
+                    rows += cursor.fetchone()[0]
+                except Exception:
+                    # Не каждый запрос можно обернуть подзапросом (например, с FOR UPDATE).
+                    continue
+        return rows
+
+    def print_table(self, results):
+        width = max([len(label) for label in results] + [8])
+        self.stdout.write(f"{'endpoint':<{width}} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                          f"{'queries':>7} {'budget':>6} {'rows':>7} {'bytes':>8}")
+        for label, r in results.items():
+            self.stdout.write(f"{label:<{width}} {r['status']:>6} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                              f"{r['p99_ms']:>8.2f} {r['queries']:>7} {str(r.get('budget', '-')):>6} {r['rows']:>7} {r['bytes']:>8}")
+
+    def check_budgets(self, results):
+        over = [(label, r) for label, r in results.items()
+                if r.get("budget") is not None and r["queries"] > r["budget"]]
+        for label, r in over:
+            self.stdout.write(self.style.ERROR(f"  OVER BUDGET {label}: {r['queries']} queries > {r['budget']}"))
+        return len(over)
+
+    def compare(self, path, results, threshold):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                baseline = json.load(fh)["results"]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Cannot read baseline {path}: {exc}")
+
+        regressions = 0
+        self.stdout.write(f"\nComparison with {path} (threshold {threshold:.0%}):")
+        for label in sorted(set(results) | set(baseline)):
+            if label not in baseline or label not in results:
+                state = "new" if label not in baseline else "removed"
+                self.stdout.write(f"  {label}: {state}")
+                continue
+            old, new = baseline[label], results[label]
+            notes = []
+            for metric, strict in COMPARED:
+                before, after = old.get(metric), new.get(metric)
+                if before is None or after is None or after <= before:
+                    continue
+                growth = (after - before) / before if before else float("inf")
+                if strict or growth > threshold:
+                    notes.append(f"{metric} {before} -> {after} (+{growth:.0%})")
+            if notes:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f"  REGRESSION {label}: " + "; ".join(notes)))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("  No regressions."))
+        return regressions
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import UserStats
+from qa.models import Topic
+
+from .bench_api import percentile
+
+SERVERS = ("wsgi", "asgi")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def read_response(reader):
+    """(статус, закрыть ли соединение); тело читается и отбрасывается."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length, chunked, close = None, False, False
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == b"content-length":
+            length = int(value)
+        elif name == b"transfer-encoding":
+            chunked = b"chunked" in value
+        elif name == b"connection":
+            close = value == b"close"
+    if chunked:
+        while size := int((await reader.readuntil(b"\r\n")).split(b";")[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readuntil(b"\r\n")
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+class Load:
+    """Клиенты с keep-alive по кругу запрашивают пути; замеры — только после прогрева."""
+
+    def __init__(self, host, port, paths, clients, duration, warmup, timeout):
+        self.host, self.port, self.paths = host, port, paths
+        self.clients, self.duration, self.warmup, self.timeout = clients, duration, warmup, timeout
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+
+    async def client(self, index, measure_from, deadline):
+        requests = [f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: application/json\r\n\r\n"
+                    .encode() for path in self.paths]
+        position = index % len(requests)
+        reader = writer = None
+        while time.monotonic() < deadline:
+            path = self.paths[position]
+            started = time.monotonic()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+                writer.write(requests[position])
+                status, close = await asyncio.wait_for(read_response(reader), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError) as exc:
+                if started >= measure_from:
+                    self.errors[type(exc).__name__] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                await asyncio.sleep(0.05)
+                continue
+            if started >= measure_from:
+                self.latencies[path].append((time.monotonic() - started) * 1000)
+                self.statuses[status] += 1
+            if close:
+                writer.close()
+                reader = writer = None
+            position = (position + 1) % len(requests)
+        if writer is not None:
+            writer.close()
+
+    async def run(self):
+        now = time.monotonic()
+        measure_from = now + self.warmup
+        deadline = measure_from + self.duration
+        await asyncio.gather(*(self.client(i, measure_from, deadline) for i in range(self.clients)))
+
+    def summary(self):
+        timings = [ms for values in self.latencies.values() for ms in values]
+        result = {
+            "requests": len(timings),
+            "errors": sum(self.errors.values()),
+            "error_types": dict(self.errors),
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "rps": round(len(timings) / self.duration, 1),
+        }
+        if timings:
+            result.update({f"p{q}_ms": round(percentile(timings, q), 1) for q in (50, 95, 99)})
+            result["max_ms"] = round(max(timings), 1)
+        result["paths"] = {
+            path: {"requests": len(values), "p50_ms": round(percentile(values, 50), 1),
+                   "p99_ms": round(percentile(values, 99), 1)}
+            for path, values in self.latencies.items() if values
+        }
+        return result
+
+
+class Command(BaseCommand):
+    help = ("Load-tests the hot public read endpoints over HTTP with --clients concurrent keep-alive clients: "
+            "gunicorn (WSGI, synchronous DRF views) vs uvicorn (ASGI, ASYNC_READ_VIEWS=1), both started from "
+            "this checkout with the same settings and database. Reports req/s and p50/p95/p99 latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=500)
+        parser.add_argument("--duration", type=float, default=20, help="Measured seconds per server.")
+        parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before measuring.")
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout, seconds.")
+        parser.add_argument("--workers", type=int, default=2, help="Server processes for both servers.")
+        parser.add_argument("--threads", type=int, default=8, help="gunicorn gthread threads per worker.")
+        parser.add_argument("--only", choices=SERVERS, help="Benchmark one server only.")
+        parser.add_argument("--path", action="append", default=[], dest="paths",
+                            help="Request this path (repeatable); default — the hot read endpoints.")
+        parser.add_argument("--no-response-cache", action="store_true",
+                            help="Disable the anonymous response cache (RESPONSE_CACHE_TIMEOUT=0) in both servers.")
+        parser.add_argument("--wsgi-url", help="Use an already running WSGI server, e.g. http://127.0.0.1:8000.")
+        parser.add_argument("--asgi-url", help="Use an already running ASGI server.")
+        parser.add_argument("--output", help="Write results to this JSON file.")
+
+    def handle(self, *args, **opts):
+        paths = opts["paths"] or self.default_paths()
+        servers = [opts["only"]] if opts["only"] else list(SERVERS)
+        results = {}
+        for server in servers:
+            url = opts[f"{server}_url"]
+            process = None
+            if url is None:
+                port = free_port()
+                process = self.start(server, port, opts)
+                url = f"http://127.0.0.1:{port}"
+            try:
+                self.wait_ready(url + paths[0], process)
+                host, port = url.split("//", 1)[1].rsplit(":", 1)
+                self.stdout.write(f"{server}: {opts['clients']} clients, {opts['duration']:g}s on {url}")
+                load = Load(host, int(port), paths, opts["clients"], opts["duration"], opts["warmup"],
+                            opts["timeout"])
+                asyncio.run(load.run())
+                results[server] = load.summary()
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+        self.print_table(results)
+        if opts["output"]:
+            report = {"meta": {"clients": opts["clients"], "duration": opts["duration"], "workers": opts["workers"],
+                               "threads": opts["threads"], "cpus": os.cpu_count(), "paths": paths,
+                               "response_cache": not opts["no_response_cache"]},
+                      "results": results}
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Results written to {opts['output']}")
+
+    def default_paths(self):
+        topic = Topic.objects.order_by("-posts_count", "id").values_list("pk", flat=True).first()
+        if topic is None:
+            raise CommandError("Database has no topics; run seed_demo first.")
+        paths = ["/api/v1/topics/", f"/api/v1/topics/{topic}/", "/api/v1/topics/hot/", "/api/v1/topics/new/",
+                 "/api/v1/tags/cloud/", "/api/v1/categories/"]
+        if UserStats.objects.exists():
+            paths.append("/api/v1/accounts/leaderboard/")
+        return paths
+
+    def start(self, server, port, opts):
+        env = dict(os.environ, ASYNC_READ_VIEWS="1" if server == "asgi" else "0",
+                   DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+                   QUERY_BUDGET_RAISE="0", PROFILING_ENABLED="0", DEBUG="0")
+        if opts["no_response_cache"]:
+            env["RESPONSE_CACHE_TIMEOUT"] = "0"
+        workers = str(opts["workers"])
+        if server == "wsgi":
+            command = [sys.executable, "-m", "gunicorn", "config.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                       "--workers", workers, "--worker-class", "gthread", "--threads", str(opts["threads"]),
+                       "--backlog", "2048", "--log-level", "warning"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "config.asgi:application", "--host", "127.0.0.1",
+                       "--port", str(port), "--workers", workers, "--backlog", "2048", "--log-level", "warning",
+                       "--no-access-log"]
+        return subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+
+    def wait_ready(self, url, process, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise CommandError(f"Server exited with code {process.returncode}.")
+            try:
+                with urllib.request.urlopen(url, timeout=5):
+                    return
+            except OSError:
+                time.sleep(0.3)
+        raise CommandError(f"Server at {url} did not respond in {timeout}s.")
+
+    def print_table(self, results):
+        self.stdout.write(f"\n{'server':<6} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} "
+                          f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+        for server, row in results.items():
+            self.stdout.write(f"{server:<6} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8.1f} "
+                              f"{row.get('p50_ms', 0):>8.1f} {row.get('p95_ms', 0):>8.1f} "
+                              f"{row.get('p99_ms', 0):>8.1f} {row.get('max_ms', 0):>8.1f}")
+        for server, row in results.items():
+            if row["error_types"] or set(row["statuses"]) - {"200"}:
+                self.stdout.write(f"{server}: statuses {row['statuses']}, errors {row['error_types']}")
@@ -0,0 +1,54 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from qa.banned_words import Matcher
+
+ALPHABET = string.ascii_lowercase + "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+
+def legacy_find(words, text):
+    low = (text or "").lower()
+    return [w for w in words if w in low]
+
+
+class Command(BaseCommand):
+    help = ("Micro-benchmark of banned-word checks: legacy substring loop vs Aho-Corasick automaton "
+            "for growing word lists.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,100,1000,10000,50000", help="Comma-separated list sizes.")
+        parser.add_argument("--text-length", type=int, default=2000)
+        parser.add_argument("--texts", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(opts["seed"])
+        texts = [" ".join("".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(2, 10)))
+                          for _ in range(opts["text_length"] // 6))
+                 for _ in range(opts["texts"])]
+        self.stdout.write(f"{'terms':>7} {'build ms':>9} {'legacy us/text':>15} {'automaton us/text':>18} {'hits':>5}")
+        for size in (int(s) for s in opts["sizes"].split(",") if s.strip()):
+            words = {"".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(5, 12))) for _ in range(size)}
+            started = time.perf_counter()
+            matcher = Matcher(words)
+            build_ms = (time.perf_counter() - started) * 1000
+
+            legacy = self.measure(lambda t: legacy_find(words, t), texts)
+            automaton = self.measure(matcher.find, texts)
+            hits = sum(len(found) for found in matcher.find_many(texts))
+            assert hits == sum(len(legacy_find(words, t)) for t in texts), "matchers disagree"
+            self.stdout.write(f"{size:>7} {build_ms:>9.1f} {legacy:>15.1f} {automaton:>18.1f} {hits:>5}")
+
+    def measure(self, fn, texts):
+        for text in texts[:5]:
+            fn(text)
+        timings = []
+        for text in texts:
+            started = time.perf_counter()
+            fn(text)
+            timings.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(timings)
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, Avg, Max
+from django.utils import timezone
+
+from qa.models import Category, Topic, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks /topics/hot/ query paths: legacy per-request aggregation vs stored hot_score. "
+            "Synthetic data is generated inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated post counts.")
+        parser.add_argument("--posts-per-topic", type=int, default=20)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        sizes = [int(s) for s in opts["sizes"].split(",") if s.strip()]
+        self.stdout.write(f"{'posts':>10} {'topics':>8} {'path':>7} {'p50 ms':>9} {'p95 ms':>9}")
+        for size in sizes:
+            with transaction.atomic():
+                topics_n = self.populate(size, opts)
+                for name, fn in (("legacy", self.legacy_page), ("stored", self.stored_page)):
+                    p50, p95 = self.measure(fn, opts["repeat"], opts["page_size"])
+                    self.stdout.write(f"{size:>10} {topics_n:>8} {name:>7} {p50:>9.2f} {p95:>9.2f}")
+                transaction.set_rollback(True)
+
+    def populate(self, posts_n, opts):
+        rnd = random.Random(opts["seed"])
+        batch = opts["batch_size"]
+        now = timezone.now()
+        stamp = int(time.time())
+
+        users = User.objects.bulk_create(
+            [User(username=f"bench_hot_{stamp}_{i}") for i in range(200)], batch_size=batch)
+        if not users[0].pk:
+            users = list(User.objects.filter(username__startswith=f"bench_hot_{stamp}_"))
+        category, _ = Category.objects.get_or_create(slug="bench-hot", defaults={"name": "Bench hot"})
+
+        topics_n = max(1, posts_n // max(1, opts["posts_per_topic"]))
+        topics = [
+            Topic(category=category, author=rnd.choice(users), title=f"Bench topic {i}",
+                  slug=f"bench-{stamp}-{i}", body="Benchmark topic body",
+                  rating=rnd.randint(-5, 50),
+                  created_at=now - timezone.timedelta(minutes=rnd.randint(0, 60 * 24 * 60)))
+            for i in range(topics_n)
+        ]
+        Topic.objects.bulk_create(topics, batch_size=batch)
+        topic_ids = list(Topic.objects.filter(category=category).values_list("pk", flat=True))
+
+        buf = []
+        for i in range(posts_n):
+            buf.append(Post(topic_id=rnd.choice(topic_ids), author=rnd.choice(users), body="bench post",
+                            rating=rnd.randint(-3, 10),
+                            created_at=now - timezone.timedelta(minutes=rnd.randint(0, 60 * 24 * 60))))
+            if len(buf) >= batch:
+                Post.objects.bulk_create(buf)
+                buf = []
+        if buf:
+            Post.objects.bulk_create(buf)
+
+        qs = Topic.objects.filter(category=category)
+        Topic.objects.rebuild_counters(qs)
+        Topic.objects.refresh_hot_scores(qs, batch_size=batch)
+        return topics_n
+
+    def legacy_page(self, page_size):
+        week_ago = timezone.now() - timezone.timedelta(days=7)
+        qs = (Topic.objects
+              .filter(created_at__gte=week_ago)
+              .annotate(legacy_posts=Count("posts", distinct=True))
+              .annotate(legacy_avg=Avg("posts__rating"))
+              .annotate(legacy_last=Max("posts__created_at"))
+              .order_by("-legacy_posts", "-legacy_last", "-rating")
+              .select_related("category", "author"))
+        return list(Paginator(qs, page_size).page(1))
+
+    def stored_page(self, page_size):
+        qs = Topic.objects.hot().select_related("category", "author")
+        return list(Paginator(qs, page_size).page(1))
+
+    def measure(self, fn, repeat, page_size):
+        fn(page_size)
+        timings = []
+        for _ in range(max(1, repeat)):
+            started = time.perf_counter()
+            fn(page_size)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(round(len(timings) * 0.95)) - 1)]
+        return statistics.median(timings), p95
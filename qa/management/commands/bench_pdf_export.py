@@ -0,0 +1,91 @@
+import io
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from qa import pdfexport
+from qa.querybudget import count_queries
+from qa.models import Category, Topic
+
+User = get_user_model()
+
+
+def legacy_pdf(stream, queryset):
+    """Прежняя выгрузка: экземпляры моделей и COUNT сообщений на каждую тему."""
+    p = canvas.Canvas(stream, pagesize=A4)
+    width, height = A4
+    y = height - 50
+    for t in queryset.select_related("category", "author"):
+        for line in (f"Тема: {t.title}", f"Категория: {t.category.name}", f"Автор: {t.author.username}",
+                     f"Рейтинг: {t.rating}", f"Постов: {t.posts.count()}", "-" * 60):
+            p.drawString(40, y, line)
+            y -= 16
+            if y < 60:
+                p.showPage()
+                y = height - 50
+    p.showPage()
+    p.save()
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the admin topic PDF export: legacy per-topic COUNT into an in-memory response vs "
+            "chunked values_list() streamed to a temporary file. Reports time, peak Python memory and "
+            "queries. Synthetic data is generated inside a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100,10000", help="Comma-separated topic counts.")
+        parser.add_argument("--skip-legacy", action="store_true")
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"{'topics':>7} {'path':>8} {'seconds':>8} {'peak MB':>8} {'queries':>8} {'pdf KB':>8}")
+        for size in (int(s) for s in opts["sizes"].split(",") if s.strip()):
+            with transaction.atomic():
+                ids = self.populate(size)
+                paths = [("chunked", self.chunked)]
+                if not opts["skip_legacy"]:
+                    paths.insert(0, ("legacy", self.legacy))
+                for name, fn in paths:
+                    seconds, peak, queries, size_kb = self.measure(fn, ids)
+                    self.stdout.write(f"{size:>7} {name:>8} {seconds:>8.2f} {peak:>8.1f} {queries:>8} {size_kb:>8.0f}")
+                transaction.set_rollback(True)
+
+    def legacy(self, ids):
+        stream = io.BytesIO()
+        legacy_pdf(stream, Topic.objects.filter(pk__in=ids))
+        return stream.tell()
+
+    def chunked(self, ids):
+        with tempfile.TemporaryFile() as fh:
+            pdfexport.write_pdf(fh, pdfexport.rows_for_ids(ids))
+            return fh.tell()
+
+    def measure(self, fn, ids):
+        started = time.perf_counter()
+        with count_queries() as stats:
+            written = fn(ids)
+        seconds = time.perf_counter() - started
+        # Память — отдельным прогоном: tracemalloc заметно замедляет выполнение.
+        tracemalloc.start()
+        fn(ids)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return seconds, peak / 2 ** 20, stats.count, written / 1024
+
+    def populate(self, topics_n):
+        stamp = int(time.time())
+        now = timezone.now()
+        author = User.objects.create(username=f"bench_pdf_{stamp}")
+        category = Category.objects.create(name=f"Bench PDF {stamp}", slug=f"bench-pdf-{stamp}")
+        Topic.objects.bulk_create([
+            Topic(category=category, author=author, title=f"Bench topic {i}", slug=f"bench-pdf-{stamp}-{i}",
+                  body="Benchmark topic body", rating=i % 50, posts_count=i % 7, created_at=now)
+            for i in range(topics_n)
+        ], batch_size=5000)
+        return list(Topic.objects.filter(category=category).order_by("pk").values_list("pk", flat=True))
@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from qa.models import Category, Comment, Post, Tag, Topic, TopicTag
+from qa.renderers import FastJSONRenderer
+from qa.serializers import (
+    CommentRows, CommentSerializer, PostRows, PostSerializer, TopicListRows, TopicListSerializer,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks list serialization: DRF ModelSerializer + JSONRenderer vs .values() rows (qa.rows) "
+            "+ orjson renderer, in rows/sec per page size. Synthetic data is generated inside a transaction "
+            "that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-sizes", default="20,100,1000", help="Comma-separated page sizes.")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **opts):
+        sizes = [int(s) for s in opts["page_sizes"].split(",") if s.strip()]
+        if not sizes:
+            raise CommandError("Нужен хотя бы один размер страницы.")
+        request = Request(APIRequestFactory().get("/"))
+        self.stdout.write(f"{'kind':>8} {'rows':>6} {'path':>12} {'p50 ms':>9} {'rows/s':>10} {'speedup':>8}")
+        with transaction.atomic():
+            topic = self.populate(max(sizes), opts["seed"])
+            cases = (
+                ("topics", Topic.objects.filter(category=topic.category).order_by("-created_at", "-id"),
+                 TopicListSerializer, TopicListRows,
+                 lambda qs: qs.select_related("category", "author").prefetch_related("tags")),
+                ("posts", Post.objects.filter(topic=topic).order_by("created_at", "id"),
+                 PostSerializer, PostRows, lambda qs: qs.select_related("author")),
+                ("comments", Comment.objects.filter(post__topic=topic).order_by("created_at", "id"),
+                 CommentSerializer, CommentRows, lambda qs: qs.select_related("author")),
+            )
+            for kind, queryset, serializer_class, rows_class, optimize in cases:
+                for size in sizes:
+                    page = queryset[:size]
+
+                    def drf():
+                        data = serializer_class(list(optimize(page)), many=True, context={"request": request}).data
+                        return JSONRenderer().render(data)
+
+                    def fast():
+                        rows = rows_class.for_request(request)
+                        return FastJSONRenderer().render(rows.serialize(rows.values(page)))
+
+                    if drf() != fast():
+                        raise CommandError(f"{kind}: выдача путей различается при {size} строках")
+                    baseline = None
+                    for name, fn in (("drf", drf), ("rows+orjson", fast)):
+                        p50 = self.measure(fn, opts["repeat"])
+                        baseline = baseline or p50
+                        self.stdout.write(f"{kind:>8} {size:>6} {name:>12} {p50:>9.2f} "
+                                          f"{size / (p50 / 1000):>10.0f} {baseline / p50:>7.1f}x")
+            transaction.set_rollback(True)
+
+    def populate(self, rows_n, seed):
+        rnd = random.Random(seed)
+        now = timezone.now()
+        stamp = int(time.time())
+        users = User.objects.bulk_create([User(username=f"bench_ser_{stamp}_{i}") for i in range(50)])
+        if not users[0].pk:
+            users = list(User.objects.filter(username__startswith=f"bench_ser_{stamp}_"))
+        category = Category.objects.create(name=f"Bench serializers {stamp}", slug=f"bench-ser-{stamp}")
+        tags = Tag.objects.bulk_create([Tag(name=f"bench-ser-{stamp}-{i}", slug=f"bench-ser-{stamp}-{i}")
+                                        for i in range(20)])
+        if not tags[0].pk:
+            tags = list(Tag.objects.filter(slug__startswith=f"bench-ser-{stamp}-"))
+
+        Topic.objects.bulk_create([
+            Topic(category=category, author=rnd.choice(users), title=f"Bench topic {i}",
+                  slug=f"bench-ser-{stamp}-{i}", body="Benchmark topic body", rating=rnd.randint(-5, 50),
+                  posts_count=rnd.randint(0, 30), post_rating_sum=rnd.randint(-10, 100),
+                  last_activity=now, created_at=now - timezone.timedelta(minutes=i))
+            for i in range(rows_n)
+        ])
+        topics = list(Topic.objects.filter(category=category))
+        TopicTag.objects.bulk_create([TopicTag(topic=topic, tag=tag)
+                                      for topic in topics for tag in rnd.sample(tags, 3)])
+        topic = topics[0]
+        Post.objects.bulk_create([
+            Post(topic=topic, author=rnd.choice(users), body=f"Бенчмарк-ответ {i}", rating=rnd.randint(-3, 20),
+                 created_at=now - timezone.timedelta(seconds=i))
+            for i in range(rows_n)
+        ])
+        post = Post.objects.filter(topic=topic).first()
+        Comment.objects.bulk_create([
+            Comment(post=post, author=rnd.choice(users), body=f"Комментарий {i}",
+                    created_at=now - timezone.timedelta(seconds=i))
+            for i in range(rows_n)
+        ])
+        return topic
+
+    def measure(self, fn, repeat):
+        fn()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
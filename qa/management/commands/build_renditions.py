@@ -0,0 +1,39 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from qa import renditions
+
+
+class Command(BaseCommand):
+    help = ("Builds missing image renditions (avatars, exam images) for existing records. --force rebuilds "
+            "all of them, --prune deletes rendition files no current image or size maps to.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild renditions that already exist.")
+        parser.add_argument("--prune", action="store_true",
+                            help="Delete renditions of removed images and of sizes no longer configured.")
+
+    def handle(self, *args, **opts):
+        expected = set()
+        for model, field, spec_names in renditions.registry:
+            built = failed = 0
+            queryset = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+            for obj in queryset.only("pk", field).iterator():
+                fieldfile = getattr(obj, field)
+                for spec in spec_names:
+                    name = renditions.generate(fieldfile, spec, force=opts["force"])
+                    if name is None:
+                        failed += 1
+                        continue
+                    expected.add(name)
+                    built += 1
+            label = f"{model._meta.label}.{field}"
+            self.stdout.write(f"{label}: копий {built}" + (f", не прочитано {failed}" if failed else ""))
+
+        if opts["prune"]:
+            removed = 0
+            for name in list(renditions.stored_names(default_storage)):
+                if name not in expected:
+                    default_storage.delete(name)
+                    removed += 1
+            self.stdout.write(f"Удалено лишних копий: {removed}")
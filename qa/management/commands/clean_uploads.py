@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from qa import uploads
+from qa.models import UploadChunk, UploadSession
+
+
+class Command(BaseCommand):
+    help = ("Deletes chunked upload sessions that received no chunks for UPLOAD_SESSION_TTL_HOURS, with "
+            "their chunk files, and removes chunk files under uploads/ that have no UploadChunk row "
+            "(older than --grace-minutes).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument("--grace-minutes", type=int, default=60,
+                            help="Keep unreferenced chunk files younger than this (chunks being written).")
+
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        expired = UploadSession.objects.filter(expires_at__lt=timezone.now())
+        sessions = chunks = 0
+        for session in expired.iterator():
+            sessions += 1
+            chunks += session.chunks.count()
+            if not dry_run:
+                uploads.discard(session)
+        self.stdout.write(f"Истёкших загрузок: {sessions}, частей: {chunks}")
+
+        if not default_storage.exists(uploads.PREFIX):
+            return
+        _, files = default_storage.listdir(uploads.PREFIX)
+        known = set(UploadChunk.objects.values_list("file", flat=True))
+        cutoff = timezone.now() - timedelta(minutes=opts["grace_minutes"])
+        orphans = 0
+        for name in (f"{uploads.PREFIX}/{name}" for name in files):
+            if name in known or default_storage.get_modified_time(name) > cutoff:
+                continue
+            orphans += 1
+            if not dry_run:
+                default_storage.delete(name)
+        self.stdout.write(f"Файлов-сирот: {orphans}" + (" (не удалены, --dry-run)" if dry_run else ""))
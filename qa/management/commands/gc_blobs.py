@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from qa import blobs
+from qa.models import Blob
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f"{path}/{name}"
+    for directory in directories:
+        yield from walk(storage, f"{path}/{directory}")
+
+
+class Command(BaseCommand):
+    help = ("Recomputes attachment blob reference counts, deletes unreferenced blobs with their files and "
+            "removes files under blobs/ that no Blob row points to (older than --grace-minutes).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument("--grace-minutes", type=int, default=60,
+                            help="Keep unreferenced files younger than this (uploads in progress).")
+
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        with transaction.atomic():
+            fixed = blobs.recount()
+            unreferenced = list(Blob.objects.filter(ref_count=0, attachments__isnull=True)
+                                .values_list("pk", "file"))
+            if dry_run:
+                transaction.set_rollback(True)
+            else:
+                Blob.objects.filter(pk__in=[pk for pk, _ in unreferenced]).delete()
+        for _, name in unreferenced if not dry_run else ():
+            default_storage.delete(name)
+        self.stdout.write(f"Исправлено счётчиков: {fixed}; blob-ов без ссылок: {len(unreferenced)}")
+
+        if not default_storage.exists(blobs.PREFIX):
+            return
+        known = set(Blob.objects.values_list("file", flat=True))
+        cutoff = timezone.now() - timedelta(minutes=opts["grace_minutes"])
+        orphans = 0
+        for name in walk(default_storage, blobs.PREFIX):
+            if name in known or default_storage.get_modified_time(name) > cutoff:
+                continue
+            orphans += 1
+            if not dry_run:
+                default_storage.delete(name)
+        self.stdout.write(f"Файлов-сирот: {orphans}" + (" (не удалены, --dry-run)" if dry_run else ""))
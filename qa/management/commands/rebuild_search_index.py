@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from qa import search
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index for topics and posts (Postgres GIN / SQLite FTS5)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        if search.get_backend() is None and not search.install(connection):
+            self.stdout.write(self.style.WARNING(f"Full-text search is not supported on {connection.vendor}."))
+            return
+        with transaction.atomic():
+            total = search.rebuild(chunk_size=max(1, opts["chunk_size"]))
+        self.stdout.write(self.style.SUCCESS(f"Documents indexed: {total}"))
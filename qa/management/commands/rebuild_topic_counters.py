@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from qa import caching
+from qa.models import Topic
+
+
+class Command(BaseCommand):
+    help = "Backfills/repairs denormalized topic counters (posts_count, post_rating_sum, last_activity) from posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Topics per UPDATE statement.")
+        parser.add_argument("--topic", type=int, action="append", dest="topics", help="Only rebuild given topic id(s).")
+
+    def handle(self, *args, **opts):
+        if opts["topics"]:
+            with transaction.atomic():
+                updated = Topic.objects.rebuild_counters(Topic.objects.filter(pk__in=opts["topics"]))
+            caching.bump(Topic)
+            self.stdout.write(self.style.SUCCESS(f"Topics rebuilt: {updated}"))
+            return
+
+        chunk = max(1, opts["chunk_size"])
+        bounds = Topic.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+        if bounds["lo"] is None:
+            self.stdout.write("No topics, nothing to do.")
+            return
+
+        updated = 0
+        for start in range(bounds["lo"], bounds["hi"] + 1, chunk):
+            with transaction.atomic():
+                updated += Topic.objects.rebuild_counters(
+                    Topic.objects.filter(pk__gte=start, pk__lt=start + chunk))
+        caching.bump(Topic)
+        self.stdout.write(self.style.SUCCESS(f"Topics rebuilt: {updated}"))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from accounts import reputation
+from qa import caching
+from qa.models import Topic, Post, TopicVote, PostVote
+
+
+def votes_sum(vote_model, fk):
+    return Coalesce(Subquery(
+        vote_model.objects
+        .filter(**{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(s=Sum("value"))
+        .values("s")
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ("Recomputes Topic/Post ratings from TopicVote/PostVote in chunked set-based UPDATEs, "
+            "then topic post_rating_sum, hot scores and the reputation of affected authors. "
+            "Fixes drift left by write-behind rating mode; "
+            "run it while no process holds unflushed rating deltas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--check", action="store_true", help="Only report drifted rows, do not fix.")
+
+    def handle(self, *args, **opts):
+        chunk = max(1, opts["chunk_size"])
+        for model, vote_model, fk in ((Topic, TopicVote, "topic"), (Post, PostVote, "post")):
+            drifted = 0
+            bounds = model.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+            if bounds["lo"] is None:
+                continue
+            for start in range(bounds["lo"], bounds["hi"] + 1, chunk):
+                qs = (model.objects
+                      .filter(pk__gte=start, pk__lt=start + chunk)
+                      .annotate(expected=votes_sum(vote_model, fk))
+                      .exclude(rating=F("expected")))
+                if opts["check"]:
+                    drifted += qs.count()
+                    continue
+                with transaction.atomic():
+                    rows = list(qs.select_for_update(of=("self",))
+                                .values_list("pk", "author_id", "created_at", "rating", "expected"))
+                    model.objects.filter(pk__in=[row[0] for row in rows]).update(
+                        rating=votes_sum(vote_model, fk))
+                    # Репутация автора — сумма рейтингов: начисляем ту же разницу
+                    # в UserStats/UserStatsDay, как это делает сброс отложенных рейтингов.
+                    reputation.record_many([(author_id, created_at, expected - rating, 0, 0)
+                                            for _, author_id, created_at, rating, expected in rows])
+                drifted += len(rows)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: drifted {drifted}"
+                              + ("" if opts["check"] else ", fixed"))
+
+        if opts["check"]:
+            return
+        bounds = Topic.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+        if bounds["lo"] is not None:
+            for start in range(bounds["lo"], bounds["hi"] + 1, chunk):
+                with transaction.atomic():
+                    Topic.objects.rebuild_counters(Topic.objects.filter(pk__gte=start, pk__lt=start + chunk))
+        Topic.objects.refresh_hot_scores(batch_size=chunk)
+        caching.bump(Topic, Post)
+        self.stdout.write(self.style.SUCCESS("Ratings reconciled."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from qa import caching, ranking
+from qa.models import Topic
+
+
+class Command(BaseCommand):
+    help = "Recomputes stored Topic.hot_score (run periodically, e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Refresh every topic, not only recently active ones.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        qs = Topic.objects.all()
+        if not opts["all"]:
+            since = timezone.now() - ranking.window()
+            qs = qs.filter(Q(last_activity__gte=since) | Q(created_at__gte=since))
+        updated = Topic.objects.refresh_hot_scores(qs, batch_size=max(1, opts["batch_size"]))
+        caching.bump(Topic)
+        self.stdout.write(self.style.SUCCESS(f"Hot scores refreshed: {updated}"))
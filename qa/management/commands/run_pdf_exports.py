@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from qa import pdfexport
+from qa.models import PdfExport
+
+
+class Command(BaseCommand):
+    help = ("Runs queued admin PDF exports in this process, e.g. those left pending after a web worker "
+            "restart. --requeue-running first resets jobs stuck in the running state.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requeue-running", action="store_true",
+                            help="Treat running jobs as abandoned and run them again.")
+
+    def handle(self, *args, **opts):
+        if opts["requeue_running"]:
+            requeued = (PdfExport.objects.filter(status=PdfExport.Status.RUNNING)
+                        .update(status=PdfExport.Status.PENDING, processed=0))
+            self.stdout.write(f"Возвращено в очередь: {requeued}")
+        ids = list(PdfExport.objects.filter(status=PdfExport.Status.PENDING)
+                   .order_by("created_at").values_list("pk", flat=True))
+        for job_id in ids:
+            try:
+                ran = pdfexport.run(job_id)
+            except Exception as exc:
+                self.stderr.write(f"#{job_id}: ошибка: {exc}")
+                continue
+            if ran:
+                job = PdfExport.objects.get(pk=job_id)
+                self.stdout.write(f"#{job_id}: {job.total} тем -> {job.file.name}")
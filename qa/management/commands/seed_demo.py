@@ -1,14 +1,82 @@
-from django.core.management.base import BaseCommand
+import itertools
+import random
+import resource
+import time
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
-from django.utils import timezone
+from django.contrib.auth.hashers import make_password
 from django.core.files.base import ContentFile
-from django.db import transaction
-import random
-from qa.models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from accounts import reputation
 from accounts.models import Profile
+from qa import blobs, caching, search
+from qa.models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote
 
 User = get_user_model()
 
+CATEGORY_DATA = [
+    ("Python", "python"),
+    ("Django", "django"),
+    ("Databases", "db"),
+    ("Frontend", "frontend"),
+    ("DevOps", "devops"),
+    ("Algorithms", "algo"),
+    ("Security", "sec"),
+    ("Networking", "net"),
+    ("Testing", "test"),
+    ("Other", "other"),
+]
+
+TAG_DATA = [
+    ("django", "django"), ("drf", "drf"), ("vue", "vue"), ("react", "react"),
+    ("docker", "docker"), ("postgres", "postgres"), ("nginx", "nginx"),
+    ("celery", "celery"), ("oauth2", "oauth2"), ("pytest", "pytest"),
+    ("sql", "sql"), ("orm", "orm"),
+]
+
+WORDS = ("запрос", "индекс", "миграция", "кэш", "очередь", "шаблон", "сериализатор", "транзакция",
+         "контейнер", "тест", "ошибка", "модель", "фильтр", "пагинация", "сигнал", "права",
+         "query", "index", "deploy", "router", "worker", "schema", "token", "session")
+
+
+def seed_categories():
+    categories = []
+    for name, slug in CATEGORY_DATA:
+        c, _ = Category.objects.get_or_create(
+            slug=slug,
+            defaults={"name": name},
+        )
+        if not c.name:
+            c.name = name
+            c.save(update_fields=["name"])
+        categories.append(c)
+    return categories
+
+
+def seed_tags():
+    tags = []
+    for name, slug in TAG_DATA:
+        t, _ = Tag.objects.get_or_create(
+            slug=slug,
+            defaults={"name": name},
+        )
+        if not t.name:
+            t.name = name
+            t.save(update_fields=["name"])
+        tags.append(t)
+    return tags
+
+
+def zipf_cum_weights(n, exponent):
+    """Накопленные веса степенного распределения: вес i-го элемента ~ 1 / (i + 1) ** exponent."""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
 
 class Command(BaseCommand):
     help = "Seeds database with demo data for QueStudio (categories, tags, topics, posts, comments, votes, attachments)."
@@ -20,9 +88,22 @@ class Command(BaseCommand):
         parser.add_argument("--posts_per_topic_max", type=int, default=4)
         parser.add_argument("--comments_per_post_min", type=int, default=1)
         parser.add_argument("--comments_per_post_max", type=int, default=3)
+        parser.add_argument("--scale", type=float, default=None,
+                            help="Bulk load-test mode: 1.0 ≈ 1k users, 5k topics, 50k posts, ~300k rows total.")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed for reproducible data (default 42).")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per bulk INSERT/COPY in --scale mode.")
+        parser.add_argument("--copy", action="store_true", help="Use COPY instead of bulk_create on PostgreSQL.")
+        parser.add_argument("--prefix", default="load", help="Username/slug prefix for --scale mode.")
 
-    @transaction.atomic
     def handle(self, *args, **opts):
+        if opts["seed"] is not None:
+            random.seed(opts["seed"])
+        if opts["scale"]:
+            return ScaleSeeder(self, opts).run()
+        return self.seed_demo(opts)
+
+    @transaction.atomic
+    def seed_demo(self, opts):
         users_n = max(2, opts["users"])
         topics_n = opts["topics"]
         pmin = opts["posts_per_topic_min"]
@@ -46,46 +127,10 @@ class Command(BaseCommand):
             users.append(user)
         self.stdout.write(self.style.SUCCESS(f"Users: {len(users)} (пароль у всех: pass12345)"))
 
-        cat_data = [
-            ("Python", "python"),
-            ("Django", "django"),
-            ("Databases", "db"),
-            ("Frontend", "frontend"),
-            ("DevOps", "devops"),
-            ("Algorithms", "algo"),
-            ("Security", "sec"),
-            ("Networking", "net"),
-            ("Testing", "test"),
-            ("Other", "other"),
-        ]
-        categories = []
-        for name, slug in cat_data:
-            c, _ = Category.objects.get_or_create(
-                slug=slug,
-                defaults={"name": name},
-            )
-            if not c.name:
-                c.name = name
-                c.save(update_fields=["name"])
-            categories.append(c)
+        categories = seed_categories()
         self.stdout.write(self.style.SUCCESS(f"Categories: {len(categories)}"))
 
-        tag_data = [
-            ("django", "django"), ("drf", "drf"), ("vue", "vue"), ("react", "react"),
-            ("docker", "docker"), ("postgres", "postgres"), ("nginx", "nginx"),
-            ("celery", "celery"), ("oauth2", "oauth2"), ("pytest", "pytest"),
-            ("sql", "sql"), ("orm", "orm"),
-        ]
-        tags = []
-        for name, slug in tag_data:
-            t, _ = Tag.objects.get_or_create(
-                slug=slug,
-                defaults={"name": name},
-            )
-            if not t.name:
-                t.name = name
-                t.save(update_fields=["name"])
-            tags.append(t)
+        tags = seed_tags()
         self.stdout.write(self.style.SUCCESS(f"Tags: {len(tags)}"))
 
         topics = []
@@ -121,8 +166,7 @@ class Command(BaseCommand):
                 posts_created += 1
 
                 if random.random() < 0.5:
-                    content = ContentFile(b"Demo attachment content", name=f"note-{p.id}.txt")
-                    Attachment.objects.create(post=p, file=content)
+                    blobs.attach(p, ContentFile(b"Demo attachment content", name=f"note-{p.id}.txt"))
                     attachments_created += 1
 
                 for _ in range(random.randint(cmin, cmax)):
@@ -153,3 +197,275 @@ class Command(BaseCommand):
             f"Attachments: {attachments_created}, TopicVotes: {topic_votes_created}, PostVotes: {post_votes_created}"
         ))
         self.stdout.write(self.style.SUCCESS("Seeding done."))
+
+
+class BulkWriter:
+    """Пишет строки пачками: bulk_create или COPY на PostgreSQL; считает строки и время по моделям."""
+
+    def __init__(self, batch_size, use_copy=False):
+        self.batch_size = batch_size
+        self.use_copy = use_copy and connection.vendor == "postgresql"
+        self.rows = {}
+        self.seconds = {}
+
+    def write(self, model, fields, rows):
+        if not rows:
+            return
+        started = time.perf_counter()
+        with transaction.atomic():
+            if self.use_copy:
+                columns = ", ".join(model._meta.get_field(f).column for f in fields)
+                with connection.cursor() as cursor:
+                    with cursor.cursor.copy(f"COPY {model._meta.db_table} ({columns}) FROM STDIN") as copy:
+                        for row in rows:
+                            copy.write_row(row)
+            else:
+                model.objects.bulk_create([model(**dict(zip(fields, row))) for row in rows],
+                                          batch_size=self.batch_size)
+        label = model._meta.label
+        self.rows[label] = self.rows.get(label, 0) + len(rows)
+        self.seconds[label] = self.seconds.get(label, 0.0) + time.perf_counter() - started
+
+
+class ScaleSeeder:
+    """
+    Генерация больших наборов данных для нагрузочных тестов (``--scale``).
+
+    Идентификаторы назначаются заранее (после текущего максимума), поэтому
+    связи пишутся без RETURNING, а в конце сбрасываются последовательности —
+    запускать на базе без параллельной записи. Популярность тем и активность
+    пользователей — степенные, число голосов — распределение Парето
+    (большинство без голосов, редкие всплески), рейтинги равны сумме голосов.
+    Счётчики тем, hot_score и поисковый индекс пересчитываются только для
+    созданных тем и сообщений (диапазоны id), репутация и ссылки на файлы —
+    штатной пересборкой целиком.
+    """
+
+    # Строк на единицу --scale.
+    USERS = 1000
+    TOPICS = 5000
+    POSTS = 50000
+
+    TOPIC_FIELDS = ("id", "category_id", "author_id", "title", "slug", "body", "status", "rating", "is_active",
+                    "created_at", "updated_at", "posts_count", "post_rating_sum", "last_activity", "hot_score")
+    POST_FIELDS = ("id", "topic_id", "author_id", "body", "rating", "is_accepted", "created_at", "updated_at")
+    COMMENT_FIELDS = ("id", "topic_id", "post_id", "author_id", "body", "created_at")
+    TOPIC_VOTE_FIELDS = ("id", "topic_id", "user_id", "value")
+    POST_VOTE_FIELDS = ("id", "post_id", "user_id", "value")
+    TOPIC_TAG_FIELDS = ("id", "topic_id", "tag_id")
+    ATTACHMENT_FIELDS = ("id", "post_id", "blob_id", "name", "uploaded_at")
+
+    def __init__(self, command, opts):
+        self.stdout = command.stdout
+        self.style = command.style
+        self.scale = opts["scale"]
+        self.prefix = opts["prefix"]
+        self.rnd = random.Random(opts["seed"])
+        self.batch_size = max(100, opts["batch_size"])
+        self.writer = BulkWriter(self.batch_size, opts["copy"])
+        self.now = timezone.now()
+        self.span = timedelta(days=365)
+        self.buffers = {}
+        self.ids = {}
+
+    def run(self):
+        started = time.perf_counter()
+        users_n = max(10, int(self.USERS * self.scale))
+        topics_n = max(10, int(self.TOPICS * self.scale))
+        posts_n = max(10, int(self.POSTS * self.scale))
+        if User.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise CommandError(f"Users with prefix '{self.prefix}_' already exist; use another --prefix.")
+        self.stdout.write(self.style.WARNING(
+            f"Seeding scale={self.scale}: {users_n} users, {topics_n} topics, {posts_n} posts "
+            f"({'COPY' if self.writer.use_copy else 'bulk_create'}, batch {self.batch_size})..."))
+
+        for model in (User, Profile, Topic, TopicTag, TopicVote, Post, PostVote, Comment, Attachment):
+            self.ids[model] = (model.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        self.first_ids = dict(self.ids)
+
+        self.categories = [c.pk for c in seed_categories()]
+        self.tags = [t.pk for t in seed_tags()]
+        self.seed_users(users_n)
+        self.seed_topics(topics_n)
+        self.seed_posts(posts_n)
+        self.flush()
+        self.reset_sequences()
+        load_seconds = time.perf_counter() - started
+
+        self.report(load_seconds)
+        self.rebuild()
+        total = time.perf_counter() - started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(f"Seeding done in {total:.1f}s, peak memory {peak_mb:.0f} MB."))
+
+    def next_id(self, model):
+        value = self.ids[model]
+        self.ids[model] = value + 1
+        return value
+
+    def add(self, model, fields, row):
+        buffer = self.buffers.setdefault(model, (fields, []))[1]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Родительские таблицы раньше дочерних.
+        for model in (Topic, TopicTag, TopicVote, Post, PostVote, Comment, Attachment):
+            if model in self.buffers:
+                fields, rows = self.buffers[model]
+                self.writer.write(model, fields, rows)
+                rows.clear()
+
+    def moment_after(self, start, mean_seconds):
+        return min(self.now, start + timedelta(seconds=self.rnd.expovariate(1 / mean_seconds)))
+
+    def text(self, low, high):
+        return " ".join(self.rnd.choices(WORDS, k=self.rnd.randint(low, high)))
+
+    def votes(self, alpha, author_index):
+        """Голоса за объект: (индекс пользователя, значение); сумма значений — его рейтинг."""
+        count = min(int(self.rnd.paretovariate(alpha)) - 1, 200, len(self.user_ids) - 1)
+        if count <= 0:
+            return [], 0
+        quality = self.rnd.uniform(0.3, 0.95)
+        voters = [i for i in self.rnd.sample(range(len(self.user_ids)), count + 1) if i != author_index][:count]
+        values = [1 if self.rnd.random() < quality else -1 for _ in voters]
+        return list(zip(voters, values)), sum(values)
+
+    def pick_authors(self, k):
+        return self.rnd.choices(self.author_order, cum_weights=self.author_weights, k=k)
+
+    def seed_users(self, users_n):
+        password = make_password("pass12345")
+        fields = ("id", "username", "email", "password", "first_name", "last_name",
+                  "is_active", "is_staff", "is_superuser", "date_joined")
+        profile_fields = ("id", "user_id", "display_name", "homepage", "bio", "created_at")
+        self.user_ids = []
+        for start in range(0, users_n, self.batch_size):
+            users, profiles = [], []
+            for i in range(start, min(users_n, start + self.batch_size)):
+                user_id = self.next_id(User)
+                joined = self.now - self.span * self.rnd.random()
+                name = f"{self.prefix}_{i}"
+                users.append((user_id, name, f"{name}@example.com", password, "", "", True, False, False, joined))
+                profiles.append((self.next_id(Profile), user_id, f"Load {i}", "", "Нагрузочный пользователь", joined))
+                self.user_ids.append(user_id)
+            self.writer.write(User, fields, users)
+            self.writer.write(Profile, profile_fields, profiles)
+        # Активность пользователей — степенная, без связи с порядком id.
+        self.author_order = list(range(len(self.user_ids)))
+        self.rnd.shuffle(self.author_order)
+        self.author_weights = zipf_cum_weights(len(self.user_ids), 1.0)
+
+    def seed_topics(self, topics_n):
+        category_weights = zipf_cum_weights(len(self.categories), 0.8)
+        tag_weights = zipf_cum_weights(len(self.tags), 0.8)
+        self.topic_ids = []
+        self.topic_created = []
+        authors = self.pick_authors(topics_n)
+        for i in range(topics_n):
+            topic_id = self.next_id(Topic)
+            author_index = authors[i]
+            created = self.now - self.span * self.rnd.random() ** 0.7
+            votes, rating = self.votes(1.3, author_index)
+            category_id = self.rnd.choices(self.categories, cum_weights=category_weights)[0]
+            self.add(Topic, self.TOPIC_FIELDS, (
+                topic_id, category_id, self.user_ids[author_index],
+                f"Тема {i + 1}: {self.text(2, 6)}", f"{self.prefix}-{i + 1}", self.text(15, 80),
+                Topic.Status.PUBLISHED, rating, True, created, created, 0, 0, None, 0.0))
+            for tag_id in set(self.rnd.choices(self.tags, cum_weights=tag_weights, k=self.rnd.randint(1, 3))):
+                self.add(TopicTag, self.TOPIC_TAG_FIELDS, (self.next_id(TopicTag), topic_id, tag_id))
+            for voter, value in votes:
+                self.add(TopicVote, self.TOPIC_VOTE_FIELDS,
+                         (self.next_id(TopicVote), topic_id, self.user_ids[voter], value))
+            if self.rnd.random() < 0.2:
+                for author in self.pick_authors(self.rnd.randint(1, 3)):
+                    self.add(Comment, self.COMMENT_FIELDS, (
+                        self.next_id(Comment), topic_id, None, self.user_ids[author], self.text(3, 15),
+                        self.moment_after(created, 6 * 3600)))
+            self.topic_ids.append(topic_id)
+            self.topic_created.append(created)
+        # Популярность тем — степенная: немногие темы собирают большую часть сообщений.
+        self.topic_order = list(range(topics_n))
+        self.rnd.shuffle(self.topic_order)
+        self.topic_weights = zipf_cum_weights(topics_n, 1.1)
+
+    def seed_posts(self, posts_n):
+        pool = self.attachment_pool()
+        for start in range(0, posts_n, self.batch_size):
+            size = min(self.batch_size, posts_n - start)
+            topics = self.rnd.choices(self.topic_order, cum_weights=self.topic_weights, k=size)
+            authors = self.pick_authors(size)
+            for topic_index, author_index in zip(topics, authors):
+                post_id = self.next_id(Post)
+                created = self.moment_after(self.topic_created[topic_index], 2 * 86400)
+                votes, rating = self.votes(1.6, author_index)
+                self.add(Post, self.POST_FIELDS, (
+                    post_id, self.topic_ids[topic_index], self.user_ids[author_index], self.text(5, 60),
+                    rating, self.rnd.random() < 0.02, created, created))
+                for voter, value in votes:
+                    self.add(PostVote, self.POST_VOTE_FIELDS,
+                             (self.next_id(PostVote), post_id, self.user_ids[voter], value))
+                comments = self.rnd.choices((0, 1, 2, 3, 5), (40, 30, 15, 10, 5))[0]
+                for author in self.pick_authors(comments) if comments else ():
+                    self.add(Comment, self.COMMENT_FIELDS, (
+                        self.next_id(Comment), None, post_id, self.user_ids[author], self.text(3, 15),
+                        self.moment_after(created, 3600)))
+                if self.rnd.random() < 0.1:
+                    self.add(Attachment, self.ATTACHMENT_FIELDS,
+                             (self.next_id(Attachment), post_id, *self.rnd.choice(pool), created))
+
+    def attachment_pool(self, size=8):
+        """Несколько blob-ов пишутся один раз, вложения ссылаются на них; ref_count пересчитывается в rebuild."""
+        pool = []
+        for i in range(size):
+            blob = blobs.store(ContentFile(f"Load test attachment {i}\n".encode() * (i + 1)).chunks())
+            pool.append((blob.pk, f"{self.prefix}-{i}.txt"))
+        return pool
+
+    def reset_sequences(self):
+        models = [User, Profile, Topic, TopicTag, TopicVote, Post, PostVote, Comment, Attachment]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def report(self, load_seconds):
+        total_rows = sum(self.writer.rows.values())
+        self.stdout.write(f"{'table':<18} {'rows':>10} {'seconds':>9} {'rows/sec':>10}")
+        for label, rows in self.writer.rows.items():
+            seconds = self.writer.seconds[label]
+            self.stdout.write(f"{label:<18} {rows:>10} {seconds:>9.2f} {rows / max(seconds, 1e-9):>10.0f}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {total_rows} rows in {load_seconds:.1f}s ({total_rows / max(load_seconds, 1e-9):.0f} rows/sec)"))
+
+    def seeded_ids(self, model):
+        return range(self.first_ids[model], self.ids[model])
+
+    def seeded_topics(self):
+        ids = self.seeded_ids(Topic)
+        return Topic.objects.filter(pk__gte=ids.start, pk__lt=ids.stop)
+
+    def index_seeded(self):
+        """Добавляет в поисковый индекс только новые темы и сообщения — индекс не очищается."""
+        for index, model in ((search.index_topics, Topic), (search.index_posts, Post)):
+            ids = self.seeded_ids(model)
+            for start in range(0, len(ids), self.batch_size):
+                index(ids[start:start + self.batch_size])
+
+    def rebuild(self):
+        steps = (
+            ("topic counters", lambda: Topic.objects.rebuild_counters(self.seeded_topics())),
+            ("hot scores", lambda: Topic.objects.refresh_hot_scores(self.seeded_topics(), batch_size=self.batch_size)),
+            ("search index", self.index_seeded),
+            ("user stats", lambda: reputation.rebuild(batch_size=self.batch_size)),
+            ("attachment refs", blobs.recount),
+        )
+        for name, step in steps:
+            started = time.perf_counter()
+            with transaction.atomic():
+                step()
+            self.stdout.write(f"Rebuilt {name} in {time.perf_counter() - started:.1f}s")
+        caching.bump(User, Profile, Category, Tag, Topic, TopicTag, TopicVote, Post, PostVote, Comment)
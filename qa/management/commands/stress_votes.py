@@ -0,0 +1,129 @@
+import random
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import F, Sum
+
+from qa import votes
+from qa.models import Category, Topic, Post, TopicVote, PostVote
+
+User = get_user_model()
+
+
+def legacy_vote(kind, object_id, user_id, value):
+    """Прежняя логика вьюх: get_object, get_or_create, delete/save, F-обновление, refresh."""
+    obj = kind.target.objects.get(pk=object_id)
+    vote, created = kind.vote.objects.get_or_create(
+        **{kind.fk: obj, "user_id": user_id}, defaults={"value": value})
+    if not created:
+        if vote.value == value:
+            vote.delete()
+            delta = -value
+        else:
+            vote.value = value
+            vote.save(update_fields=["value"])
+            delta = 2 * value
+    else:
+        delta = value
+    obj.rating = F("rating") + delta
+    obj.save(update_fields=["rating"])
+    obj.refresh_from_db(fields=["rating"])
+
+
+def atomic_vote(kind, object_id, user_id, value):
+    votes.apply_vote(kind, object_id, user_id, value)
+
+
+class Command(BaseCommand):
+    help = ("Multi-threaded vote stress test: checks rating == SUM(votes.value) under contention "
+            "and reports votes/sec for the legacy and the atomic vote paths. Use a PostgreSQL database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--ops", type=int, default=200, help="Votes per thread.")
+        parser.add_argument("--users", type=int, default=8, help="Voter pool; small pools mean more same-user races.")
+        parser.add_argument("--mode", choices=("legacy", "atomic", "both"), default="both")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        modes = ("legacy", "atomic") if opts["mode"] == "both" else (opts["mode"],)
+        for mode in modes:
+            fixtures = self.setup_fixtures(opts["users"])
+            try:
+                elapsed, done, errors = self.run(mode, fixtures, opts)
+                ok = self.verify(fixtures, mode)
+            finally:
+                self.cleanup(fixtures)
+            rate = done / elapsed if elapsed else 0.0
+            self.stdout.write(
+                f"{mode:>7}: {done} votes in {elapsed:.2f}s ({rate:.0f} votes/sec), errors: {errors}, "
+                + (self.style.SUCCESS("consistent") if ok else self.style.ERROR("DRIFT")))
+
+    def setup_fixtures(self, users_n):
+        stamp = f"{int(time.time() * 1000)}"
+        with transaction.atomic():
+            author = User.objects.create(username=f"stress_author_{stamp}")
+            voters = [User.objects.create(username=f"stress_{stamp}_{i}") for i in range(max(1, users_n))]
+            category = Category.objects.create(name=f"Stress {stamp}", slug=f"stress-{stamp}")
+            topic = Topic.objects.create(category=category, author=author, title="Stress topic",
+                                         slug=f"stress-{stamp}", body="Stress test topic body")
+            post = Post.objects.create(topic=topic, author=author, body="Stress test post")
+        return {"author": author, "voters": [u.pk for u in voters], "category": category,
+                "topic": topic.pk, "post": post.pk}
+
+    def run(self, mode, fixtures, opts):
+        fn = legacy_vote if mode == "legacy" else atomic_vote
+        targets = [(votes.TOPIC, fixtures["topic"]), (votes.POST, fixtures["post"])]
+        done = [0] * opts["threads"]
+        errors = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(opts["threads"])
+
+        def worker(idx):
+            rnd = random.Random(opts["seed"] * 1000 + idx)
+            try:
+                barrier.wait()
+                for _ in range(opts["ops"]):
+                    kind, object_id = rnd.choice(targets)
+                    try:
+                        fn(kind, object_id, rnd.choice(fixtures["voters"]), rnd.choice((-1, 1)))
+                        done[idx] += 1
+                    except Exception as exc:
+                        with lock:
+                            errors[type(exc).__name__] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(opts["threads"])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started, sum(done), dict(errors) or 0
+
+    def verify(self, fixtures, mode):
+        """
+        Рейтинги равны суммам голосов. ``post_rating_sum`` темы проверяется только
+        для atomic: прежний путь пишет рейтинг F()-выражением, которое сигнал
+        счётчиков темы пропускает, так что сумма там не ведётся вовсе, а не теряется в гонке.
+        """
+        topic = Topic.objects.get(pk=fixtures["topic"])
+        post = Post.objects.get(pk=fixtures["post"])
+        topic_sum = TopicVote.objects.filter(topic=topic).aggregate(s=Sum("value"))["s"] or 0
+        post_sum = PostVote.objects.filter(post=post).aggregate(s=Sum("value"))["s"] or 0
+        ok = topic.rating == topic_sum and post.rating == post_sum
+        if mode == "atomic":
+            ratings_sum = Post.objects.filter(topic=topic).aggregate(s=Sum("rating"))["s"] or 0
+            ok = ok and topic.post_rating_sum == ratings_sum
+        return ok
+
+    def cleanup(self, fixtures):
+        with transaction.atomic():
+            Topic.objects.filter(pk=fixtures["topic"]).delete()
+            User.objects.filter(pk__in=fixtures["voters"] + [fixtures["author"].pk]).delete()
+            fixtures["category"].delete()
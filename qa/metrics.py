@@ -0,0 +1,344 @@
+"""
+Метрики в текстовом формате Prometheus без внешних зависимостей.
+
+Счётчики и гистограммы с фиксированными корзинами регистрируются на уровне
+модуля (``counter()``, ``histogram()``) и обновляются из любого потока.
+Значения хранятся:
+
+* в памяти процесса — если ``METRICS_DIR`` не задан (один процесс, runserver);
+* в mmap-файле ``<METRICS_DIR>/<pid>.db`` на каждый процесс — тогда ``/metrics``
+  суммирует файлы всех воркеров. Каталог очищается при деплое: файлы
+  завершившихся процессов продолжают входить в суммы, как в мультипроцессном
+  режиме prometheus_client.
+
+``MetricsMiddleware`` пишет по каждому запросу число запросов со статусом,
+латентность, время и число SQL-запросов (из qa.querybudget) и размер ответа с
+меткой ``view`` — именем маршрута (``qa:topic-list``, ``qa:topic-vote``…).
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def encode_key(name, suffix, labels):
+    return json.dumps([name, suffix, labels], separators=(",", ":"), ensure_ascii=False)
+
+
+class MemoryStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = defaultdict(float)
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] += amount
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class MmapStore:
+    """
+    Файл значений одного процесса: заголовок (uint32 занято, 4 байта выравнивания),
+    затем записи ``uint32 длина ключа | ключ, дополненный до 8 байт | float64``.
+    Пишет только процесс-владелец; читатели видят новую запись после обновления заголовка.
+    """
+    HEADER = 8
+
+    def __init__(self, path, initial_size=64 * 1024):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.file = open(self.path, "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < initial_size:
+            self.file.truncate(initial_size)
+            size = initial_size
+        self.capacity = size
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = struct.unpack_from("<I", self.map, 0)[0] or self.HEADER
+        self.positions = {key: pos for key, _, pos in read_entries(self.map, self.used)}
+
+    def inc(self, key, amount):
+        with self.lock:
+            pos = self.positions.get(key)
+            if pos is None:
+                pos = self._append(key)
+            struct.pack_into("<d", self.map, pos, struct.unpack_from("<d", self.map, pos)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = encoded.ljust(len(encoded) + padding(len(encoded)), b" ")
+        entry = struct.pack(f"<I{len(padded)}sd", len(encoded), padded, 0.0)
+        while self.used + len(entry) > self.capacity:
+            self.capacity *= 2
+            self.map.close()
+            self.file.truncate(self.capacity)
+            self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        self.map[self.used:self.used + len(entry)] = entry
+        self.used += len(entry)
+        struct.pack_into("<I", self.map, 0, self.used)
+        self.positions[key] = self.used - 8
+        return self.used - 8
+
+    def items(self):
+        with self.lock:
+            return [(key, value) for key, value, _ in read_entries(self.map, self.used)]
+
+
+def padding(length):
+    return (8 - (4 + length) % 8) % 8
+
+
+def read_entries(buffer, used):
+    pos = MmapStore.HEADER
+    while pos + 4 <= used:
+        length = struct.unpack_from("<I", buffer, pos)[0]
+        key = bytes(buffer[pos + 4:pos + 4 + length]).decode()
+        value_pos = pos + 4 + length + padding(length)
+        yield key, struct.unpack_from("<d", buffer, value_pos)[0], value_pos
+        pos = value_pos + 8
+
+
+def read_file(path):
+    with open(path, "rb") as fh:
+        data = fh.read()
+    if len(data) < MmapStore.HEADER:
+        return []
+    used = struct.unpack_from("<I", data, 0)[0]
+    return [(key, value) for key, value, _ in read_entries(data, min(used, len(data)))]
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def label_pairs(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        REGISTRY.store().inc(encode_key(self.name, "", self.label_pairs(labels)), amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        pairs = self.label_pairs(labels)
+        store = REGISTRY.store()
+        # Корзины хранятся непересекающимися, накопительные суммы считаются при выдаче.
+        bucket = next((str(b) for b in self.buckets if value <= b), "+Inf")
+        store.inc(encode_key(self.name, "_bucket", pairs + [["le", bucket]]), 1)
+        store.inc(encode_key(self.name, "_sum", pairs), value)
+        store.inc(encode_key(self.name, "_count", pairs), 1)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._store = None
+        self._pid = None
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Метрика {metric.name} уже зарегистрирована как {existing.kind}")
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def directory(self):
+        path = getattr(settings, "METRICS_DIR", "")
+        return Path(path) if path else None
+
+    def store(self):
+        # После fork (gunicorn --preload) процессу нужен свой файл.
+        if self._store is None or self._pid != os.getpid():
+            with self.lock:
+                if self._store is None or self._pid != os.getpid():
+                    directory = self.directory()
+                    if directory is None:
+                        self._store = MemoryStore()
+                    else:
+                        directory.mkdir(parents=True, exist_ok=True)
+                        self._store = MmapStore(directory / f"{os.getpid()}.db")
+                    self._pid = os.getpid()
+        return self._store
+
+    def reset(self):
+        with self.lock:
+            self._store = None
+
+    def collect(self):
+        """{ключ: значение}, просуммированные по всем процессам."""
+        directory = self.directory()
+        if directory is None:
+            return dict(self.store().items())
+        totals = defaultdict(float)
+        for path in directory.glob("*.db"):
+            try:
+                entries = read_file(path)
+            except (OSError, ValueError, struct.error):
+                continue
+            for key, value in entries:
+                totals[key] += value
+        return totals
+
+    def exposition(self):
+        families = defaultdict(list)
+        for key, value in self.collect().items():
+            name, suffix, labels = json.loads(key)
+            families[name].append((suffix, labels, value))
+
+        lines = []
+        for name in sorted(families):
+            metric = self.metrics.get(name)
+            if metric is not None:
+                lines.append(f"# HELP {name} {metric.documentation}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                lines.extend(histogram_lines(metric, families[name]))
+            else:
+                for suffix, labels, value in sorted(families[name], key=lambda s: (s[0], s[1])):
+                    lines.append(sample(name + suffix, labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def histogram_lines(metric, samples):
+    series = defaultdict(lambda: {"buckets": defaultdict(float), "_sum": 0.0, "_count": 0.0})
+    for suffix, labels, value in samples:
+        if suffix == "_bucket":
+            le = labels[-1][1]
+            series[json.dumps(labels[:-1])]["buckets"][le] += value
+        else:
+            series[json.dumps(labels)][suffix] += value
+    lines = []
+    for labels_key in sorted(series):
+        labels, data = json.loads(labels_key), series[labels_key]
+        running = 0.0
+        for bound in [str(b) for b in metric.buckets] + ["+Inf"]:
+            running += data["buckets"].get(bound, 0.0)
+            lines.append(sample(metric.name + "_bucket", labels + [["le", bound]], running))
+        lines.append(sample(metric.name + "_sum", labels, data["_sum"]))
+        lines.append(sample(metric.name + "_count", labels, data["_count"]))
+    return lines
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def sample(name, labels, value):
+    text = ",".join(f'{key}="{escape(val)}"' for key, val in labels)
+    number = int(value) if float(value).is_integer() else repr(value)
+    return f"{name}{{{text}}} {number}" if text else f"{name} {number}"
+
+
+REGISTRY = Registry()
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting == "METRICS_DIR":
+        REGISTRY.reset()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+HTTP_REQUESTS = counter("questudio_http_requests_total", "HTTP-запросы по маршруту, методу и статусу.",
+                        ("view", "method", "status"))
+HTTP_DURATION = histogram("questudio_http_request_duration_seconds", "Время обработки запроса.", ("view",))
+HTTP_DB_DURATION = histogram("questudio_http_db_duration_seconds", "Время SQL-запросов за HTTP-запрос.", ("view",))
+HTTP_QUERIES = histogram("questudio_http_queries", "Число SQL-запросов за HTTP-запрос.", ("view",),
+                         buckets=QUERY_BUCKETS)
+HTTP_RESPONSE_SIZE = histogram("questudio_http_response_size_bytes", "Размер тела ответа.", ("view",),
+                               buckets=SIZE_BUCKETS)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        return self.record(request, response, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.record(request, response, time.perf_counter() - started)
+
+    def record(self, request, response, duration):
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name or "unnamed") if match is not None else "unmatched"
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_DURATION.observe(duration, view=view)
+        stats = getattr(response, "query_stats", None)
+        if stats is not None:
+            HTTP_DB_DURATION.observe(stats.seconds, view=view)
+            HTTP_QUERIES.observe(stats.count, view=view)
+        if not response.streaming:
+            HTTP_RESPONSE_SIZE.observe(len(response.content), view=view)
+        return response
+
+
+def metrics_view(request):
+    """Текстовый формат Prometheus; при заданном ``METRICS_TOKEN`` нужен ``Authorization: Bearer``."""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and not constant_time_compare(request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:33
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Topic = apps.get_model("qa", "Topic")
+    Post = apps.get_model("qa", "Post")
+    posts = Post.objects.filter(topic=OuterRef("pk")).order_by().values("topic")
+    Topic.objects.update(
+        posts_count=Coalesce(Subquery(posts.annotate(c=Count("pk")).values("c")), 0),
+        post_rating_sum=Coalesce(Subquery(posts.annotate(s=Sum("rating")).values("s")), 0),
+        last_activity=Subquery(posts.annotate(m=Max("created_at")).values("m")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Последняя активность'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_rating_sum',
+            field=models.IntegerField(default=0, verbose_name='Сумма рейтингов сообщений'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='posts_count',
+            field=models.IntegerField(db_index=True, default=0, verbose_name='Сообщений'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['topic', 'created_at'], name='qa_post_topic_created_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:35
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Формула hot_score на момент миграции (qa.ranking может измениться позже).
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def hot_score(rating, posts_count, post_rating_sum, last_activity, created_at):
+    activity = (getattr(settings, "HOT_POST_WEIGHT", 2) * posts_count
+                + getattr(settings, "HOT_VOTE_WEIGHT", 1) * (rating + post_rating_sum))
+    order = math.log10(max(abs(activity), 1))
+    sign = 1 if activity > 0 else -1 if activity < 0 else 0
+    moment = max(filter(None, (last_activity, created_at)))
+    decay = float(getattr(settings, "HOT_DECAY_SECONDS", 45000))
+    return round(sign * order + (moment - HOT_EPOCH).total_seconds() / decay, 7)
+
+
+def fill_hot_score(apps, schema_editor):
+    Topic = apps.get_model("qa", "Topic")
+    batch = []
+    rows = Topic.objects.values_list(
+        "pk", "rating", "posts_count", "post_rating_sum", "last_activity", "created_at")
+    for pk, *fields in rows.iterator(chunk_size=1000):
+        batch.append(Topic(pk=pk, hot_score=hot_score(*fields)))
+        if len(batch) >= 1000:
+            Topic.objects.bulk_update(batch, ["hot_score"])
+            batch = []
+    if batch:
+        Topic.objects.bulk_update(batch, ["hot_score"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0003_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='hot_score',
+            field=models.FloatField(default=0, verbose_name='Горячесть'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['hot_score', 'id'], name='qa_topic_hot_score_id_idx'),
+        ),
+        migrations.RunPython(fill_hot_score, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:40
+
+from django.conf import settings
+from django.db import migrations
+
+# Схема и заполнение индекса — как в qa.search на момент миграции: миграция не
+# должна зависеть от текущего кода приложения.
+INDEX_TABLE = "qa_search_index"
+
+
+def install_postgresql(cursor):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+        " kind varchar(10) NOT NULL,"
+        " object_id bigint NOT NULL,"
+        " topic_id bigint NOT NULL,"
+        " title text NOT NULL DEFAULT '',"
+        " body text NOT NULL DEFAULT '',"
+        " document tsvector NOT NULL,"
+        " PRIMARY KEY (kind, object_id))"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_gin ON {INDEX_TABLE} USING gin (document)")
+    cfg = getattr(settings, "SEARCH_CONFIG", "russian")
+    cursor.execute(
+        f"INSERT INTO {INDEX_TABLE} (kind, object_id, topic_id, title, body, document) "
+        "SELECT 'topic', t.id, t.id, t.title, t.body, "
+        "setweight(to_tsvector(%s::regconfig, t.title), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(tg.names, '')), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, t.body), 'C') "
+        "FROM qa_topic t LEFT JOIN ("
+        "  SELECT tt.topic_id, string_agg(tag.name, ' ') AS names"
+        "  FROM qa_topictag tt JOIN qa_tag tag ON tag.id = tt.tag_id"
+        "  GROUP BY tt.topic_id"
+        ") tg ON tg.topic_id = t.id "
+        "ON CONFLICT (kind, object_id) DO NOTHING",
+        [cfg, cfg, cfg],
+    )
+    cursor.execute(
+        f"INSERT INTO {INDEX_TABLE} (kind, object_id, topic_id, title, body, document) "
+        "SELECT 'post', p.id, p.topic_id, '', p.body, setweight(to_tsvector(%s::regconfig, p.body), 'C') "
+        "FROM qa_post p ON CONFLICT (kind, object_id) DO NOTHING",
+        [cfg],
+    )
+
+
+def install_sqlite(cursor):
+    try:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, topic_id UNINDEXED, title, tags, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except Exception:
+        # SQLite без FTS5 — поиск остаётся на icontains.
+        return
+    # rowid = id * 2 + код вида (тема 0, сообщение 1).
+    cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+    cursor.execute(
+        f"INSERT INTO {INDEX_TABLE} (rowid, kind, object_id, topic_id, title, tags, body) "
+        "SELECT t.id * 2, 'topic', t.id, t.id, t.title, "
+        "  coalesce((SELECT group_concat(tag.name, ' ') FROM qa_topictag tt"
+        "            JOIN qa_tag tag ON tag.id = tt.tag_id WHERE tt.topic_id = t.id), ''), "
+        "  t.body FROM qa_topic t"
+    )
+    cursor.execute(
+        f"INSERT INTO {INDEX_TABLE} (rowid, kind, object_id, topic_id, title, tags, body) "
+        "SELECT p.id * 2 + 1, 'post', p.id, p.topic_id, '', '', p.body FROM qa_post p"
+    )
+
+
+INSTALL = {"postgresql": install_postgresql, "sqlite": install_sqlite}
+
+
+def install_search_index(apps, schema_editor):
+    install = INSTALL.get(schema_editor.connection.vendor)
+    if install is not None:
+        with schema_editor.connection.cursor() as cursor:
+            install(cursor)
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INSTALL:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0004_topic_hot_score'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:22
+
+import hashlib
+import os
+import tempfile
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def spool(source):
+    """Копирует файл во временный, считая SHA-256; возвращает (файл, sha256, размер)."""
+    digest = hashlib.sha256()
+    size = 0
+    tmp = tempfile.TemporaryFile()
+    for chunk in source.chunks():
+        digest.update(chunk)
+        tmp.write(chunk)
+        size += len(chunk)
+    tmp.seek(0)
+    return tmp, digest.hexdigest(), size
+
+
+def move_files_to_blobs(apps, schema_editor):
+    """
+    Переносит файлы вложений в blobs/ по содержимому. Исходные файлы в
+    attachments/ не удаляются: после успешного деплоя каталог можно очистить.
+    Вложения, чей файл отсутствует, остаются без blob.
+
+    Хэширование и раскладка по каталогам повторяют qa.blobs на момент миграции:
+    миграция не должна зависеть от текущего кода приложения.
+    """
+    Attachment = apps.get_model("qa", "Attachment")
+    Blob = apps.get_model("qa", "Blob")
+    blobs = {}
+    for attachment in Attachment.objects.exclude(file="").iterator(chunk_size=1000):
+        name = attachment.file.name
+        if not default_storage.exists(name):
+            continue
+        with default_storage.open(name, "rb") as source:
+            tmp, sha256, size = spool(source)
+        with tmp:
+            blob = blobs.get(sha256) or Blob.objects.filter(sha256=sha256).first()
+            if blob is None:
+                stored = default_storage.save(f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}", File(tmp))
+                blob = Blob.objects.create(sha256=sha256, size=size, file=stored)
+        blobs[sha256] = blob
+        Blob.objects.filter(pk=blob.pk).update(ref_count=models.F("ref_count") + 1)
+        Attachment.objects.filter(pk=attachment.pk).update(blob=blob, name=os.path.basename(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0006_pdf_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('file', models.FileField(max_length=255, upload_to='', verbose_name='Файл')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создан')),
+            ],
+            options={
+                'verbose_name': 'Содержимое файла',
+                'verbose_name_plural': 'Содержимое файлов',
+            },
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Имя файла'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='qa.blob', verbose_name='Содержимое'),
+        ),
+        migrations.RunPython(move_files_to_blobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='attachment',
+            name='file',
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:26
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0007_content_addressed_attachments'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='Размер части, байт')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='Ожидаемый SHA-256')),
+                ('status', models.CharField(choices=[('open', 'Загружается'), ('complete', 'Завершена')], default='open', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Создана')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Истекает')),
+                ('attachment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='qa.attachment', verbose_name='Вложение')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='qa.post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Загрузка по частям',
+                'verbose_name_plural': 'Загрузки по частям',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='Номер части')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('file', models.FileField(max_length=255, upload_to='', verbose_name='Файл')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='qa.uploadsession', verbose_name='Загрузка')),
+            ],
+            options={
+                'verbose_name': 'Часть загрузки',
+                'verbose_name_plural': 'Части загрузки',
+                'unique_together': {('session', 'index')},
+            },
+        ),
+    ]
@@ -1,10 +1,15 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.urls import reverse
-from django.db.models import Count, Avg, Max
+from django.db.models import Count, Max, F, Q, Case, When, Value, Subquery, OuterRef, Sum
+from django.db.models.functions import Coalesce
 from django.core.validators import MinLengthValidator
 
+from . import ranking
+
 User = get_user_model()
 
 
@@ -39,15 +44,76 @@ class Tag(models.Model):
 
 class TopicManager(models.Manager):
     def hot(self):
-        """Темы с активностью за последние 7 дней (посты/оценки)."""
-        week_ago = timezone.now() - timezone.timedelta(days=7)
+        """Top-K тем по hot_score с активностью в пределах окна (чтение диапазона индекса)."""
+        now = timezone.now()
+        since = ranking.window_start(now)
         qs = (self.get_queryset()
-              .filter(created_at__gte=week_ago)
-              .annotate(posts_count=Count("posts", distinct=True))
-              .annotate(avg_post_rating=Avg("posts__rating"))
-              .annotate(last_activity=Max("posts__created_at"))
-              .order_by("-posts_count", "-last_activity", "-rating"))
-        return qs
+              .filter(hot_score__gte=ranking.hot_cutoff(now))
+              .filter(Q(last_activity__gte=since) | Q(last_activity__isnull=True, created_at__gte=since))
+              .order_by("-hot_score", "-id"))
+        return qs[:ranking.top_k()]
+
+    def refresh_hot_score(self, topic_id):
+        return self.refresh_hot_scores(self.filter(pk=topic_id))
+
+    def refresh_hot_scores(self, queryset=None, batch_size=1000):
+        """Пересчитывает hot_score по уже хранимым счётчикам тем."""
+        qs = self.get_queryset() if queryset is None else queryset
+        rows = qs.order_by().values_list(
+            "pk", "rating", "posts_count", "post_rating_sum", "last_activity", "created_at")
+        batch = []
+        updated = 0
+        for pk, *fields in rows.iterator(chunk_size=batch_size):
+            batch.append(self.model(pk=pk, hot_score=ranking.hot_score(*fields)))
+            if len(batch) >= batch_size:
+                updated += self.bulk_update(batch, ["hot_score"])
+                batch = []
+        if batch:
+            updated += self.bulk_update(batch, ["hot_score"])
+        return updated
+
+    def on_post_added(self, post):
+        """Учитывает новое сообщение в счётчиках темы."""
+        return self.filter(pk=post.topic_id).update(
+            posts_count=F("posts_count") + 1,
+            post_rating_sum=F("post_rating_sum") + post.rating,
+            last_activity=Case(
+                When(Q(last_activity__isnull=True) | Q(last_activity__lt=post.created_at),
+                     then=Value(post.created_at)),
+                default=F("last_activity"),
+            ),
+        )
+
+    def on_post_removed(self, topic_id, rating):
+        """Вычитает удалённое сообщение; last_activity пересчитывается по индексу (topic, created_at)."""
+        latest = (Post.objects
+                  .filter(topic_id=topic_id)
+                  .order_by("-created_at")
+                  .values("created_at")[:1])
+        return self.filter(pk=topic_id).update(
+            posts_count=F("posts_count") - 1,
+            post_rating_sum=F("post_rating_sum") - rating,
+            last_activity=Subquery(latest),
+        )
+
+    def on_post_rerated(self, topic_id, delta):
+        """Применяет изменение рейтинга сообщения к сумме рейтингов темы."""
+        if not delta:
+            return 0
+        return self.filter(pk=topic_id).update(post_rating_sum=F("post_rating_sum") + delta)
+
+    def rebuild_counters(self, queryset=None):
+        """Пересчитывает денормализованные счётчики по таблице сообщений одним UPDATE."""
+        posts = (Post.objects
+                 .filter(topic=OuterRef("pk"))
+                 .order_by()
+                 .values("topic"))
+        qs = self.get_queryset() if queryset is None else queryset
+        return qs.update(
+            posts_count=Coalesce(Subquery(posts.annotate(c=Count("pk")).values("c")), 0),
+            post_rating_sum=Coalesce(Subquery(posts.annotate(s=Sum("rating")).values("s")), 0),
+            last_activity=Subquery(posts.annotate(m=Max("created_at")).values("m")),
+        )
 
 
 class Topic(models.Model):
@@ -68,6 +134,11 @@ class Topic(models.Model):
     created_at = models.DateTimeField("Создана", default=timezone.now)
     updated_at = models.DateTimeField("Обновлена", auto_now=True)
 
+    posts_count = models.IntegerField("Сообщений", default=0, db_index=True)
+    post_rating_sum = models.IntegerField("Сумма рейтингов сообщений", default=0)
+    last_activity = models.DateTimeField("Последняя активность", null=True, blank=True, db_index=True)
+    hot_score = models.FloatField("Горячесть", default=0)
+
     objects = TopicManager()
 
     class Meta:
@@ -75,6 +146,11 @@ class Topic(models.Model):
         verbose_name_plural = "Темы"
         unique_together = (("category", "slug"),)
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="qa_topic_created_id_idx"),
+            models.Index(fields=["rating", "id"], name="qa_topic_rating_id_idx"),
+            models.Index(fields=["hot_score", "id"], name="qa_topic_hot_score_id_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.category})"
@@ -82,6 +158,16 @@ class Topic(models.Model):
     def get_absolute_url(self):
         return reverse("qa:topic_detail", kwargs={"slug": self.slug})
 
+    @property
+    def avg_post_rating(self):
+        if not self.posts_count:
+            return None
+        return self.post_rating_sum / self.posts_count
+
+    def compute_hot_score(self):
+        return ranking.hot_score(self.rating, self.posts_count, self.post_rating_sum,
+                                 self.last_activity, self.created_at)
+
 
 class TopicTag(models.Model):
     topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name="topic_tags")
@@ -106,6 +192,10 @@ class Post(models.Model):
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
         ordering = ("created_at",)
+        indexes = [
+            models.Index(fields=["topic", "created_at"], name="qa_post_topic_created_idx"),
+            models.Index(fields=["topic", "rating", "id"], name="qa_post_topic_rating_id_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Post #{self.pk} в {self.topic}"
@@ -122,15 +212,36 @@ class Comment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ("created_at",)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="qa_comment_created_id_idx"),
+        ]
 
     def __str__(self) -> str:
         target = self.post or self.topic
         return f"Комментарий к {target} от {self.author}"
 
 
+class Blob(models.Model):
+    """Содержимое файла, адресуемое SHA-256 (qa.blobs); одинаковые загрузки делят один blob."""
+    sha256 = models.CharField("SHA-256", max_length=64, unique=True)
+    size = models.BigIntegerField("Размер, байт")
+    file = models.FileField("Файл", max_length=255)
+    ref_count = models.PositiveIntegerField("Ссылок", default=0)
+    created_at = models.DateTimeField("Создан", default=timezone.now)
+
+    class Meta:
+        verbose_name = "Содержимое файла"
+        verbose_name_plural = "Содержимое файлов"
+
+    def __str__(self) -> str:
+        return self.sha256
+
+
 class Attachment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="attachments", verbose_name="Пост")
-    file = models.FileField("Файл", upload_to="attachments/")
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name="attachments", verbose_name="Содержимое",
+                             null=True, blank=True)
+    name = models.CharField("Имя файла", max_length=255, blank=True)
     uploaded_at = models.DateTimeField("Загружен", default=timezone.now)
 
     class Meta:
@@ -139,7 +250,60 @@ class Attachment(models.Model):
         ordering = ("-uploaded_at",)
 
     def __str__(self) -> str:
-        return f"Файл {self.file.name} к посту {self.post_id}"
+        return f"Файл {self.name} к посту {self.post_id}"
+
+
+class UploadSession(models.Model):
+    """Загрузка вложения по частям (qa.uploads); после завершения — ссылка на созданное вложение."""
+
+    class Status(models.TextChoices):
+        OPEN = "open", "Загружается"
+        COMPLETE = "complete", "Завершена"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions",
+                                   verbose_name="Автор")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="upload_sessions", verbose_name="Пост")
+    name = models.CharField("Имя файла", max_length=255)
+    size = models.BigIntegerField("Размер, байт")
+    chunk_size = models.PositiveIntegerField("Размер части, байт")
+    sha256 = models.CharField("Ожидаемый SHA-256", max_length=64, blank=True)
+    status = models.CharField("Статус", max_length=10, choices=Status.choices, default=Status.OPEN)
+    attachment = models.ForeignKey(Attachment, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="+", verbose_name="Вложение")
+    created_at = models.DateTimeField("Создана", default=timezone.now)
+    expires_at = models.DateTimeField("Истекает", db_index=True)
+
+    class Meta:
+        verbose_name = "Загрузка по частям"
+        verbose_name_plural = "Загрузки по частям"
+        ordering = ("-created_at",)
+
+    def __str__(self) -> str:
+        return f"Загрузка {self.name} ({self.get_status_display()})"
+
+    @property
+    def chunks_total(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    def expected_chunk_size(self, index):
+        if index == self.chunks_total - 1:
+            return self.size - self.chunk_size * index
+        return self.chunk_size
+
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name="chunks",
+                                verbose_name="Загрузка")
+    index = models.PositiveIntegerField("Номер части")
+    size = models.PositiveIntegerField("Размер, байт")
+    sha256 = models.CharField("SHA-256", max_length=64)
+    file = models.FileField("Файл", max_length=255)
+
+    class Meta:
+        verbose_name = "Часть загрузки"
+        verbose_name_plural = "Части загрузки"
+        unique_together = (("session", "index"),)
 
 
 class TopicVote(models.Model):
@@ -162,3 +326,36 @@ class PostVote(models.Model):
         verbose_name = "Голос за сообщение"
         verbose_name_plural = "Голоса за сообщения"
         unique_together = (("post", "user"),)
+
+
+class PdfExport(models.Model):
+    """Фоновая выгрузка тем в PDF (qa.pdfexport) для больших выделений в админке."""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "В очереди"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Готово"
+        FAILED = "failed", "Ошибка"
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name="pdf_exports", verbose_name="Автор")
+    status = models.CharField("Статус", max_length=10, choices=Status.choices, default=Status.PENDING)
+    topic_ids = models.JSONField("Темы", default=list)
+    total = models.PositiveIntegerField("Всего тем", default=0)
+    processed = models.PositiveIntegerField("Обработано", default=0)
+    file = models.FileField("Файл", upload_to="exports/", blank=True)
+    error = models.TextField("Ошибка", blank=True)
+    created_at = models.DateTimeField("Создана", default=timezone.now)
+    finished_at = models.DateTimeField("Завершена", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Выгрузка в PDF"
+        verbose_name_plural = "Выгрузки в PDF"
+        ordering = ("-created_at",)
+
+    def __str__(self) -> str:
+        return f"PDF #{self.pk}: {self.get_status_display()}"
+
+    @property
+    def progress(self):
+        return round(100 * self.processed / self.total) if self.total else 100
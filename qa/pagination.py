@@ -0,0 +1,161 @@
+import base64
+import json
+from datetime import datetime
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class FeedPagination(PageNumberPagination):
+    """
+    Постраничная выдача с опциональным keyset-режимом.
+
+    Без параметра ``cursor`` работает как обычный PageNumberPagination.
+    С ``?cursor=`` (пустое значение — первая страница) выборка идёт по
+    составному ключу (поле сортировки, id) без COUNT(*) и OFFSET,
+    а ответ содержит только ссылку на следующую страницу.
+    """
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Некорректный курсор."
+    # Поля, по которым допустим keyset: только NOT NULL колонки.
+    cursor_fields = ("created_at", "updated_at", "rating", "posts_count")
+    # Всегда keyset, даже без ?cursor= (для выдач без номеров страниц).
+    cursor_only = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_only or self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        queryset = self.cursor_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_cursor_page(list(queryset))
+
+    def cursor_queryset(self, queryset, request):
+        """Выборка keyset-страницы (на строку больше — признак следующей) или None без размера страницы."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.key = self.get_keyset_ordering(queryset)
+        queryset = queryset.order_by(*self.key)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def set_cursor_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(self.get_cursor_page(data))
+
+    def get_cursor_page(self, data):
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        field = self.key[0].lstrip("-")
+        if isinstance(last, dict):
+            # Строки из .values() (qa.rows).
+            cursor = self.encode_cursor(last[field], last["id"])
+        else:
+            cursor = self.encode_cursor(getattr(last, field), last.pk)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        return None
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        primary = ordering[0] if ordering else "-id"
+        if not isinstance(primary, str):
+            raise ValidationError({"ordering": "Сортировка не поддерживается в режиме cursor."})
+        field = primary.lstrip("-")
+        if field in ("id", "pk"):
+            return ("-id",) if primary.startswith("-") else ("id",)
+        if field not in self.cursor_fields:
+            raise ValidationError({"ordering": "Сортировка не поддерживается в режиме cursor."})
+        prefix = "-" if primary.startswith("-") else ""
+        return (primary, f"{prefix}id")
+
+    def keyset_filter(self, position):
+        value, last_id = position
+        lookup = "lt" if self.key[0].startswith("-") else "gt"
+        if len(self.key) == 1:
+            return Q(**{f"id__{lookup}": last_id})
+        field = self.key[0].lstrip("-")
+        return Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": last_id})
+
+    def encode_cursor(self, value, last_id):
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([value, last_id], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, "")
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            value, last_id = json.loads(raw)
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        field = self.key[0].lstrip("-")
+        if field in ("created_at", "updated_at"):
+            value = parse_datetime(value) if isinstance(value, str) else None
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+        elif field not in ("id", "pk") and not isinstance(value, int):
+            raise NotFound(self.invalid_cursor_message)
+        return value, last_id
+
+
+async def apaginate_queryset(paginator, queryset, request):
+    """
+    ``paginate_queryset`` для асинхронных представлений (PageNumberPagination
+    и FeedPagination): COUNT и строки страницы — через async ORM, ссылки потом
+    строит обычный ``get_paginated_response``. Ошибки — те же NotFound/ValidationError.
+    """
+    if isinstance(paginator, FeedPagination):
+        paginator.use_cursor = paginator.cursor_only or paginator.cursor_query_param in request.query_params
+        if paginator.use_cursor:
+            queryset = paginator.cursor_queryset(queryset, request)
+            if queryset is None:
+                return None
+            return paginator.set_cursor_page([row async for row in queryset])
+
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+    pages = paginator.django_paginator_class(queryset, page_size)
+    # Paginator считает count() синхронно при первом обращении — подставляем готовое значение.
+    pages.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, pages)
+    try:
+        paginator.page = pages.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    paginator.page.object_list = [row async for row in paginator.page.object_list]
+    return paginator.page.object_list
@@ -0,0 +1,145 @@
+"""
+Выгрузка тем в PDF.
+
+Темы читаются одним запросом ``values_list(...).iterator()`` порциями: имя
+категории и автора берутся JOIN-ом, число сообщений — из денормализованного
+``posts_count``, экземпляры моделей не создаются. PDF пишется прямо в поток
+(ответ или временный файл), а не собирается в памяти.
+
+Выделения больше ``PDF_EXPORT_INLINE_LIMIT`` тем уходят в ``PdfExport``: задача
+выполняется в фоновом потоке процесса (``PDF_EXPORT_WORKERS``), пишет прогресс
+в строку задачи и сохраняет готовый файл в медиа-хранилище. Задачи, оставшиеся
+в очереди после перезапуска, дообрабатывает команда ``run_pdf_exports``.
+"""
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import PdfExport, Topic
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("title", "category__name", "author__username", "rating", "posts_count")
+
+
+def inline_limit():
+    return int(getattr(settings, "PDF_EXPORT_INLINE_LIMIT", 500))
+
+
+def chunk_size():
+    return int(getattr(settings, "PDF_EXPORT_CHUNK_SIZE", 1000))
+
+
+def topic_rows(queryset):
+    return (queryset.order_by("pk")
+            .values_list(*COLUMNS)
+            .iterator(chunk_size=chunk_size()))
+
+
+def rows_for_ids(ids):
+    # Порциями по id: без IN на десятки тысяч параметров.
+    size = chunk_size()
+    for start in range(0, len(ids), size):
+        yield from (Topic.objects.filter(pk__in=ids[start:start + size])
+                    .order_by("pk")
+                    .values_list(*COLUMNS))
+
+
+def write_pdf(stream, rows, progress=None, every=None):
+    """
+    Пишет PDF в ``stream``; ``progress(n)`` вызывается каждые ``every`` тем и в конце.
+    Возвращает число тем.
+    """
+    every = every or chunk_size()
+    p = canvas.Canvas(stream, pagesize=A4)
+    width, height = A4
+    y = height - 50
+    done = 0
+    for title, category, author, rating, posts_count in rows:
+        lines = [
+            f"Тема: {title}",
+            f"Категория: {category}",
+            f"Автор: {author}",
+            f"Рейтинг: {rating}",
+            f"Постов: {posts_count}",
+            "-" * 60,
+        ]
+        for line in lines:
+            p.drawString(40, y, line)
+            y -= 16
+            if y < 60:
+                p.showPage()
+                y = height - 50
+        done += 1
+        if progress is not None and done % every == 0:
+            progress(done)
+    p.showPage()
+    p.save()
+    if progress is not None:
+        progress(done)
+    return done
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(getattr(settings, "PDF_EXPORT_WORKERS", 1)),
+                                           thread_name_prefix="pdf-export")
+        return _executor
+
+
+def submit(queryset, user=None):
+    """Создаёт задачу по выделению и ставит её в фоновую очередь после коммита."""
+    ids = list(queryset.order_by("pk").values_list("pk", flat=True))
+    job = PdfExport.objects.create(created_by=user if user is not None and user.is_authenticated else None,
+                                   topic_ids=ids, total=len(ids))
+    transaction.on_commit(lambda: executor().submit(run_in_thread, job.pk))
+    return job
+
+
+def run_in_thread(job_id):
+    close_old_connections()
+    try:
+        run(job_id)
+    except Exception:
+        logger.exception("PDF export %s failed", job_id)
+    finally:
+        close_old_connections()
+
+
+def run(job_id):
+    """Выполняет задачу, если она ещё в очереди; возвращает False, если её уже взял другой процесс."""
+    claimed = PdfExport.objects.filter(pk=job_id, status=PdfExport.Status.PENDING).update(
+        status=PdfExport.Status.RUNNING)
+    if not claimed:
+        return False
+    job = PdfExport.objects.get(pk=job_id)
+
+    def progress(done):
+        PdfExport.objects.filter(pk=job_id).update(processed=done)
+
+    try:
+        with tempfile.TemporaryFile() as fh:
+            write_pdf(fh, rows_for_ids(sorted(job.topic_ids)), progress)
+            fh.seek(0)
+            job.file.save(f"topics-{job.pk}.pdf", File(fh), save=False)
+    except Exception as exc:
+        PdfExport.objects.filter(pk=job_id).update(
+            status=PdfExport.Status.FAILED, error=str(exc), finished_at=timezone.now())
+        raise
+    PdfExport.objects.filter(pk=job_id).update(
+        status=PdfExport.Status.DONE, file=job.file.name, finished_at=timezone.now())
+    return True
@@ -0,0 +1,341 @@
+"""
+Выборочное профилирование запросов cProfile вместо перехвата каждого запроса Silk.
+
+Запрос профилируется, если:
+
+* он попал в выборку: доля ``PROFILING_SAMPLE_RATE`` либо своя доля из
+  ``PROFILING_PATH_RATES`` (``{регулярное выражение пути: доля}``, первое совпадение);
+* или сотрудник прислал заголовок ``X-Profile: 1`` — такой профиль сохраняется
+  всегда, а его id возвращается в ``X-Profile-Id``.
+
+Профили из выборки сохраняются, только если запрос шёл не меньше
+``PROFILING_SLOW_MS``. Сериализация и запись идут в фоновом потоке: в кольцевой
+буфер в памяти процесса (``PROFILING_SINK = "memory"``) или в каталог
+``PROFILING_DIR`` с ротацией по ``PROFILING_MAX_FILES`` (``"file"`` — общий для
+воркеров). Очередь ограничена; при переполнении профиль отбрасывается, а не
+задерживает ответ.
+
+Профиль отдаётся как ``.prof`` (формат pstats: snakeviz, gprof2dot, flameprof),
+``.txt`` (сводка pstats) и ``.collapsed`` (свёрнутые стеки для flamegraph.pl и
+speedscope). Под ASGI-сервером запросы не профилируются (см. ``__acall__``).
+"""
+import cProfile
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_PROFILE"
+FORMATS = ("prof", "txt", "collapsed")
+
+
+def get_setting(name, default):
+    return getattr(settings, f"PROFILING_{name}", default)
+
+
+@lru_cache(maxsize=1)
+def path_rates():
+    return [(re.compile(pattern), float(rate)) for pattern, rate in get_setting("PATH_RATES", {}).items()]
+
+
+def sample_rate(path):
+    for pattern, rate in path_rates():
+        if pattern.search(path):
+            return rate
+    return float(get_setting("SAMPLE_RATE", 0.0))
+
+
+def requested_by_staff(request):
+    """Заголовок X-Profile от сотрудника: сессия или аутентификация DRF (JWT)."""
+    if request.META.get(HEADER, "").lower() not in ("1", "true", "yes"):
+        return False
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    from rest_framework.settings import api_settings
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authenticator().authenticate(request)
+        except Exception:
+            return False
+        if result is not None:
+            return bool(result[0].is_staff)
+    return False
+
+
+class Sink:
+    """Фоновая запись профилей: ответ не ждёт сериализации и диска."""
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=int(get_setting("QUEUE_SIZE", 100)))
+        self.dropped = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, meta, profiler):
+        self._start()
+        try:
+            self.queue.put_nowait((meta, profiler))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="profiling-sink", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            meta, profiler = self.queue.get()
+            try:
+                profiler.create_stats()
+                self.store(meta, marshal.dumps(profiler.stats))
+            except Exception:
+                logger.exception("Failed to store profile %s", meta.get("id"))
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        if self.thread is not None:
+            self.queue.join()
+
+    def store(self, meta, data):
+        raise NotImplementedError
+
+    def list(self):
+        raise NotImplementedError
+
+    def load(self, profile_id):
+        raise NotImplementedError
+
+
+class MemorySink(Sink):
+    """Кольцевой буфер в памяти процесса."""
+
+    def __init__(self):
+        super().__init__()
+        self.items = OrderedDict()
+        self.items_lock = threading.Lock()
+
+    def store(self, meta, data):
+        with self.items_lock:
+            self.items[meta["id"]] = (meta, data)
+            while len(self.items) > int(get_setting("MAX_FILES", 200)):
+                self.items.popitem(last=False)
+
+    def list(self):
+        with self.items_lock:
+            return [meta for meta, _ in reversed(self.items.values())]
+
+    def load(self, profile_id):
+        with self.items_lock:
+            return self.items.get(profile_id, (None, None))
+
+
+class FileSink(Sink):
+    """Каталог ``<id>.prof`` + ``<id>.json``; старейшие файлы удаляются сверх лимита."""
+
+    @property
+    def directory(self):
+        return Path(get_setting("DIR", Path(settings.BASE_DIR) / "var" / "profiles"))
+
+    def store(self, meta, data):
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{meta['id']}.prof").write_bytes(data)
+        # Метаданные пишутся последними: по ним строится список, профиль к этому моменту уже на диске.
+        tmp = directory / f"{meta['id']}.json.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, directory / f"{meta['id']}.json")
+        self.rotate(directory)
+
+    def rotate(self, directory):
+        metas = sorted(directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        for path in metas[:max(0, len(metas) - int(get_setting("MAX_FILES", 200)))]:
+            for stale in (path, path.with_suffix(".prof")):
+                stale.unlink(missing_ok=True)
+
+    def list(self):
+        directory = self.directory
+        if not directory.is_dir():
+            return []
+        metas = []
+        for path in directory.glob("*.json"):
+            try:
+                metas.append(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return sorted(metas, key=lambda m: m["created_at"], reverse=True)
+
+    def load(self, profile_id):
+        if not re.fullmatch(r"[0-9a-f]{32}", profile_id or ""):
+            return None, None
+        try:
+            meta = json.loads((self.directory / f"{profile_id}.json").read_text(encoding="utf-8"))
+            return meta, (self.directory / f"{profile_id}.prof").read_bytes()
+        except (OSError, ValueError):
+            return None, None
+
+
+SINKS = {"memory": MemorySink, "file": FileSink}
+_sink = None
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        name = get_setting("SINK", "memory")
+        _sink = (SINKS[name] if name in SINKS else import_string(name))()
+    return _sink
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    global _sink
+    if setting.startswith("PROFILING_"):
+        path_rates.cache_clear()
+        _sink = None
+
+
+def load_stats(data, stream):
+    stats = pstats.Stats(stream=stream)
+    stats.stats = marshal.loads(data)
+    stats.get_top_level_stats()
+    return stats
+
+
+def render(data, fmt):
+    if fmt == "prof":
+        return data
+    if fmt == "txt":
+        stream = io.StringIO()
+        load_stats(data, stream).sort_stats("cumulative").print_stats(80)
+        return stream.getvalue().encode()
+    if fmt == "collapsed":
+        lines = collapsed(marshal.loads(data))
+        return "".join(f"{stack} {value}\n" for stack, value in lines).encode()
+    raise ValueError(fmt)
+
+
+def frame_label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def collapsed(raw, min_us=1, max_depth=64):
+    """
+    Свёрнутые стеки из графа вызовов pstats. cProfile хранит только пары
+    «вызывающий → вызываемый», поэтому время функции делится между путями
+    пропорционально времени соответствующих рёбер (как во flameprof).
+    """
+    callees = defaultdict(dict)
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+    # Корни — вызовы без записанного вызывающего: первая функция под профилировщиком
+    # может позже вызываться и изнутри (обёртки middleware), поэтому считаем долю.
+    roots = []
+    for func, (_, calls, _, _, callers) in raw.items():
+        attributed = sum(edge[1] for edge in callers.values())
+        if calls > attributed:
+            roots.append((func, (calls - attributed) / calls))
+    stacks = Counter()
+
+    def walk(func, path, labels, scale):
+        tottime = raw[func][2]
+        labels = labels + (frame_label(func),)
+        own = tottime * scale * 1e6
+        if own >= min_us:
+            stacks[";".join(labels)] += own
+        if len(labels) >= max_depth:
+            return
+        for child, edge_time in callees.get(func, {}).items():
+            child_time = raw[child][3]
+            if child in path or child_time <= 0 or edge_time * scale * 1e6 < min_us:
+                continue
+            walk(child, path | {child}, labels, scale * edge_time / child_time)
+
+    for root, share in roots:
+        walk(root, frozenset((root,)), (), share)
+    return sorted((stack, int(value)) for stack, value in stacks.items() if int(value) > 0)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not get_setting("ENABLED", False):
+            return self.get_response(request)
+        on_demand = requested_by_staff(request)
+        if not on_demand and random.random() >= sample_rate(request.path):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Активен другой профилировщик (sys.monitoring в 3.12+ допускает только один).
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if not on_demand and duration_ms < float(get_setting("SLOW_MS", 0)):
+            return response
+        meta = {
+            "id": uuid.uuid4().hex,
+            "created_at": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.get_full_path()[:500],
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2),
+            "queries": getattr(getattr(response, "query_stats", None), "count", None),
+            "reason": "header" if on_demand else "sample",
+        }
+        if get_sink().submit(meta, profiler) and on_demand:
+            response["X-Profile-Id"] = meta["id"]
+        return response
+
+    async def __acall__(self, request):
+        # cProfile снимает поток целиком, а цикл событий общий для всех запросов — профиль
+        # смешал бы чужие корутины. Асинхронная цепочка (ASGI) не профилируется.
+        return await self.get_response(request)
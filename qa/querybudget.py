@@ -0,0 +1,207 @@
+"""
+Бюджеты SQL-запросов на эндпоинт и заголовок ``Server-Timing``.
+
+Бюджет объявляется на представлении DRF:
+
+    class TopicViewSet(viewsets.ModelViewSet):
+        query_budgets = {"list": 4, "retrieve": 4}
+
+Ключ — имя действия viewset'а (``list``, ``retrieve``, ``hot``…) или HTTP-метод
+в нижнем регистре для ``APIView``; ``query_budget`` задаёт бюджет для всех
+действий сразу. Представлениям DRF без объявления достаётся
+``QUERY_BUDGET_DEFAULT``, остальные (админка, страницы) не проверяются.
+
+``QueryBudgetMiddleware`` считает запросы ко всем базам и их время, пишет
+``Server-Timing`` и при превышении бюджета логирует запросы с самыми частыми
+шаблонами и повторы (один и тот же SQL с теми же параметрами). Текст запросов
+и параметры запоминаются только после превышения бюджета: в обычном запросе
+счётчик не тратит время и память на каждый оператор. При
+``QUERY_BUDGET_RAISE`` (по умолчанию — в DEBUG) бросает ``QueryBudgetExceeded``
+на чтении. Запись к этому моменту уже закоммичена, поэтому для POST/PUT/PATCH/DELETE
+превышение только логируется — клиент не получает 500 на выполненное изменение.
+В тестах бюджет проверяет ``QueryBudgetTestMixin.assertWithinBudget``.
+Под ASGI счётчик ставится в поток, где выполняются запросы async ORM этого запроса.
+"""
+import logging
+import math
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    Счётчик выполненных запросов; используется как execute_wrapper. Операторы
+    (SQL и параметры) запоминаются только сверх ``budget``; без бюджета — всегда.
+    """
+
+    def __init__(self, budget=None):
+        self.count = 0
+        self.seconds = 0.0
+        self.budget = budget
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            if self.budget is None or self.count > self.budget:
+                self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        """Лишние выполнения: один и тот же SQL с теми же параметрами сверх первого раза."""
+        return sum(n - 1 for n in self.statements.values())
+
+    def repeated(self, limit=3):
+        """Самые частые шаблоны SQL (без учёта параметров) — типичная подпись N+1."""
+        templates = Counter()
+        for (sql, _), n in self.statements.items():
+            templates[sql] += n
+        return [(sql, n) for sql, n in templates.most_common(limit) if n > 1]
+
+
+@contextmanager
+def count_queries(budget=None):
+    stats = QueryStats(budget)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+        yield stats
+
+
+def view_name(view_func, method):
+    """(класс представления, имя действия) для вызываемого DRF-представления."""
+    view_class = getattr(view_func, "cls", None)
+    if view_class is None or not issubclass(view_class, APIView):
+        return None, None
+    actions = getattr(view_func, "actions", None)
+    if actions:
+        return view_class, actions.get(method.lower())
+    return view_class, method.lower()
+
+
+def budget_for(view_class, action):
+    if view_class is None:
+        return None
+    budgets = getattr(view_class, "query_budgets", {})
+    if action in budgets:
+        return budgets[action]
+    return getattr(view_class, "query_budget", getattr(settings, "QUERY_BUDGET_DEFAULT", None))
+
+
+def server_timing(stats, total):
+    desc = f"{stats.count} queries" + (f", {stats.duplicates} dup" if stats.duplicates else "")
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{desc}", app;dur={total * 1000:.1f}'
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Синхронный process_view Django вызывал бы через поток на каждый запрос.
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", True):
+            return self.get_response(request)
+        started = time.perf_counter()
+        # Бюджет станет известен в process_view; до тех пор операторы не запоминаются.
+        with count_queries(budget=math.inf) as stats:
+            request._query_stats = stats
+            response = self.get_response(request)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", True):
+            return await self.get_response(request)
+        started = time.perf_counter()
+        # Соединения привязаны к потоку: запросы async ORM идут в потоке sync_to_async
+        # этого запроса (thread_sensitive), туда же ставится и счётчик.
+        stack = ExitStack()
+        stats = await sync_to_async(stack.enter_context)(count_queries(budget=math.inf))
+        request._query_stats = stats
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, total):
+        if getattr(settings, "QUERY_BUDGET_SERVER_TIMING", True):
+            response["Server-Timing"] = server_timing(stats, total)
+        response.query_stats = stats
+
+        view_class, action = getattr(request, "_query_budget_view", (None, None))
+        budget = budget_for(view_class, action)
+        response.query_budget = budget
+        if budget is not None and stats.count > budget:
+            self.exceeded(request, view_class, action, budget, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.set_view(request, view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.set_view(request, view_func)
+
+    def set_view(self, request, view_func):
+        request._query_budget_view = view_class, action = view_name(view_func, request.method)
+        stats = getattr(request, "_query_stats", None)
+        budget = budget_for(view_class, action)
+        if stats is not None and budget is not None:
+            stats.budget = budget
+
+    def exceeded(self, request, view_class, action, budget, stats):
+        name = f"{view_class.__name__}.{action}"
+        message = (f"{name}: {stats.count} queries > budget {budget} "
+                   f"({stats.duplicates} duplicate) for {request.method} {request.path}")
+        raise_error = getattr(settings, "QUERY_BUDGET_RAISE", settings.DEBUG)
+        logger.log(logging.ERROR if raise_error else logging.WARNING, message)
+        for sql, n in stats.repeated():
+            logger.warning("  %d x %s", n, sql[:300])
+        if raise_error and request.method in SAFE_METHODS:
+            raise QueryBudgetExceeded(message)
+
+
+class QueryBudgetTestMixin:
+    """
+    Для ``TestCase``: ``assertWithinBudget(response)`` — запрос тестового клиента
+    уложился в бюджет своего представления (или в явный ``budget``).
+    """
+
+    def assertWithinBudget(self, response, budget=None):
+        stats = getattr(response, "query_stats", None)
+        if stats is None:
+            self.fail("Нет query_stats у ответа: QueryBudgetMiddleware выключен или не установлен.")
+        if budget is None:
+            budget = response.query_budget
+        if budget is None:
+            self.fail(f"Для {response.request['REQUEST_METHOD']} {response.request['PATH_INFO']} не задан бюджет.")
+        if stats.count > budget:
+            repeated = "".join(f"\n  {n} x {sql[:300]}" for sql, n in stats.repeated())
+            self.fail(f"{response.request['REQUEST_METHOD']} {response.request['PATH_INFO']}: "
+                      f"{stats.count} queries > budget {budget} ({stats.duplicates} duplicate){repeated}")
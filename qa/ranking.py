@@ -0,0 +1,60 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+# Точка отсчёта для временной составляющей, чтобы значения hot_score оставались небольшими.
+HOT_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def hot_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def decay_seconds():
+    """Сколько секунд свежести стоят одного порядка (x10) активности."""
+    return float(hot_setting("HOT_DECAY_SECONDS", 45000))
+
+
+def top_k():
+    return int(hot_setting("HOT_TOP_K", 100))
+
+
+def window():
+    return timezone.timedelta(days=hot_setting("HOT_WINDOW_DAYS", 7))
+
+
+def hot_score(rating, posts_count, post_rating_sum, last_activity, created_at):
+    """
+    Оценка «горячести» темы в стиле reddit hot.
+
+    Активность (сообщения и голоса за тему и её сообщения) берётся в
+    логарифме, а время последней активности добавляется линейно. Так
+    порядок тем не зависит от момента расчёта, и хранимое значение не
+    нужно пересчитывать по мере старения — только при новой активности.
+
+    Активность считается по хранимым счётчикам темы, то есть за всё время,
+    а не только за окно: свежесть задаёт временная составляющая, и
+    старая тема с новым сообщением поднимается вместе со всей своей историей.
+    """
+    activity = (hot_setting("HOT_POST_WEIGHT", 2) * posts_count
+                + hot_setting("HOT_VOTE_WEIGHT", 1) * (rating + post_rating_sum))
+    order = math.log10(max(abs(activity), 1))
+    sign = 1 if activity > 0 else -1 if activity < 0 else 0
+    moment = max(filter(None, (last_activity, created_at)))
+    return round(sign * order + (moment - HOT_EPOCH).total_seconds() / decay_seconds(), 7)
+
+
+def window_start(now=None):
+    """Начало окна HOT_WINDOW_DAYS: в /topics/hot/ попадают темы, активные после него."""
+    return (now or timezone.now()) - window()
+
+
+def hot_cutoff(now=None):
+    """
+    Нижняя граница hot_score для чтения диапазона индекса. Она приблизительна:
+    тему с большой активностью за всё время пропустит и после окна, поэтому
+    точную границу по времени даёт ``window_start``.
+    """
+    return (window_start(now) - HOT_EPOCH).total_seconds() / decay_seconds()
@@ -0,0 +1,210 @@
+"""
+Отложенная запись рейтингов (write-behind) для всплесков голосов.
+
+При ``VOTE_WRITE_BEHIND = True`` строки голосов пишутся сразу, а изменения
+рейтинга тем и сообщений копятся в буфере процесса и сбрасываются пачками
+(``UPDATE ... FROM (VALUES ...)``) по интервалу или по размеру буфера.
+Так конкурирующие голосующие не стоят в очереди за блокировкой одной строки.
+Расхождения исправляет команда reconcile_ratings.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TOPIC = "topic"
+POST = "post"
+
+
+def is_enabled():
+    return bool(getattr(settings, "VOTE_WRITE_BEHIND", False))
+
+
+def flush_interval():
+    return float(getattr(settings, "VOTE_WRITE_BEHIND_INTERVAL", 2.0))
+
+
+def max_pending():
+    return int(getattr(settings, "VOTE_WRITE_BEHIND_MAX_PENDING", 500))
+
+
+class MemoryRatingBuffer:
+    """Потокобезопасный буфер дельт рейтинга в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deltas = {TOPIC: defaultdict(int), POST: defaultdict(int)}
+
+    def add(self, kind, object_id, delta):
+        with self.lock:
+            self.deltas[kind][object_id] += delta
+            return sum(len(d) for d in self.deltas.values())
+
+    def pending(self, kind, object_id):
+        with self.lock:
+            return self.deltas[kind].get(object_id, 0)
+
+    def drain(self):
+        with self.lock:
+            drained = {kind: dict(d) for kind, d in self.deltas.items()}
+            self.deltas = {TOPIC: defaultdict(int), POST: defaultdict(int)}
+        return drained
+
+    def restore(self, drained):
+        for kind, deltas in drained.items():
+            for object_id, delta in deltas.items():
+                self.add(kind, object_id, delta)
+
+
+class RatingWriteBehind:
+    batch_size = 500
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.last_flush = time.monotonic()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+
+    def add(self, kind, object_id, delta):
+        if not delta:
+            return
+        size = self.buffer.add(kind, object_id, delta)
+        self.ensure_flusher()
+        if size >= max_pending() or time.monotonic() - self.last_flush >= flush_interval():
+            self.flush()
+
+    def merged(self, kind, object_id, stored):
+        return stored + self.buffer.pending(kind, object_id)
+
+    def ensure_flusher(self):
+        if self.flusher is None or not self.flusher.is_alive():
+            self.flusher = threading.Thread(target=self.run_flusher, name="rating-write-behind", daemon=True)
+            self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(flush_interval())
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Rating write-behind flush failed")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Сбрасывает накопленные дельты в БД; возвращает число обновлённых объектов."""
+        if not self.flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            self.last_flush = time.monotonic()
+            drained = self.buffer.drain()
+            if not any(drained.values()):
+                return 0
+            try:
+                with transaction.atomic():
+                    topic_ids = apply_deltas(drained, self.batch_size)
+            except Exception:
+                self.buffer.restore(drained)
+                raise
+            from . import caching
+            from .models import Topic, Post
+            if topic_ids:
+                Topic.objects.refresh_hot_scores(Topic.objects.filter(pk__in=topic_ids))
+            caching.bump(Topic, Post)
+            return sum(len(d) for d in drained.values())
+        finally:
+            self.flush_lock.release()
+
+
+def _values(rows):
+    placeholders = ", ".join(["(CAST(%s AS bigint), CAST(%s AS integer))"] * len(rows))
+    params = [value for row in rows for value in row]
+    return placeholders, params
+
+
+def apply_deltas(drained, batch_size=500):
+    """
+    Применяет дельты пачками вместе с репутацией авторов; возвращает id тем,
+    чей рейтинг или сумма рейтингов изменились.
+    """
+    from accounts import reputation
+    from .models import Topic, Post
+    topic_table = Topic._meta.db_table
+    post_table = Post._meta.db_table
+    touched = set()
+    with connection.cursor() as cursor:
+        rows = [(pk, d) for pk, d in drained.get(TOPIC, {}).items() if d]
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            values, params = _values(chunk)
+            cursor.execute(
+                f"WITH v(id, delta) AS (VALUES {values}) "
+                f"UPDATE {topic_table} SET rating = {topic_table}.rating + v.delta "
+                f"FROM v WHERE {topic_table}.id = v.id", params)
+            touched.update(pk for pk, _ in chunk)
+
+        rows = [(pk, d) for pk, d in drained.get(POST, {}).items() if d]
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            values, params = _values(chunk)
+            cursor.execute(
+                f"WITH v(id, delta) AS (VALUES {values}) "
+                f"UPDATE {post_table} SET rating = {post_table}.rating + v.delta "
+                f"FROM v WHERE {post_table}.id = v.id", params)
+            cursor.execute(
+                f"WITH v(id, delta) AS (VALUES {values}), "
+                f"s AS (SELECT p.topic_id, SUM(v.delta) AS delta FROM {post_table} p "
+                f"      JOIN v ON p.id = v.id GROUP BY p.topic_id) "
+                f"UPDATE {topic_table} SET post_rating_sum = {topic_table}.post_rating_sum + s.delta "
+                f"FROM s WHERE {topic_table}.id = s.topic_id", params)
+            cursor.execute(
+                f"SELECT DISTINCT topic_id FROM {post_table} "
+                f"WHERE id IN ({', '.join(['%s'] * len(chunk))})", [pk for pk, _ in chunk])
+            touched.update(row[0] for row in cursor.fetchall())
+
+    for model, kind in ((Topic, TOPIC), (Post, POST)):
+        deltas = {pk: d for pk, d in drained.get(kind, {}).items() if d}
+        ids = list(deltas)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            authors = model.objects.filter(pk__in=chunk).values_list("pk", "author_id", "created_at")
+            reputation.record_many((author_id, created_at, deltas[pk], 0, 0)
+                                   for pk, author_id, created_at in authors)
+    return touched
+
+
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+
+def get_write_behind():
+    global _write_behind
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                path = getattr(settings, "VOTE_WRITE_BEHIND_BUFFER", "qa.ratings.MemoryRatingBuffer")
+                _write_behind = RatingWriteBehind(import_string(path)())
+                atexit.register(_flush_at_exit)
+    return _write_behind
+
+
+def _flush_at_exit():
+    if _write_behind is not None:
+        try:
+            _write_behind.flush()
+        except Exception:
+            logger.exception("Rating write-behind flush at exit failed")
+
+
+def merged_rating(kind, object_id, stored):
+    """Рейтинг с учётом ещё не записанных дельт этого процесса."""
+    if not is_enabled() or _write_behind is None:
+        return stored
+    return _write_behind.merged(kind, object_id, stored)
@@ -0,0 +1,186 @@
+"""
+Уменьшенные копии картинок (аватары, изображения экзаменов).
+
+Размеры задаются в ``IMAGE_RENDITIONS``: имя → (ширина, высота, режим), где
+``crop`` — обрезка точно под размер, ``fit`` — вписать с сохранением пропорций.
+Формат и качество — ``IMAGE_RENDITION_FORMAT`` (webp или jpeg) и
+``IMAGE_RENDITION_QUALITY``. Копии не увеличивают исходник.
+
+Имя копии детерминировано: ``renditions/<размер>/<путь оригинала>.<ключ>.<ext>``,
+где ключ — хэш параметров размера и формата. Смена настроек даёт новые имена,
+поэтому копии можно отдавать с долгим кэшированием.
+
+Копии строятся при сохранении модели (``register`` — после коммита) или
+лениво при первом ``url()``; уже построенные проверяются одним ``exists()``,
+а имена известных копий (и нечитаемых оригиналов) запоминаются в процессе. ``build_renditions``
+достраивает копии для старых картинок и удаляет лишние.
+"""
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "renditions"
+DEFAULT_SPECS = {
+    "avatar-64": (64, 64, "crop"),
+    "avatar-256": (256, 256, "crop"),
+    "admin-thumb": (160, 80, "fit"),
+    "exam-480": (480, 240, "fit"),
+}
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+KNOWN_LIMIT = 10000
+
+# (модель, поле, имена размеров) — для сигналов и build_renditions.
+registry = []
+# Имена построенных копий и картинок, которые не удалось прочитать (чтобы не декодировать их на каждом запросе).
+_known = set()
+_failed = set()
+
+
+def specs():
+    return getattr(settings, "IMAGE_RENDITIONS", DEFAULT_SPECS)
+
+
+def output_format():
+    fmt = getattr(settings, "IMAGE_RENDITION_FORMAT", "webp").lower()
+    return FORMATS.get(fmt, FORMATS["webp"])
+
+
+def quality():
+    return int(getattr(settings, "IMAGE_RENDITION_QUALITY", 80))
+
+
+def rendition_name(name, spec):
+    width, height, mode = specs()[spec]
+    pil_format, ext = output_format()
+    key = hashlib.sha1(f"{width}x{height}:{mode}:{pil_format}:{quality()}".encode()).hexdigest()[:8]
+    stem, _ = posixpath.splitext(name)
+    return f"{PREFIX}/{spec}/{stem}.{key}.{ext}"
+
+
+def render(source, spec):
+    """Байты копии из открытого файла оригинала."""
+    width, height, mode = specs()[spec]
+    pil_format, _ = output_format()
+    with Image.open(source) as original:
+        # JPEG декодируется сразу в уменьшенном масштабе — без полной картинки в памяти.
+        original.draft("RGB", (width, height))
+        image = ImageOps.exif_transpose(original)
+        if mode == "crop":
+            factor = min(1, image.width / width, image.height / height)
+            image = ImageOps.fit(image, (max(1, round(width * factor)), max(1, round(height * factor))),
+                                 Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail((width, height), Image.Resampling.LANCZOS)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        if pil_format == "JPEG" and has_alpha:
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        elif image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        buffer = BytesIO()
+        image.save(buffer, pil_format, quality=quality())
+    return buffer.getvalue()
+
+
+def generate(fieldfile, spec, force=False):
+    """Строит копию, если её ещё нет; возвращает её имя или None, если картинку не прочитать."""
+    name = rendition_name(fieldfile.name, spec)
+    storage = fieldfile.storage
+    if not force and (name in _known or storage.exists(name)):
+        remember(name)
+        return name
+    if not force and name in _failed:
+        return None
+    try:
+        with storage.open(fieldfile.name, "rb") as source:
+            data = render(source, spec)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning("Cannot render %s as %s: %s", fieldfile.name, spec, exc)
+        remember(name, _failed)
+        return None
+    _failed.discard(name)
+    if force and storage.exists(name):
+        storage.delete(name)
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        # Ту же копию параллельно построил другой запрос — лишнюю убираем.
+        storage.delete(saved)
+    remember(name)
+    return name
+
+
+def generate_all(fieldfile, spec_names, force=False):
+    for spec in spec_names:
+        generate(fieldfile, spec, force=force)
+
+
+def remember(name, names=None):
+    names = _known if names is None else names
+    if len(names) >= KNOWN_LIMIT:
+        names.clear()
+    names.add(name)
+
+
+def url(fieldfile, spec):
+    """URL копии (строится при первом обращении); без картинки — None, при ошибке — URL оригинала."""
+    if not fieldfile:
+        return None
+    name = generate(fieldfile, spec)
+    if name is None:
+        return fieldfile.url
+    return fieldfile.storage.url(name)
+
+
+def urls(fieldfile, spec_names, request=None):
+    result = {}
+    for spec in spec_names:
+        value = url(fieldfile, spec)
+        result[spec] = request.build_absolute_uri(value) if value and request is not None else value
+    return result
+
+
+def delete(fieldfile, spec_names):
+    for spec in spec_names:
+        name = rendition_name(fieldfile.name, spec)
+        _known.discard(name)
+        fieldfile.storage.delete(name)
+
+
+def stored_names(storage, path=PREFIX):
+    """Все файлы копий в хранилище."""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f"{path}/{name}"
+    for directory in directories:
+        yield from stored_names(storage, f"{path}/{directory}")
+
+
+def register(model, field, spec_names):
+    """Копии строятся после сохранения модели с картинкой и удаляются вместе с записью."""
+    registry.append((model, field, tuple(spec_names)))
+
+    def build(sender, instance, raw=False, **kwargs):
+        fieldfile = getattr(instance, field)
+        if fieldfile and not raw:
+            transaction.on_commit(lambda: generate_all(fieldfile, spec_names))
+
+    def drop(sender, instance, **kwargs):
+        fieldfile = getattr(instance, field)
+        if fieldfile:
+            transaction.on_commit(lambda: delete(fieldfile, spec_names))
+
+    uid = f"renditions:{model._meta.label}.{field}"
+    post_save.connect(build, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(drop, sender=model, weak=False, dispatch_uid=uid)
@@ -0,0 +1,238 @@
+"""
+Быстрая выдача списков только для чтения: строки из ``.values()`` вместо
+экземпляров моделей и полей DRF.
+
+``RowSerializer`` повторяет представление своего ``serializer_class`` байт в
+байт (порядок ключей, форматы дат, ``null``), но:
+
+* выбирает только нужные колонки одним ``.values()`` (JOIN-ы — только ради
+  колонок вроде ``category__name``, без полных строк связанных моделей);
+* для каждой страницы один раз собирает функции доступа к полям, а затем
+  строит строки без ``get_attribute``/``to_representation`` на каждую ячейку;
+* данные, которых нет в строке (теги, права), подгружает одним запросом на страницу.
+
+Поле, не описанное в ``columns``, берётся из одноимённой колонки модели.
+``?fields=`` учитывается, с ``?expand=`` представление возвращается к обычному
+сериализатору. ``aserialize`` — то же для асинхронных представлений (qa.async_views). Выключается ``FAST_LIST_SERIALIZATION = False``.
+"""
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import models
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+
+from . import ratings
+from .sparse import FIELDS_PARAM, param_set
+
+
+def is_enabled():
+    return bool(getattr(settings, "FAST_LIST_SERIALIZATION", True))
+
+
+def datetime_formatter():
+    """Форматирование дат как у ``serializers.DateTimeField`` в текущей таймзоне."""
+    field = serializers.DateTimeField()
+    output_format = api_settings.DATETIME_FORMAT
+    tz = field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or tz is None:
+        return field.to_representation
+
+    def format_datetime(value):
+        if not value:
+            return None
+        text = value.astimezone(tz).isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+    return format_datetime
+
+
+class Column:
+    """Значение одной колонки ``.values()``; ``None`` выдаётся как есть."""
+
+    def __init__(self, lookup, convert=None):
+        self.lookup = lookup
+        self.lookups = (lookup,)
+        self.convert = convert
+
+    def bind(self, rows, context):
+        if self.convert is None:
+            return itemgetter(self.lookup)
+        lookup, convert = self.lookup, self.convert
+
+        def get(row):
+            value = row[lookup]
+            return None if value is None else convert(value)
+
+        return get
+
+
+class DateTime(Column):
+    def bind(self, rows, context):
+        lookup, convert = self.lookup, context["format_datetime"]
+        return lambda row: convert(row[lookup])
+
+
+class Computed:
+    """Значение из нескольких колонок: ``function(*values)``."""
+
+    def __init__(self, lookups, function):
+        self.lookups = tuple(lookups)
+        self.function = function
+
+    def bind(self, rows, context):
+        getter, function = itemgetter(*self.lookups), self.function
+        if len(self.lookups) == 1:
+            return lambda row: function(getter(row))
+        return lambda row: function(*getter(row))
+
+
+class Rating(Computed):
+    """Рейтинг с учётом ещё не записанных дельт (qa.ratings)."""
+
+    def __init__(self, kind):
+        super().__init__(("id", "rating"), lambda pk, stored: ratings.merged_rating(kind, pk, stored))
+
+
+class IsEditable:
+    """Как ``get_is_editable``: автор или персонал."""
+    lookups = ("author",)
+
+    def bind(self, rows, context):
+        user = context["request"].user
+        if not user.is_authenticated:
+            return lambda row: False
+        if user.is_staff:
+            return lambda row: True
+        user_id = user.id
+        return lambda row: row["author"] == user_id
+
+
+class PageLookup:
+    """
+    Значение из словаря, собранного одним запросом на всю страницу: ``load(ids) -> {id: value}``.
+    ``aload`` — тот же запрос для асинхронных представлений (без него ``load`` идёт через sync_to_async).
+    """
+    lookups = ("id",)
+
+    def __init__(self, load, default=list, aload=None):
+        self.load = load
+        self.aload = aload or sync_to_async(load)
+        self.default = default
+
+    def bind(self, rows, context):
+        return self.getter(self.load([row["id"] for row in rows]) if rows else {})
+
+    async def abind(self, rows, context):
+        return self.getter(await self.aload([row["id"] for row in rows]) if rows else {})
+
+    def getter(self, values):
+        default = self.default
+        return lambda row: values.get(row["id"]) or default()
+
+
+class RowSerializer:
+    serializer_class = None
+    columns = {}
+    _names = None
+
+    def __init__(self, request, names):
+        self.request = request
+        self.names = names
+        fields = [self.field(name) for name in names]
+        lookups = {"id"}
+        for field in fields:
+            lookups.update(field.lookups)
+        self.fields = fields
+        self.lookups = lookups
+
+    @classmethod
+    def readable_names(cls):
+        # Порядок ключей — как у сериализатора DRF (Meta.fields без write_only).
+        if cls.__dict__.get("_names") is None:
+            cls._names = tuple(name for name, field in cls.serializer_class().fields.items()
+                               if not field.write_only)
+        return cls._names
+
+    @classmethod
+    def for_request(cls, request):
+        """Экземпляр для запроса или ``None``, если нужен обычный сериализатор."""
+        if not is_enabled() or request.method not in SAFE_METHODS:
+            return None
+        serializer = cls.serializer_class
+        if getattr(serializer, "requested_expansions", None) and serializer.requested_expansions(request):
+            return None
+        names = cls.readable_names()
+        requested = param_set(request, FIELDS_PARAM) if getattr(serializer, "sparse_fieldsets", False) else None
+        if requested is not None:
+            names = tuple(name for name in names if name in requested)
+        return cls(request, names)
+
+    @classmethod
+    def field(cls, name):
+        declared = cls.columns.get(name)
+        if declared is not None:
+            return declared
+        model_field = cls.serializer_class.Meta.model._meta.get_field(name)
+        if isinstance(model_field, models.DateTimeField):
+            return DateTime(name)
+        return Column(name)
+
+    def values(self, queryset, keep=()):
+        """``.values()`` с колонками выбранных полей и ``keep`` (сортировка, keyset-курсор)."""
+        return queryset.prefetch_related(None).values(*sorted(self.lookups | set(keep)))
+
+    def serialize(self, rows):
+        rows = list(rows)
+        context = self.context()
+        return self.build(rows, [field.bind(rows, context) for field in self.fields])
+
+    async def aserialize(self, rows):
+        """``serialize`` для асинхронных представлений: подгрузка на страницу — через ``abind``."""
+        rows = list(rows)
+        context = self.context()
+        getters = []
+        for field in self.fields:
+            abind = getattr(field, "abind", None)
+            getters.append(await abind(rows, context) if abind is not None else field.bind(rows, context))
+        return self.build(rows, getters)
+
+    def context(self):
+        return {"request": self.request, "format_datetime": datetime_formatter()}
+
+    def build(self, rows, getters):
+        names = self.names
+        return [dict(zip(names, [get(row) for get in getters])) for row in rows]
+
+
+class RowListMixin:
+    """
+    Списки ViewSet-а через ``row_serializer_class``, если он описывает тот же
+    сериализатор, что выбран для действия; иначе — обычный путь DRF.
+    """
+    row_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def list_response(self, queryset, serializer_class=None, keep=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        rows = None
+        if self.row_serializer_class is not None and self.row_serializer_class.serializer_class is serializer_class:
+            rows = self.row_serializer_class.for_request(self.request)
+        if rows is not None:
+            queryset = rows.values(queryset, self.row_keep_columns() if keep is None else keep)
+
+        page = self.paginate_queryset(queryset)
+        items = page if page is not None else queryset
+        if rows is not None:
+            data = rows.serialize(items)
+        else:
+            data = serializer_class(items, many=True, context=self.get_serializer_context()).data
+        return self.get_paginated_response(data) if page is not None else Response(data)
+
+    def row_keep_columns(self):
+        return tuple(getattr(self, "ordering_fields", None) or ())
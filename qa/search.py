@@ -0,0 +1,333 @@
+"""
+Полнотекстовый поиск по темам и сообщениям.
+
+Индекс хранится в отдельной таблице ``qa_search_index``: на PostgreSQL это
+обычная таблица с tsvector-документом и GIN-индексом, на SQLite — виртуальная
+таблица FTS5. Вес полей темы: заголовок > теги > текст. Индекс обновляется
+сигналами при записи (qa.signals) и пересобирается командой rebuild_search_index.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.models.expressions import RawSQL
+
+INDEX_TABLE = "qa_search_index"
+TOPIC = "topic"
+POST = "post"
+KINDS = (TOPIC, POST)
+
+SNIPPET_START = "<mark>"
+SNIPPET_STOP = "</mark>"
+
+
+def search_config():
+    return getattr(settings, "SEARCH_CONFIG", "russian")
+
+
+class PostgresBackend:
+    vendor = "postgresql"
+
+    topic_document = (
+        "setweight(to_tsvector(%s::regconfig, t.title), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, coalesce(tg.names, '')), 'B') || "
+        "setweight(to_tsvector(%s::regconfig, t.body), 'C')"
+    )
+
+    def install(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            " kind varchar(10) NOT NULL,"
+            " object_id bigint NOT NULL,"
+            " topic_id bigint NOT NULL,"
+            " title text NOT NULL DEFAULT '',"
+            " body text NOT NULL DEFAULT '',"
+            " document tsvector NOT NULL,"
+            " PRIMARY KEY (kind, object_id))"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document_gin "
+            f"ON {INDEX_TABLE} USING gin (document)"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+    def index_topics(self, cursor, ids=None):
+        cfg = search_config()
+        where, params = ("WHERE t.id = ANY(%s)", [list(ids)]) if ids is not None else ("", [])
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (kind, object_id, topic_id, title, body, document) "
+            f"SELECT %s, t.id, t.id, t.title, t.body, {self.topic_document} "
+            "FROM qa_topic t LEFT JOIN ("
+            "  SELECT tt.topic_id, string_agg(tag.name, ' ') AS names"
+            "  FROM qa_topictag tt JOIN qa_tag tag ON tag.id = tt.tag_id"
+            "  GROUP BY tt.topic_id"
+            f") tg ON tg.topic_id = t.id {where} "
+            "ON CONFLICT (kind, object_id) DO UPDATE SET "
+            "topic_id = EXCLUDED.topic_id, title = EXCLUDED.title, "
+            "body = EXCLUDED.body, document = EXCLUDED.document",
+            [TOPIC, cfg, cfg, cfg, *params],
+        )
+
+    def index_posts(self, cursor, ids=None):
+        where, params = ("WHERE p.id = ANY(%s)", [list(ids)]) if ids is not None else ("", [])
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (kind, object_id, topic_id, title, body, document) "
+            "SELECT %s, p.id, p.topic_id, '', p.body, "
+            "setweight(to_tsvector(%s::regconfig, p.body), 'C') "
+            f"FROM qa_post p {where} "
+            "ON CONFLICT (kind, object_id) DO UPDATE SET "
+            "topic_id = EXCLUDED.topic_id, body = EXCLUDED.body, document = EXCLUDED.document",
+            [POST, search_config(), *params],
+        )
+
+    def remove(self, cursor, kind, ids):
+        cursor.execute(
+            f"DELETE FROM {INDEX_TABLE} WHERE kind = %s AND object_id = ANY(%s)", [kind, list(ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f"TRUNCATE {INDEX_TABLE}")
+
+    def search(self, cursor, query, kind, limit, offset):
+        cfg = search_config()
+        kind_sql, kind_params = ("AND s.kind = %s", [kind]) if kind else ("", [])
+        headline_opts = (f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, "
+                         "MaxWords=30, MinWords=10, MaxFragments=2")
+        cursor.execute(
+            "SELECT kind, object_id, topic_id, title, rank, "
+            "ts_headline(%s::regconfig, CASE WHEN title = '' THEN body ELSE title || ' — ' || body END, "
+            "  query, %s) AS snippet "
+            "FROM ("
+            "  SELECT s.kind, s.object_id, s.topic_id, s.title, s.body, q AS query,"
+            "         ts_rank(s.document, q) AS rank"
+            f"  FROM {INDEX_TABLE} s, websearch_to_tsquery(%s::regconfig, %s) q"
+            f"  WHERE s.document @@ q {kind_sql}"
+            "  ORDER BY rank DESC, s.object_id DESC"
+            "  LIMIT %s OFFSET %s"
+            ") hits ORDER BY rank DESC, object_id DESC",
+            [cfg, headline_opts, cfg, query, *kind_params, limit, offset],
+        )
+        return cursor.fetchall()
+
+    def match_ids(self, query, kind):
+        return RawSQL(
+            f"SELECT object_id FROM {INDEX_TABLE} "
+            "WHERE kind = %s AND document @@ websearch_to_tsquery(%s::regconfig, %s)",
+            [kind, search_config(), query],
+        )
+
+
+class SqliteBackend:
+    vendor = "sqlite"
+
+    # rowid = id * 2 + код вида: удаление и замена идут по rowid, без скана FTS-таблицы.
+    kind_codes = {TOPIC: 0, POST: 1}
+    max_params = 900
+
+    def install(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, topic_id UNINDEXED, title, tags, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute(f"DROP TABLE IF EXISTS {INDEX_TABLE}")
+
+    def index_topics(self, cursor, ids=None):
+        ids = None if ids is None else list(ids)
+        where = ""
+        if ids is not None:
+            if not ids:
+                return
+            self.remove(cursor, TOPIC, ids)
+            where = f"WHERE t.id IN ({', '.join(['%s'] * len(ids))})"
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, kind, object_id, topic_id, title, tags, body) "
+            "SELECT t.id * 2, %s, t.id, t.id, t.title, "
+            "  coalesce((SELECT group_concat(tag.name, ' ') FROM qa_topictag tt"
+            "            JOIN qa_tag tag ON tag.id = tt.tag_id WHERE tt.topic_id = t.id), ''), "
+            f"  t.body FROM qa_topic t {where}",
+            [TOPIC, *(ids or [])],
+        )
+
+    def index_posts(self, cursor, ids=None):
+        ids = None if ids is None else list(ids)
+        where = ""
+        if ids is not None:
+            if not ids:
+                return
+            self.remove(cursor, POST, ids)
+            where = f"WHERE p.id IN ({', '.join(['%s'] * len(ids))})"
+        cursor.execute(
+            f"INSERT INTO {INDEX_TABLE} (rowid, kind, object_id, topic_id, title, tags, body) "
+            f"SELECT p.id * 2 + 1, %s, p.id, p.topic_id, '', '', p.body FROM qa_post p {where}",
+            [POST, *(ids or [])],
+        )
+
+    def remove(self, cursor, kind, ids):
+        rowids = [int(pk) * 2 + self.kind_codes[kind] for pk in ids]
+        # Порциями: у старых сборок SQLite не больше 999 параметров в запросе.
+        for start in range(0, len(rowids), self.max_params):
+            chunk = rowids[start:start + self.max_params]
+            cursor.execute(
+                f"DELETE FROM {INDEX_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+    def clear(self, cursor):
+        cursor.execute(f"DELETE FROM {INDEX_TABLE}")
+
+    def match_expression(self, query):
+        terms = re.findall(r"\w+", (query or "").lower())
+        return " ".join(f'"{term}"*' for term in terms)
+
+    def search(self, cursor, query, kind, limit, offset):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        kind_sql, kind_params = ("AND kind = %s", [kind]) if kind else ("", [])
+        cursor.execute(
+            "SELECT kind, object_id, topic_id, title, "
+            f"  -bm25({INDEX_TABLE}, 0, 0, 0, 10.0, 5.0, 1.0) AS rank, "
+            f"  snippet({INDEX_TABLE}, -1, %s, %s, '…', 16) AS snippet "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s {kind_sql} "
+            "ORDER BY rank DESC, object_id DESC LIMIT %s OFFSET %s",
+            [SNIPPET_START, SNIPPET_STOP, match, *kind_params, limit, offset],
+        )
+        return cursor.fetchall()
+
+    def match_ids(self, query, kind):
+        match = self.match_expression(query)
+        if not match:
+            return None
+        return RawSQL(
+            f"SELECT object_id FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s AND kind = %s",
+            [match, kind],
+        )
+
+
+BACKENDS = {backend.vendor: backend for backend in (PostgresBackend(), SqliteBackend())}
+_enabled = {}
+
+
+def get_backend(connection=None):
+    """Бэкенд индекса для соединения или None, если индекс недоступен."""
+    connection = connection or default_connection
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        return None
+    if connection.alias not in _enabled:
+        with connection.cursor() as cursor:
+            _enabled[connection.alias] = INDEX_TABLE in connection.introspection.table_names(cursor)
+    return backend if _enabled[connection.alias] else None
+
+
+def reset(**kwargs):
+    """Забывает, есть ли таблица индекса (после migrate — post_migrate в qa.apps)."""
+    _enabled.clear()
+
+
+def install(connection):
+    backend = BACKENDS.get(connection.vendor)
+    if backend is None:
+        return False
+    with connection.cursor() as cursor:
+        try:
+            backend.install(cursor)
+        except Exception:
+            # SQLite может быть собран без FTS5 — тогда остаётся поиск через icontains.
+            if connection.vendor != SqliteBackend.vendor:
+                raise
+            return False
+    _enabled.pop(connection.alias, None)
+    return True
+
+
+def uninstall(connection):
+    backend = BACKENDS.get(connection.vendor)
+    if backend is not None:
+        with connection.cursor() as cursor:
+            backend.uninstall(cursor)
+    _enabled.pop(connection.alias, None)
+
+
+def _write(method, *args):
+    backend = get_backend()
+    if backend is None:
+        return False
+    with default_connection.cursor() as cursor:
+        getattr(backend, method)(cursor, *args)
+    return True
+
+
+def index_topic(topic_id):
+    return _write("index_topics", [topic_id])
+
+
+def index_topics(topic_ids):
+    return _write("index_topics", list(topic_ids))
+
+
+def index_post(post_id):
+    return _write("index_posts", [post_id])
+
+
+def index_posts(post_ids):
+    return _write("index_posts", list(post_ids))
+
+
+def remove_topic(topic_id, post_ids=()):
+    """Убирает тему и, при каскадном удалении, её сообщения."""
+    post_ids = list(post_ids)
+    if post_ids:
+        _write("remove", POST, post_ids)
+    return _write("remove", TOPIC, [topic_id])
+
+
+def remove_post(post_id):
+    return _write("remove", POST, [post_id])
+
+
+def rebuild(chunk_size=5000, connection=None):
+    """Полностью пересобирает индекс, порциями по id. Возвращает число документов."""
+    connection = connection or default_connection
+    backend = get_backend(connection)
+    if backend is None:
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for table, method in (("qa_topic", backend.index_topics), ("qa_post", backend.index_posts)):
+            last_id = 0
+            while True:
+                cursor.execute(f"SELECT id FROM {table} WHERE id > %s ORDER BY id LIMIT %s",
+                               [last_id, chunk_size])
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                method(cursor, ids)
+                total += len(ids)
+                last_id = ids[-1]
+    return total
+
+
+def search(query, kind=None, limit=20, offset=0):
+    """Ранжированный поиск: список словарей с kind, id, topic, title, rank и snippet."""
+    backend = get_backend()
+    if backend is None or not (query or "").strip():
+        return []
+    with default_connection.cursor() as cursor:
+        rows = backend.search(cursor, query, kind, limit, offset)
+    return [
+        {"kind": kind, "id": object_id, "topic": topic_id, "title": title,
+         "rank": float(rank), "snippet": snippet}
+        for kind, object_id, topic_id, title, rank, snippet in rows
+    ]
+
+
+def matching_ids(query, kind):
+    """Подзапрос id подходящих объектов для ``pk__in`` или None, если индекс недоступен."""
+    backend = get_backend()
+    if backend is None or not (query or "").strip():
+        return None
+    return backend.match_ids(query, kind)
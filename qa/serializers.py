@@ -1,8 +1,14 @@
+import os
+
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
-from django.db.models import Count, Avg, Max
-from .models import Category, Tag, Topic, TopicTag, Post, Comment, TopicVote, PostVote
+from django.db.models import Count, Avg, Max, Prefetch
+from .models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote, UploadSession
 from .validators import validate_no_banned_words
+from . import ratings, uploads
+from .sparse import Expansion, Requirement, SparseFieldsMixin
+from .rows import Column, Computed, IsEditable, PageLookup, Rating, RowSerializer
+from django.urls import reverse
 from django.utils.text import slugify
 
 
@@ -21,7 +27,16 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "slug")
 
 
-class TopicListSerializer(serializers.ModelSerializer):
+def comments_prefetch(to_attr="expanded_comments"):
+    return Prefetch("comments", queryset=Comment.objects.select_related("author").order_by("created_at", "id"),
+                    to_attr=to_attr)
+
+
+def expanded_comments():
+    return CommentSerializer(source="expanded_comments", many=True, read_only=True)
+
+
+class TopicListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source="category.name", read_only=True)
     author_name = serializers.CharField(source="author.username", read_only=True)
     tags = serializers.SerializerMethodField(read_only=True)
@@ -54,10 +69,27 @@ class TopicListSerializer(serializers.ModelSerializer):
             "category": {"required": False},
         }
 
+    field_requirements = {
+        "category_name": Requirement(select=("category",)),
+        "author_name": Requirement(select=("author",)),
+        "tags": Requirement(prefetch=("tags",)),
+        "avg_post_rating": Requirement(only=("posts_count", "post_rating_sum")),
+        "is_editable": Requirement(only=("author",)),
+    }
+    expandable_fields = {
+        "comments": Expansion(expanded_comments, comments_prefetch, models=(Comment,)),
+    }
+
     def get_is_editable(self, obj):
         request = self.context.get("request")
         return bool(request and request.user.is_authenticated and (request.user.is_staff or obj.author_id == request.user.id))
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "rating" in data:
+            data["rating"] = ratings.merged_rating(ratings.TOPIC, instance.pk, data["rating"])
+        return data
+
     def get_tags(self, obj):
         return [{"id": t.id, "name": t.name, "slug": t.slug} for t in obj.tags.all()]
 
@@ -105,7 +137,7 @@ class TopicDetailSerializer(TopicListSerializer):
         validators = []
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source="author.username", read_only=True)
 
     class Meta:
@@ -113,9 +145,23 @@ class PostSerializer(serializers.ModelSerializer):
         fields = ("id", "topic", "author", "author_name", "body", "rating", "is_accepted", "created_at")
         read_only_fields = ("author", "rating", "created_at")
 
-    def get_is_editable(self, obj):
-        request = self.context.get("request")
-        return bool(request and request.user.is_authenticated and (request.user.is_staff or obj.author_id == request.user.id))
+    field_requirements = {
+        "author_name": Requirement(select=("author",)),
+    }
+    expandable_fields = {
+        "comments": Expansion(expanded_comments, comments_prefetch, models=(Comment,)),
+        "attachments": Expansion(
+            lambda: AttachmentSerializer(source="expanded_attachments", many=True, read_only=True),
+            lambda: Prefetch("attachments", queryset=Attachment.objects.order_by("uploaded_at", "id"),
+                             to_attr="expanded_attachments"),
+            models=(Attachment,)),
+    }
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if "rating" in data:
+            data["rating"] = ratings.merged_rating(ratings.POST, instance.pk, data["rating"])
+        return data
 
     def validate_body(self, value):
         validate_no_banned_words(value)
@@ -128,7 +174,7 @@ class PostSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.CharField(source="author.username", read_only=True)
 
     class Meta:
@@ -136,6 +182,10 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ("id", "topic", "post", "author", "author_name", "body", "created_at")
         read_only_fields = ("author", "created_at")
 
+    field_requirements = {
+        "author_name": Requirement(select=("author",)),
+    }
+
     def validate_body(self, value):
         validate_no_banned_words(value)
         return value
@@ -152,3 +202,171 @@ class CommentSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated:
             validated_data["author"] = request.user
         return super().create(validated_data)
+
+
+class AttachmentSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Attachment
+        fields = ("id", "name", "url", "uploaded_at")
+
+    def get_url(self, obj):
+        if obj.blob_id is None:
+            return None
+        url = reverse("qa:attachment-download", args=[obj.pk])
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Сессия загрузки по частям (qa.uploads); ``received`` — номера уже принятых частей."""
+    chunks_total = serializers.IntegerField(read_only=True)
+    received = serializers.SerializerMethodField()
+    attachment = AttachmentSerializer(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ("id", "post", "name", "size", "sha256", "chunk_size", "chunks_total", "received",
+                  "status", "attachment", "expires_at")
+        read_only_fields = ("chunk_size", "status", "expires_at")
+
+    def get_received(self, obj):
+        if obj.status != UploadSession.Status.OPEN:
+            return []
+        return uploads.received(obj)
+
+    def validate_name(self, value):
+        name = os.path.basename(value.replace("\\", "/")).strip()
+        if not name:
+            raise serializers.ValidationError("Пустое имя файла.")
+        return name
+
+    def validate_size(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Размер файла должен быть положительным.")
+        return value
+
+    def validate_sha256(self, value):
+        value = value.strip().lower()
+        if value and not uploads.SHA256_RE.match(value):
+            raise serializers.ValidationError("Ожидается SHA-256 в hex (64 символа).")
+        return value
+
+    def validate_post(self, post):
+        user = self.context["request"].user
+        if not (user.is_staff or post.author_id == user.id):
+            raise serializers.ValidationError("Прикреплять файлы можно только к своим сообщениям.")
+        return post
+
+
+class ThreadCommentsMixin:
+    """
+    Комментарии из ограниченного Prefetch (``thread_comments``): выбирается на
+    один больше лимита, чтобы без COUNT сообщить ``has_more_comments``.
+    """
+
+    def comments_page(self, obj):
+        limit = self.context["comments_limit"]
+        comments = getattr(obj, "thread_comments", [])
+        # Без request в контексте: ?fields= относится к корневому сериализатору, не к комментариям.
+        return CommentSerializer(comments[:limit], many=True).data, len(comments) > limit
+
+
+class ThreadPostSerializer(ThreadCommentsMixin, PostSerializer):
+    sparse_fieldsets = False
+    is_editable = serializers.SerializerMethodField()
+    my_vote = serializers.SerializerMethodField()
+    attachments = AttachmentSerializer(source="thread_attachments", many=True, read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ("updated_at", "is_editable", "my_vote", "attachments")
+
+    def get_is_editable(self, obj):
+        request = self.context.get("request")
+        return bool(request and request.user.is_authenticated and (request.user.is_staff or obj.author_id == request.user.id))
+
+    def get_my_vote(self, obj):
+        return self.context["post_votes"].get(obj.pk)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["comments"], data["has_more_comments"] = self.comments_page(instance)
+        return data
+
+
+class ThreadTopicSerializer(ThreadCommentsMixin, TopicDetailSerializer):
+    sparse_fieldsets = False
+    my_vote = serializers.SerializerMethodField()
+
+    class Meta(TopicDetailSerializer.Meta):
+        fields = TopicDetailSerializer.Meta.fields + ("my_vote",)
+
+    def get_my_vote(self, obj):
+        return self.context["topic_vote"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data["comments"], data["has_more_comments"] = self.comments_page(instance)
+        return data
+
+
+def topic_tag_rows(topic_ids):
+    # Порядок тегов — как у prefetch_related("tags"): по Tag.Meta.ordering (name).
+    return (TopicTag.objects.filter(topic_id__in=topic_ids)
+            .order_by("tag__name")
+            .values_list("topic_id", "tag_id", "tag__name", "tag__slug"))
+
+
+def topic_tags(topic_ids):
+    tags = {}
+    for topic_id, tag_id, name, slug in topic_tag_rows(topic_ids):
+        tags.setdefault(topic_id, []).append({"id": tag_id, "name": name, "slug": slug})
+    return tags
+
+
+async def atopic_tags(topic_ids):
+    tags = {}
+    async for topic_id, tag_id, name, slug in topic_tag_rows(topic_ids):
+        tags.setdefault(topic_id, []).append({"id": tag_id, "name": name, "slug": slug})
+    return tags
+
+
+def average(total, count):
+    return total / count if count else None
+
+
+class TopicListRows(RowSerializer):
+    serializer_class = TopicListSerializer
+    columns = {
+        "category_name": Column("category__name"),
+        "author_name": Column("author__username"),
+        "rating": Rating(ratings.TOPIC),
+        "tags": PageLookup(topic_tags, aload=atopic_tags),
+        "avg_post_rating": Computed(("post_rating_sum", "posts_count"), average),
+        "is_editable": IsEditable(),
+    }
+
+
+class CategoryRows(RowSerializer):
+    serializer_class = CategorySerializer
+
+
+class TopicDetailRows(TopicListRows):
+    """Тема целиком (для асинхронного ``retrieve``): поля списка и ``body``."""
+    serializer_class = TopicDetailSerializer
+
+
+class PostRows(RowSerializer):
+    serializer_class = PostSerializer
+    columns = {
+        "author_name": Column("author__username"),
+        "rating": Rating(ratings.POST),
+    }
+
+
+class CommentRows(RowSerializer):
+    serializer_class = CommentSerializer
+    columns = {
+        "author_name": Column("author__username"),
+    }
@@ -0,0 +1,195 @@
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from accounts import reputation
+
+from . import blobs, metrics, search
+from .models import Attachment, Tag, Topic, Post, TopicTag
+
+COUNTER_FIELDS = {"topic", "topic_id", "rating"}
+TOPIC_SEARCH_FIELDS = {"title", "body"}
+POST_SEARCH_FIELDS = {"topic", "topic_id", "body"}
+
+# Атрибут источника удаления (``origin``): id удаляемых им тем -> их сообщения, удалённые каскадом.
+CASCADE_ATTR = "_qa_deleted_topics"
+
+CREATED = metrics.counter("questudio_content_created_total", "Созданные темы и сообщения.", ("kind",))
+
+
+def touches(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+def author_deleted(instance, origin):
+    """Удаление каскадом от самого автора: его статистика удаляется вместе с ним."""
+    User = Topic._meta.get_field("author").related_model
+    if isinstance(origin, User):
+        return origin.pk == instance.author_id
+    if isinstance(origin, QuerySet) and issubclass(origin.model, User):
+        return origin.filter(pk=instance.author_id).exists()
+    return False
+
+
+def cascade_posts(topic_id, origin):
+    """
+    Сообщения темы, удаляемой тем же вызовом ``delete()``, или None. Такие
+    сообщения не трогают счётчики, hot_score и индекс по одному: тема уходит
+    вместе с ними, а репутация и индекс обновляются разом при удалении темы.
+    """
+    if origin is None:
+        return None
+    return getattr(origin, CASCADE_ATTR, {}).get(topic_id)
+
+
+@receiver(pre_delete, sender=Topic)
+def mark_topic_deleted(sender, instance, origin=None, **kwargs):
+    # pre_delete всех объектов отправляется до удаления первых строк каскада.
+    if origin is not None:
+        vars(origin).setdefault(CASCADE_ATTR, {})[instance.pk] = []
+
+
+@receiver(pre_save, sender=Topic)
+def init_hot_score(sender, instance, raw=False, **kwargs):
+    if instance._state.adding and not raw:
+        instance.hot_score = instance.compute_hot_score()
+
+
+@receiver(post_save, sender=Topic)
+def refresh_hot_score_on_rating_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not created and not raw and update_fields and "rating" in update_fields:
+        Topic.objects.refresh_hot_score(instance.pk)
+
+
+@receiver(pre_save, sender=Topic)
+def remember_topic_rating(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._rating_prev = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if not touches(update_fields, {"rating"}) or hasattr(instance.rating, "resolve_expression"):
+        return
+    instance._rating_prev = Topic.objects.filter(pk=instance.pk).values_list("rating", flat=True).first()
+
+
+@receiver(post_save, sender=Topic)
+def update_author_stats_on_topic_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        CREATED.inc(kind="topic")
+        reputation.record(instance.author_id, instance.created_at, rating=instance.rating, topics=1)
+        return
+    prev = getattr(instance, "_rating_prev", None)
+    instance._rating_prev = None
+    if prev is not None and prev != instance.rating:
+        reputation.record(instance.author_id, instance.created_at, rating=instance.rating - prev)
+
+
+@receiver(post_delete, sender=Topic)
+def update_author_stats_on_topic_delete(sender, instance, origin=None, **kwargs):
+    rows = [(post.author_id, post.created_at, -post.rating, 0, -1)
+            for post in (cascade_posts(instance.pk, origin) or ()) if not author_deleted(post, origin)]
+    if not author_deleted(instance, origin):
+        rows.append((instance.author_id, instance.created_at, -instance.rating, -1, 0))
+    reputation.record_many(rows)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Запоминает прежние тему и рейтинг, если сохранение может их изменить."""
+    instance._counters_prev = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if not touches(update_fields, COUNTER_FIELDS):
+        return
+    if hasattr(instance.rating, "resolve_expression"):
+        # F()-выражения вызывающий код учитывает сам через Topic.objects.on_post_rerated
+        return
+    instance._counters_prev = (Post.objects
+                               .filter(pk=instance.pk)
+                               .values_list("topic_id", "rating")
+                               .first())
+
+
+@receiver(post_save, sender=Post)
+def update_topic_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        # loaddata: связанные строки могут быть ещё не загружены — счётчики пересобирает rebuild_topic_counters.
+        return
+    if created:
+        CREATED.inc(kind="post")
+        Topic.objects.on_post_added(instance)
+        Topic.objects.refresh_hot_score(instance.topic_id)
+        reputation.record(instance.author_id, instance.created_at, rating=instance.rating, posts=1)
+        return
+    prev = getattr(instance, "_counters_prev", None)
+    instance._counters_prev = None
+    if prev is None:
+        return
+    prev_topic_id, prev_rating = prev
+    reputation.record(instance.author_id, instance.created_at, rating=instance.rating - prev_rating)
+    if prev_topic_id != instance.topic_id:
+        Topic.objects.on_post_removed(prev_topic_id, prev_rating)
+        Topic.objects.on_post_added(instance)
+        Topic.objects.refresh_hot_score(prev_topic_id)
+        Topic.objects.refresh_hot_score(instance.topic_id)
+    elif Topic.objects.on_post_rerated(instance.topic_id, instance.rating - prev_rating):
+        Topic.objects.refresh_hot_score(instance.topic_id)
+
+
+@receiver(post_delete, sender=Post)
+def update_topic_counters_on_delete(sender, instance, origin=None, **kwargs):
+    cascade = cascade_posts(instance.topic_id, origin)
+    if cascade is not None:
+        cascade.append(instance)
+        return
+    if not author_deleted(instance, origin):
+        reputation.record(instance.author_id, instance.created_at, rating=-instance.rating, posts=-1)
+    if Topic.objects.on_post_removed(instance.topic_id, instance.rating):
+        Topic.objects.refresh_hot_score(instance.topic_id)
+
+
+@receiver(post_save, sender=Topic)
+def index_topic(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and touches(update_fields, TOPIC_SEARCH_FIELDS):
+        search.index_topic(instance.pk)
+
+
+@receiver(post_delete, sender=Topic)
+def unindex_topic(sender, instance, origin=None, **kwargs):
+    search.remove_topic(instance.pk, [post.pk for post in cascade_posts(instance.pk, origin) or ()])
+
+
+@receiver(post_save, sender=TopicTag)
+def reindex_topic_tags(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_topic(instance.topic_id)
+
+
+@receiver(post_delete, sender=TopicTag)
+def reindex_topic_tags_on_delete(sender, instance, origin=None, **kwargs):
+    if cascade_posts(instance.topic_id, origin) is None:
+        search.index_topic(instance.topic_id)
+
+
+@receiver(post_save, sender=Tag)
+def reindex_tag_topics(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search.index_topics(TopicTag.objects.filter(tag=instance).values_list("topic_id", flat=True))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and touches(update_fields, POST_SEARCH_FIELDS):
+        search.index_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, origin=None, **kwargs):
+    if cascade_posts(instance.topic_id, origin) is None:
+        search.remove_post(instance.pk)
+
+
+@receiver(post_delete, sender=Attachment)
+def release_attachment_blob(sender, instance, **kwargs):
+    blobs.release(instance.blob_id)
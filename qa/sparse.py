@@ -0,0 +1,124 @@
+"""
+Разреженные наборы полей (``?fields=id,title``) и явные расширения (``?expand=comments``).
+
+``SparseFieldsMixin`` для сериализаторов:
+
+* оставляет в выдаче только поля из ``?fields=`` (неизвестные имена игнорируются);
+* добавляет поля из ``expandable_fields``, перечисленные в ``?expand=``;
+* ``optimize_queryset`` подгоняет выборку под выбранные поля: ``only()`` по нужным
+  колонкам, ``select_related``/``prefetch_related`` только для запрошенных полей и
+  ``Prefetch`` для расширений. Что нужно полю, кроме одноимённой колонки,
+  описывает ``field_requirements``.
+
+Данные расширений не видны в колонках корневой модели, поэтому ``Expansion``
+перечисляет их модели: ``expansion_models`` добавляет их версии к ключу кэша
+ответа (qa.caching) и к отпечатку ETag (qa.views).
+
+Параметры действуют только на чтение (GET/HEAD) и только на корневой
+сериализатор — вложенные выдаются целиком.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+class Requirement:
+    """Что нужно полю от выборки: колонки, связи для JOIN и для отдельной подгрузки."""
+
+    def __init__(self, only=(), select=(), prefetch=()):
+        self.only = tuple(only)
+        self.select = tuple(select)
+        self.prefetch = tuple(prefetch)
+
+
+class Expansion:
+    """Поле, добавляемое по ``?expand=``: фабрика сериализатора, его Prefetch и модели его данных."""
+
+    def __init__(self, serializer, prefetch, models=()):
+        self.serializer = serializer
+        self.prefetch = prefetch
+        self.models = tuple(models)
+
+
+def param_set(request, name):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get(name)
+    if raw is None:
+        return None
+    return {part.strip() for part in raw.split(",") if part.strip()}
+
+
+class SparseFieldsMixin:
+    field_requirements = {}
+    expandable_fields = {}
+    # Отключает ?fields=/?expand= для сериализаторов с фиксированной формой ответа.
+    sparse_fieldsets = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if not self.sparse_fieldsets or request is None:
+            return
+        for name in self.requested_expansions(request):
+            self.fields[name] = self.expandable_fields[name].serializer()
+        requested = param_set(request, FIELDS_PARAM)
+        if requested is not None:
+            keep = requested | self.requested_expansions(request)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def requested_expansions(cls, request):
+        if not cls.sparse_fieldsets:
+            return set()
+        return (param_set(request, EXPAND_PARAM) or set()) & set(cls.expandable_fields)
+
+    @classmethod
+    def expansion_models(cls, request):
+        return [model for name in sorted(cls.requested_expansions(request))
+                for model in cls.expandable_fields[name].models]
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request, keep=()):
+        """
+        Выборка под запрошенные поля. ``keep`` — колонки, нужные помимо полей
+        (сортировка и keyset-курсор). Без ``?fields=`` колонки не ограничиваются.
+        """
+        requested = param_set(request, FIELDS_PARAM) if cls.sparse_fieldsets else None
+        names = [name for name in cls.Meta.fields if requested is None or name in requested]
+
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        only, select, prefetch = {model._meta.pk.name}, set(), set()
+        for name in names:
+            requirement = cls.field_requirements.get(name)
+            if requirement is None:
+                if name in concrete:
+                    only.add(name)
+                continue
+            only.update(requirement.only)
+            only.update(requirement.select)
+            select.update(requirement.select)
+            prefetch.update(requirement.prefetch)
+
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+        for name in sorted(cls.requested_expansions(request)):
+            queryset = queryset.prefetch_related(cls.expandable_fields[name].prefetch())
+        if requested is not None:
+            queryset = queryset.only(*sorted(only | {name for name in keep if name in concrete}))
+        return queryset
+
+
+def expansion_models(view, request):
+    """Модели данных из ``?expand=`` для сериализатора DRF-представления ``view``."""
+    get_serializer_class = getattr(view, "get_serializer_class", None)
+    serializer_class = get_serializer_class() if get_serializer_class is not None else None
+    if serializer_class is None or not issubclass(serializer_class, SparseFieldsMixin):
+        return []
+    return serializer_class.expansion_models(request)
@@ -0,0 +1,11 @@
+from django import template
+
+from qa import renditions
+
+register = template.Library()
+
+
+@register.filter
+def rendition(fieldfile, spec):
+    """``{{ obj.image|rendition:"exam-480" }}`` — URL уменьшенной копии картинки (qa.renditions)."""
+    return renditions.url(fieldfile, spec) or ""
@@ -1,3 +1,1477 @@
-from django.test import TestCase
+import cProfile
+import csv
+import gzip
+import hashlib
+import io
+import json
+import marshal
+import os
+import random
+import shutil
+import tempfile
+import types
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.urls import include, re_path
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import UserStats, UserStatsDay
+
+from . import async_views, blobs, caching, export, metrics, pdfexport, profiling, ranking, ratings, search, votes
+from . import urls as qa_urls
+from .banned_words import Matcher
+from .management.commands import bench_api, stress_votes
+from .models import (Attachment, Blob, Category, Comment, PdfExport, Post, PostVote, Tag, Topic, TopicTag, TopicVote,
+                     UploadChunk)
+from .pagination import FeedPagination
+from .querybudget import QueryBudgetExceeded, QueryBudgetTestMixin
+from .validators import validate_many_no_banned_words, validate_no_banned_words
+from .views import CategoryViewSet, TopicViewSet
+
+User = get_user_model()
+
+
+class QaTestCase(TestCase):
+    """Общие данные тестов: категория, два пользователя и кэш без записей прошлых тестов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user("author", password="secret-pass-1")
+        cls.other = User.objects.create_user("other", password="secret-pass-2")
+        cls.category = Category.objects.create(name="Общее", slug="general")
+
+    def setUp(self):
+        caching.get_cache().clear()
+
+    def make_topic(self, title="Тема для проверки", author=None, **kwargs):
+        count = Topic.objects.count()
+        kwargs.setdefault("body", "Текст темы для проверки.")
+        return Topic.objects.create(category=self.category, author=author or self.author,
+                                    title=f"{title} {count}", slug=f"topic-{count}", **kwargs)
+
+    def make_post(self, topic, author=None, **kwargs):
+        kwargs.setdefault("body", "Сообщение в теме.")
+        return Post.objects.create(topic=topic, author=author or self.author, **kwargs)
+
+
+class TopicCountersTests(QaTestCase):
+    def test_counters_follow_post_create_rerate_and_delete(self):
+        topic = self.make_topic()
+        first = self.make_post(topic, rating=3)
+        second = self.make_post(topic, rating=1)
+        topic.refresh_from_db()
+        self.assertEqual((topic.posts_count, topic.post_rating_sum), (2, 4))
+        self.assertEqual(topic.last_activity, second.created_at)
+
+        first.rating = -1
+        first.save()
+        topic.refresh_from_db()
+        self.assertEqual(topic.post_rating_sum, 0)
+
+        second.delete()
+        topic.refresh_from_db()
+        self.assertEqual((topic.posts_count, topic.post_rating_sum), (1, -1))
+        self.assertEqual(topic.last_activity, first.created_at)
+
+    def test_fixture_load_does_not_touch_counters(self):
+        topic = self.make_topic()
+        fixture = json.dumps([{"model": "qa.post", "pk": 1000, "fields": {
+            "topic": topic.pk, "author": self.author.pk, "body": "Из фикстуры.", "rating": 5,
+            "is_accepted": False, "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+        }}])
+        for obj in serializers.deserialize("json", fixture):
+            obj.save()
+
+        topic.refresh_from_db()
+        self.assertEqual((topic.posts_count, topic.post_rating_sum), (0, 0))
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count, 0)
+
+        Topic.objects.rebuild_counters()
+        topic.refresh_from_db()
+        self.assertEqual((topic.posts_count, topic.post_rating_sum), (1, 5))
+
+
+@mock.patch.object(FeedPagination, "page_size", 3)
+class KeysetPaginationTests(QaTestCase):
+    def walk(self, path):
+        """Все страницы по ссылкам ``next``; возвращает id по порядку."""
+        ids, url = [], path
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            self.assertNotIn("count", body)
+            self.assertLessEqual(len(body["results"]), 3)
+            ids += [row["id"] for row in body["results"]]
+            url = body["next"]
+        return ids
+
+    def test_cursor_walk_matches_ordering_with_ties(self):
+        topics = [self.make_topic(rating=rating) for rating in (2, 5, 2, 2, 0, 5, 1)]
+        by_rating = sorted(topics, key=lambda topic: (-topic.rating, -topic.pk))
+        self.assertEqual(self.walk("/api/v1/topics/?cursor=&ordering=-rating"), [t.pk for t in by_rating])
+        self.assertEqual(self.walk("/api/v1/topics/?cursor="), [t.pk for t in reversed(topics)])
+
+        topic = topics[0]
+        posts = [self.make_post(topic, body=f"Ответ {i}") for i in range(5)]
+        self.assertEqual(self.walk(f"/api/v1/posts/?topic={topic.pk}&cursor=&ordering=created_at"),
+                         [post.pk for post in posts])
+
+    def test_new_rows_do_not_shift_next_page(self):
+        topics = [self.make_topic() for _ in range(5)]
+        first = self.client.get("/api/v1/topics/?cursor=").json()
+        self.make_topic()
+        second = self.client.get(first["next"]).json()
+        self.assertEqual([row["id"] for row in second["results"]], [t.pk for t in reversed(topics[:2])])
+
+    def test_invalid_cursor_and_ordering(self):
+        self.make_topic()
+        self.assertEqual(self.client.get("/api/v1/topics/?cursor=not-a-cursor").status_code, 404)
+        self.assertEqual(self.client.get("/api/v1/topics/?cursor=&ordering=last_activity").status_code, 400)
+        self.assertIn("count", self.client.get("/api/v1/topics/").json())
+
+
+class VoteTests(QaTestCase):
+    """Голос, переключение и отмена: строка голоса, рейтинг, сумма рейтингов темы и репутация автора."""
+
+    def vote(self, kind, pk, value, user=None):
+        return votes.apply_vote(kind, pk, (user or self.other).pk, value)
+
+    def test_post_vote_cycle(self):
+        topic = self.make_topic()
+        post = self.make_post(topic)
+        steps = [(1, votes.VOTED, 1), (-1, votes.SWITCHED, -1), (-1, votes.UNVOTED, 0), (1, votes.VOTED, 1)]
+        for value, status, rating in steps:
+            with self.subTest(value=value, status=status):
+                result = self.vote(votes.POST, post.pk, value)
+                self.assertEqual((result.status, result.rating, result.topic_id), (status, rating, topic.pk))
+                topic.refresh_from_db()
+                self.assertEqual(topic.post_rating_sum, rating)
+                self.assertEqual(UserStats.objects.get(user=self.author).reputation, rating)
+        self.assertEqual(list(PostVote.objects.values_list("user_id", "value")), [(self.other.pk, 1)])
+
+    def test_topic_vote_updates_hot_score(self):
+        topic = self.make_topic(rating=9)
+        Topic.objects.refresh_hot_score(topic.pk)
+        before = Topic.objects.get(pk=topic.pk).hot_score
+        result = self.vote(votes.TOPIC, topic.pk, 1)
+        topic.refresh_from_db()
+        self.assertEqual((result.status, topic.rating), (votes.VOTED, 10))
+        self.assertGreater(topic.hot_score, before)
+
+    def test_rejected_votes_change_nothing(self):
+        topic = self.make_topic()
+        with self.assertRaises(votes.VoteRejected):
+            self.vote(votes.TOPIC, topic.pk, 1, user=self.author)
+        with self.assertRaises(votes.VoteRejected):
+            self.vote(votes.TOPIC, topic.pk, 2)
+        with self.assertRaises(Http404):
+            self.vote(votes.TOPIC, topic.pk + 100, 1)
+        topic.refresh_from_db()
+        self.assertEqual((topic.rating, TopicVote.objects.count()), (0, 0))
+
+    def test_vote_endpoint(self):
+        topic = self.make_topic()
+        path = f"/api/v1/topics/{topic.pk}/vote/"
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.other)}"}
+        response = self.client.post(path, {"value": 1}, content_type="application/json", **headers)
+        self.assertEqual(response.json(), {"rating": 1, "status": votes.VOTED})
+        response = self.client.post(path, {"value": "x"}, content_type="application/json", **headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(path, {"value": 1}, content_type="application/json").status_code, 401)
+
+
+class StressVotesVerifyTests(TestCase):
+    def test_sequential_votes_are_consistent_in_both_modes(self):
+        command = stress_votes.Command()
+        for mode, vote in (("legacy", stress_votes.legacy_vote), ("atomic", stress_votes.atomic_vote)):
+            with self.subTest(mode=mode):
+                fixtures = command.setup_fixtures(2)
+                for user_id in fixtures["voters"]:
+                    vote(votes.POST, fixtures["post"], user_id, 1)
+                    vote(votes.TOPIC, fixtures["topic"], user_id, -1)
+                self.assertTrue(command.verify(fixtures, mode))
+                Topic.objects.filter(pk=fixtures["topic"]).update(rating=5)
+                self.assertFalse(command.verify(fixtures, mode))
+
+
+@override_settings(VOTE_WRITE_BEHIND=True, VOTE_WRITE_BEHIND_INTERVAL=3600)
+class WriteBehindTests(QaTestCase):
+    """Дельты рейтинга копятся в буфере процесса и сбрасываются пачкой; фоновый поток не запускается."""
+
+    def setUp(self):
+        super().setUp()
+        self.buffer = ratings.RatingWriteBehind(ratings.MemoryRatingBuffer())
+        self.enterContext(mock.patch.object(ratings, "_write_behind", self.buffer))
+        self.enterContext(mock.patch.object(ratings.RatingWriteBehind, "ensure_flusher"))
+        self.third = User.objects.create_user("third", password="secret-pass-3")
+
+    def test_votes_buffered_then_flushed_in_bulk(self):
+        topic = self.make_topic()
+        posts = [self.make_post(topic, body=f"Ответ {i}") for i in range(2)]
+        for post in posts:
+            for user in (self.other, self.third):
+                votes.apply_vote(votes.POST, post.pk, user.pk, 1)
+        result = votes.apply_vote(votes.TOPIC, topic.pk, self.other.pk, -1)
+        self.assertEqual(result.rating, -1)
+        self.assertEqual(list(Post.objects.values_list("rating", flat=True)), [0, 0])
+        self.assertEqual(self.client.get(f"/api/v1/posts/{posts[0].pk}/").json()["rating"], 2)
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(list(Post.objects.order_by("pk").values_list("rating", flat=True)), [2, 2])
+        topic.refresh_from_db()
+        self.assertEqual((topic.rating, topic.post_rating_sum), (-1, 4))
+        self.assertEqual(UserStats.objects.get(user=self.author).reputation, 3)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_deltas(self):
+        topic = self.make_topic()
+        votes.apply_vote(votes.TOPIC, topic.pk, self.other.pk, 1)
+        with mock.patch.object(ratings, "apply_deltas", side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.buffer.flush()
+        self.assertEqual(self.buffer.merged(ratings.TOPIC, topic.pk, 0), 1)
+        self.buffer.flush()
+        self.assertEqual(Topic.objects.get(pk=topic.pk).rating, 1)
+
+    def test_reconcile_fixes_lost_deltas(self):
+        topic = self.make_topic()
+        post = self.make_post(topic)
+        votes.apply_vote(votes.POST, post.pk, self.other.pk, 1)
+        votes.apply_vote(votes.TOPIC, topic.pk, self.third.pk, 1)
+        self.buffer.buffer.drain()
+        self.make_topic("Без голосов")
+        out = io.StringIO()
+        call_command("reconcile_ratings", stdout=out)
+        topic.refresh_from_db()
+        self.assertEqual((topic.rating, topic.post_rating_sum, Post.objects.get().rating), (1, 1, 1))
+        self.assertIn("Темы: drifted 1", out.getvalue())
+        self.assertIn("Сообщения: drifted 1", out.getvalue())
+        self.assertEqual(UserStats.objects.get(user=self.author).reputation, 2)
+        self.assertEqual(UserStatsDay.objects.get(user=self.author).reputation, 2)
+
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("reconcile_ratings", stdout=out)
+        self.assertIn("Темы: drifted 0", out.getvalue())
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE") and "rating" in q["sql"]
+                          and "post_rating_sum" not in q["sql"] and "hot_score" not in q["sql"]])
+
+
+class ResponseCacheTests(QaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(caching, "_stats", Counter()))
+
+    def test_anonymous_reads_cached_until_model_changes(self):
+        path = "/api/v1/categories/"
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(path + "?page=1")["X-Cache"], "MISS")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Новая", slug="new")
+        response = self.client.get(path)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(caching.stats()[CategoryViewSet.list.cache_name], {"miss": 3, "hit": 1})
+
+    def test_version_bumped_after_commit(self):
+        path = "/api/v1/categories/"
+        self.client.get(path)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.objects.create(name="Новая", slug="new")
+            # До коммита запись ещё не видна другим соединениям — версия прежняя.
+            self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+
+    def test_feeds_follow_author_names_only(self):
+        self.make_topic()
+        path = "/api/v1/topics/new/"
+        self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.email = "author@example.com"
+            self.author.save()
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=["last_login"])
+        self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = "renamed"
+            self.author.save()
+        response = self.client.get(path)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["author_name"], "renamed")
+
+    def test_related_model_and_evicted_version(self):
+        topic = self.make_topic()
+        path = "/api/v1/tags/cloud/"
+        self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            TopicTag.objects.create(topic=topic, tag=Tag.objects.create(name="django", slug="django"))
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+        # Ключ версии вытеснен: новое стартовое значение не совпадает со старыми записями.
+        caching.get_cache().delete(caching.VERSION_PREFIX + "qa.topictag")
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+
+    def test_authenticated_and_failed_requests_not_cached(self):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.author)}"}
+        self.assertNotIn("X-Cache", self.client.get("/api/v1/categories/", **headers))
+        for _ in range(2):
+            self.assertEqual(self.client.get("/api/v1/topics/hot/?page=99").status_code, 404)
+        self.assertEqual(caching.stats(), {TopicViewSet.hot.cache_name: {"miss": 2}})
+
+
+@override_settings(HOT_DECAY_SECONDS=45000, HOT_WINDOW_DAYS=7, HOT_POST_WEIGHT=2, HOT_VOTE_WEIGHT=1)
+class HotTopicsTests(QaTestCase):
+    def make_hot_topic(self, title, age, rating=0):
+        topic = self.make_topic(title)
+        moment = timezone.now() - age
+        Topic.objects.filter(pk=topic.pk).update(rating=rating, created_at=moment, last_activity=None)
+        Topic.objects.refresh_hot_score(topic.pk)
+        return topic
+
+    def test_score_decays_by_one_order_per_period(self):
+        moment = timezone.now()
+        later = moment + timezone.timedelta(seconds=45000)
+        self.assertAlmostEqual(ranking.hot_score(100, 0, 0, None, moment), ranking.hot_score(10, 0, 0, None, later))
+        self.assertLess(ranking.hot_score(5, 0, 0, None, moment), ranking.hot_score(5, 0, 0, None, later))
+        self.assertLess(ranking.hot_score(-5, 0, 0, None, moment), ranking.hot_score(0, 0, 0, None, moment))
+        # Сообщение весит как два голоса; время — последняя активность, а не создание.
+        self.assertEqual(ranking.hot_score(0, 1, 0, moment, moment - timezone.timedelta(days=30)),
+                         ranking.hot_score(2, 0, 0, None, moment))
+
+    def test_hot_orders_by_activity_and_freshness(self):
+        fresh = self.make_hot_topic("Свежая", timezone.timedelta(hours=1), rating=10)
+        older = self.make_hot_topic("Постарше", timezone.timedelta(days=2), rating=10)
+        popular = self.make_hot_topic("Популярная", timezone.timedelta(days=2), rating=100000)
+        self.assertEqual(list(Topic.objects.hot()), [popular, fresh, older])
+
+    def test_hot_excludes_topics_outside_window(self):
+        self.make_hot_topic("Старая, но громкая", timezone.timedelta(days=8), rating=10 ** 9)
+        revived = self.make_hot_topic("Ожившая", timezone.timedelta(days=30))
+        self.assertEqual(list(Topic.objects.hot()), [])
+        self.make_post(revived)
+        self.assertEqual(list(Topic.objects.hot()), [revived])
+
+
+class TopicCascadeDeleteTests(QaTestCase):
+    def delete_queries(self, posts):
+        topic = self.make_topic()
+        for rating in range(posts):
+            self.make_post(topic, author=self.other, rating=rating, body=f"Каскадное сообщение {rating}")
+        with CaptureQueriesContext(connection) as queries:
+            topic.delete()
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        self.assertEqual(self.delete_queries(2), self.delete_queries(12))
+
+    def test_reputation_and_search_index_updated_in_bulk(self):
+        topic = self.make_topic(rating=2)
+        self.make_post(topic, author=self.other, rating=3, body="Уникальноеслово в ответе")
+        self.make_post(topic, author=self.other, rating=-1)
+        self.make_post(topic, rating=4)
+        self.assertTrue(search.search("уникальноеслово"))
+        self.assertTrue(search.search("сообщение"))
+
+        topic.delete()
+
+        author, other = UserStats.objects.get(user=self.author), UserStats.objects.get(user=self.other)
+        self.assertEqual((author.reputation, author.topics_count, author.posts_count), (0, 0, 0))
+        self.assertEqual((other.reputation, other.posts_count), (0, 0))
+        self.assertEqual(search.search("уникальноеслово"), [])
+        self.assertEqual(search.search("сообщение"), [])
+
+    def test_single_post_delete_still_updates_topic(self):
+        topic = self.make_topic()
+        post = self.make_post(topic, body="Отдельноеслово в ответе")
+        post.delete()
+        topic.refresh_from_db()
+        self.assertEqual(topic.posts_count, 0)
+        self.assertEqual(search.search("отдельноеслово"), [])
+
+    def test_queryset_and_author_deletes_keep_stats_consistent(self):
+        first, second = self.make_topic(), self.make_topic(author=self.other)
+        self.make_post(first, author=self.other, rating=2)
+        self.make_post(second, rating=5)
+        self.make_post(second, author=self.other, rating=1)
+
+        Topic.objects.filter(pk=first.pk).delete()
+        other = UserStats.objects.get(user=self.other)
+        self.assertEqual((other.reputation, other.topics_count, other.posts_count), (1, 1, 1))
+
+        self.other.delete()
+        author = UserStats.objects.get(user=self.author)
+        self.assertEqual((author.reputation, author.topics_count, author.posts_count), (0, 0, 0))
+        self.assertFalse(Post.objects.exists())
+
+
+class SearchTests(QaTestCase):
+    """Ранжирование, сниппеты и фильтры поиска; на PostgreSQL — websearch_to_tsquery и ts_headline."""
+
+    def setUp(self):
+        super().setUp()
+        self.tag = Tag.objects.create(name="кэширование", slug="caching")
+        self.in_title = self.make_topic(title="Кэширование ответов", body="Про заголовки HTTP.")
+        self.in_tag = self.make_topic(title="Заголовки ответов", body="Про версии.")
+        TopicTag.objects.create(topic=self.in_tag, tag=self.tag)
+        search.index_topic(self.in_tag.pk)
+        self.in_body = self.make_topic(title="Разное", body="Немного про кэширование в конце длинного текста.")
+        self.post = self.make_post(self.in_body, author=self.other, body="Кэширование помогает при нагрузке.")
+
+    def hits(self, query, **kwargs):
+        return [(hit["kind"], hit["id"]) for hit in search.search(query, **kwargs)]
+
+    def test_title_outranks_tags_and_body(self):
+        topics = [(search.TOPIC, topic.pk) for topic in (self.in_title, self.in_tag, self.in_body)]
+        self.assertEqual(self.hits("кэширование", kind=search.TOPIC), topics)
+        self.assertEqual(self.hits("кэширование", kind=search.POST), [(search.POST, self.post.pk)])
+        self.assertEqual(set(self.hits("кэширование")), set(topics) | {(search.POST, self.post.pk)})
+        self.assertEqual(self.hits("кэширование", kind=search.TOPIC, limit=1, offset=1), topics[1:2])
+        self.assertEqual(self.hits("несуществующееслово"), [])
+        self.assertEqual(self.hits("  "), [])
+
+    def test_snippets_mark_matches(self):
+        hit = search.search("нагрузке", kind=search.POST)[0]
+        self.assertIn(f"{search.SNIPPET_START}", hit["snippet"])
+        self.assertIn("нагрузк", hit["snippet"].split(search.SNIPPET_START, 1)[1].split(search.SNIPPET_STOP)[0])
+        self.assertEqual((hit["topic"], hit["title"]), (self.in_body.pk, ""))
+
+    def test_search_endpoint(self):
+        response = self.client.get("/api/v1/search/?q=кэширование&kind=post")
+        self.assertEqual([row["id"] for row in response.json()["results"]], [self.post.pk])
+        self.assertEqual(self.client.get("/api/v1/search/?q=кэширование&kind=user").status_code, 400)
+
+    def test_search_param_keeps_unindexed_fields(self):
+        def ids(path):
+            return {row["id"] for row in self.client.get(path).json()["results"]}
+
+        self.assertEqual(ids("/api/v1/topics/?search=кэширование"), {self.in_title.pk, self.in_tag.pk, self.in_body.pk})
+        self.assertEqual(ids("/api/v1/topics/?search=author"), {self.in_title.pk, self.in_tag.pk, self.in_body.pk})
+        self.assertEqual(ids("/api/v1/topics/?search=Общее заголовки"), {self.in_title.pk, self.in_tag.pk})
+        self.assertEqual(ids("/api/v1/posts/?search=other"), {self.post.pk})
+        self.assertEqual(ids("/api/v1/posts/?search=Разное нагрузке"), {self.post.pk})
+        self.assertEqual(ids("/api/v1/posts/?search=author нагрузке"), set())
+
+
+class BenchApiTests(TestCase):
+    def setUp(self):
+        self.out = io.StringIO()
+        self.command = bench_api.Command(stdout=self.out, no_color=True)
+
+    def baseline(self, results):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "baseline.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"results": results}, fh)
+        return path
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+        self.assertEqual([bench_api.percentile(values, q) for q in (0, 50, 95, 99, 100)], [1, 5, 10, 10, 10])
+        self.assertEqual(bench_api.percentile([7], 95), 7)
+
+    def test_check_budgets_counts_endpoints_over_budget(self):
+        results = {"topics-list": {"queries": 5, "budget": 4}, "topics-detail": {"queries": 4, "budget": 4},
+                   "admin": {"queries": 50, "budget": None}}
+        self.assertEqual(self.command.check_budgets(results), 1)
+        self.assertIn("OVER BUDGET topics-list: 5 queries > 4", self.out.getvalue())
+        self.assertNotIn("topics-detail", self.out.getvalue())
+
+    def test_compare_flags_regressions_over_threshold(self):
+        path = self.baseline({
+            "slower": {"p95_ms": 10.0, "queries": 3, "rows": 20, "bytes": 1000},
+            "noise": {"p95_ms": 10.0, "queries": 3, "rows": 20, "bytes": 1000},
+            "one-more-query": {"p95_ms": 10.0, "queries": 3},
+            "faster": {"p95_ms": 10.0, "queries": 3},
+            "removed": {"p95_ms": 1.0},
+        })
+        results = {
+            "slower": {"p95_ms": 13.0, "queries": 3, "rows": 20, "bytes": 1000},
+            "noise": {"p95_ms": 11.0, "queries": 3, "rows": 21, "bytes": 1100},
+            "one-more-query": {"p95_ms": 10.0, "queries": 4},
+            "faster": {"p95_ms": 5.0, "queries": 2},
+            "new": {"p95_ms": 1.0},
+        }
+        self.assertEqual(self.command.compare(path, results, 0.2), 2)
+        output = self.out.getvalue()
+        self.assertIn("REGRESSION slower: p95_ms 10.0 -> 13.0 (+30%)", output)
+        # Запросы сравниваются строго: даже один лишний — регрессия.
+        self.assertIn("REGRESSION one-more-query: queries 3 -> 4 (+33%)", output)
+        self.assertNotIn("REGRESSION noise", output)
+        self.assertNotIn("REGRESSION faster", output)
+        self.assertIn("new: new", output)
+        self.assertIn("removed: removed", output)
+
+    def test_compare_without_regressions_and_bad_baseline(self):
+        path = self.baseline({"topics": {"p95_ms": 0, "queries": 0}})
+        self.assertEqual(self.command.compare(path, {"topics": {"p95_ms": 0, "queries": 0}}, 0.1), 0)
+        self.assertIn("No regressions.", self.out.getvalue())
+        with self.assertRaises(CommandError):
+            self.command.compare(path + ".missing", {}, 0.1)
+
+
+class BannedWordsTests(TestCase):
+    def test_finds_overlapping_terms_in_order_of_appearance(self):
+        matcher = Matcher(["he", "she", "HERS", "his", "  "])
+        self.assertEqual(len(matcher), 4)
+        self.assertEqual(matcher.find("uShers"), ["she", "he", "hers"])
+        self.assertEqual(matcher.find("nothing here"), ["he"])
+        self.assertEqual(matcher.find_many(["ahis", "", None]), [["his"], [], []])
+
+    def test_agrees_with_substring_scan(self):
+        rnd = random.Random(7)
+        terms = {"".join(rnd.choice("абвг") for _ in range(rnd.randint(1, 4))) for _ in range(40)}
+        matcher = Matcher(terms)
+        for _ in range(200):
+            text = "".join(rnd.choice("абвгд") for _ in range(30))
+            self.assertEqual(set(matcher.find(text)), {term for term in terms if term in text})
+
+    def test_scanning_does_not_grow_automaton(self):
+        matcher = Matcher(["spam", "scam"])
+        transitions = sum(len(edges) for edges in matcher.goto)
+        matcher.find("".join(chr(code) for code in range(32, 3000)) + " sspam scum")
+        self.assertEqual(sum(len(edges) for edges in matcher.goto), transitions)
+
+    def test_validator_reports_terms_and_reloads_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "words.txt")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write("# список\nкриптоказино\n")
+            with self.settings(BANNED_WORDS=["spam"], BANNED_WORDS_FILE=path, BANNED_WORDS_RELOAD_INTERVAL=0):
+                with self.assertRaisesMessage(ValidationError, "spam, криптоказино"):
+                    validate_no_banned_words("SPAM и Криптоказино")
+                self.assertEqual(validate_many_no_banned_words(["чисто", "spam"]), {1: ["spam"]})
+
+                with open(path, "w", encoding="utf-8") as fh:
+                    fh.write("лохотрон\n")
+                os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+                validate_no_banned_words("криптоказино")
+                with self.assertRaisesMessage(ValidationError, "лохотрон"):
+                    validate_no_banned_words("это лохотрон")
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, QaTestCase):
+    """Объявленные бюджеты запросов (query_budgets) на данных со связями: теги, голоса, комментарии."""
+
+    def setUp(self):
+        super().setUp()
+        self.tags = [Tag.objects.create(name=name, slug=name) for name in ("django", "python")]
+        self.topic = self.make_topic(body="Тема с ответами про бюджеты запросов.")
+        for tag in self.tags:
+            TopicTag.objects.create(topic=self.topic, tag=tag)
+        self.posts = [self.make_post(self.topic, author=self.other, body=f"Ответ номер {i}") for i in range(3)]
+        for post in self.posts:
+            Comment.objects.create(post=post, author=self.author, body="Комментарий к ответу")
+            PostVote.objects.create(post=post, user=self.author, value=1)
+        Comment.objects.create(topic=self.topic, author=self.other, body="Комментарий к теме")
+        TopicVote.objects.create(topic=self.topic, user=self.other, value=1)
+
+    def auth(self, user):
+        return {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"}
+
+    def send(self, method, path, data=None, user=None):
+        headers = self.auth(user) if user is not None else {}
+        if data is not None:
+            headers["content_type"] = "application/json"
+            data = json.dumps(data)
+        return getattr(self.client, method)(path, data, **headers) if data is not None \
+            else getattr(self.client, method)(path, **headers)
+
+    def test_read_endpoints(self):
+        topic, post = self.topic.pk, self.posts[0].pk
+        paths = [
+            "/api/v1/topics/", "/api/v1/topics/?expand=comments", "/api/v1/topics/?fields=id,title",
+            f"/api/v1/topics/{topic}/", f"/api/v1/topics/{topic}/?expand=comments",
+            "/api/v1/topics/hot/", "/api/v1/topics/new/", "/api/v1/topics/?cursor=",
+            f"/api/v1/topics/{topic}/thread/",
+            f"/api/v1/posts/?topic={topic}", f"/api/v1/posts/?topic={topic}&expand=comments,attachments",
+            f"/api/v1/posts/{post}/", "/api/v1/comments/", "/api/v1/categories/", "/api/v1/tags/",
+            "/api/v1/tags/cloud/", "/api/v1/search/?q=ответ",
+        ]
+        for user in (None, self.author):
+            for path in paths:
+                with self.subTest(path=path, user=user):
+                    response = self.send("get", path, user=user)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertWithinBudget(response)
+
+    def test_write_endpoints(self):
+        response = self.send("post", "/api/v1/topics/", {"title": "Новая тема про запросы", "body": "Текст новой темы.",
+                                                         "category_slug": "general"}, user=self.author)
+        self.assertEqual(response.status_code, 201)
+        self.assertWithinBudget(response)
+        topic = self.topic.pk
+        post = self.posts[0].pk
+        comment = Comment.objects.filter(post=post).first().pk
+        steps = [
+            ("patch", f"/api/v1/topics/{topic}/", {"title": "Переименованная тема"}, self.author, 200),
+            ("post", f"/api/v1/topics/{topic}/vote/", {"value": -1}, self.other, 200),
+            ("post", "/api/v1/posts/", {"topic": topic, "body": "Ещё один ответ"}, self.author, 201),
+            ("patch", f"/api/v1/posts/{post}/", {"body": "Исправленный ответ"}, self.other, 200),
+            ("post", f"/api/v1/posts/{post}/vote/", {"value": -1}, self.author, 200),
+            ("post", "/api/v1/comments/", {"post": post, "body": "Ещё комментарий"}, self.other, 201),
+            ("patch", f"/api/v1/comments/{comment}/", {"post": post, "body": "Другой текст"}, self.author, 200),
+            ("delete", f"/api/v1/comments/{comment}/", None, self.author, 204),
+            ("delete", f"/api/v1/posts/{post}/", None, self.other, 204),
+            ("delete", f"/api/v1/topics/{topic}/", None, self.author, 204),
+        ]
+        for method, path, data, user, expected in steps:
+            with self.subTest(method=method, path=path):
+                response = self.send(method, path, data, user=user)
+                self.assertEqual(response.status_code, expected, response.content)
+                self.assertWithinBudget(response)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_exceeded_budget_raises_only_on_reads(self):
+        with mock.patch.dict(TopicViewSet.query_budgets, {"list": 1, "destroy": 1}):
+            with self.assertLogs("qa.querybudget", "ERROR"), self.assertRaises(QueryBudgetExceeded):
+                self.send("get", "/api/v1/topics/")
+            with self.assertLogs("qa.querybudget", "ERROR"):
+                response = self.send("delete", f"/api/v1/topics/{self.topic.pk}/", user=self.author)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Topic.objects.filter(pk=self.topic.pk).exists())
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_exceeded_budget_only_logs_when_raise_is_off(self):
+        with mock.patch.dict(TopicViewSet.query_budgets, {"list": 1}), \
+                self.assertLogs("qa.querybudget", "WARNING") as logs:
+            response = self.send("get", "/api/v1/topics/")
+        self.assertEqual(response.status_code, 200)
+        stats = response.query_stats
+        self.assertIn(f"TopicViewSet.list: {stats.count} queries > budget 1", logs.output[0])
+        # Операторы запоминаются только сверх бюджета.
+        self.assertEqual(sum(stats.statements.values()), stats.count - 1)
+
+    def test_statements_kept_only_over_budget_and_server_timing(self):
+        response = self.send("get", f"/api/v1/topics/{self.topic.pk}/")
+        stats = response.query_stats
+        self.assertLessEqual(stats.count, response.query_budget)
+        self.assertEqual(stats.statements, Counter())
+        self.assertRegex(response["Server-Timing"],
+                         rf'^db;dur=\d+\.\d;desc="{stats.count} queries", app;dur=\d+\.\d$')
+        with override_settings(QUERY_BUDGET_SERVER_TIMING=False):
+            self.assertNotIn("Server-Timing", self.send("get", "/api/v1/categories/"))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_PATH_RATES={},
+                   PROFILING_SLOW_MS=0, PROFILING_SINK="memory", PROFILING_MAX_FILES=2)
+class ProfilingTests(QaTestCase):
+    url = "/api/v1/categories/"
+
+    def profiles(self):
+        sink = profiling.get_sink()
+        sink.flush()
+        return sink.list()
+
+    def test_sample_rate_gates_requests(self):
+        self.client.get(self.url)
+        self.assertEqual(self.profiles(), [])
+        with override_settings(PROFILING_SAMPLE_RATE=0.5), mock.patch.object(profiling.random, "random") as rnd:
+            rnd.return_value = 0.7
+            self.client.get(self.url)
+            self.assertEqual(self.profiles(), [])
+            rnd.return_value = 0.2
+            response = self.client.get(self.url)
+            self.assertNotIn("X-Profile-Id", response)
+            self.assertEqual([(m["path"], m["reason"], m["status"]) for m in self.profiles()],
+                             [(self.url, "sample", 200)])
+
+    def test_path_rates_and_slow_threshold(self):
+        with override_settings(PROFILING_PATH_RATES={r"^/api/v1/categories/": 1.0}):
+            self.client.get("/api/v1/topics/")
+            self.client.get(self.url)
+            self.assertEqual([m["path"] for m in self.profiles()], [self.url])
+        with override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=60000):
+            self.client.get(self.url)
+            self.assertEqual(self.profiles(), [])
+
+    def test_header_profiles_staff_requests_only(self):
+        self.client.get(self.url, HTTP_X_PROFILE="1",
+                        HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.author)}")
+        self.assertEqual(self.profiles(), [])
+        self.author.is_staff = True
+        self.author.save()
+        with override_settings(PROFILING_SLOW_MS=60000):
+            response = self.client.get(self.url, HTTP_X_PROFILE="1",
+                                       HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.author)}")
+            [meta] = self.profiles()
+            _, data = profiling.get_sink().load(meta["id"])
+        self.assertEqual((response["X-Profile-Id"], meta["reason"]), (meta["id"], "header"))
+        self.assertIn(b"function calls", profiling.render(data, "txt"))
+        for line in profiling.render(data, "collapsed").decode().splitlines():
+            self.assertRegex(line, r"^\S.* \d+$")
+
+    def test_file_sink_rotates_and_rejects_bad_ids(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(PROFILING_SINK="file", PROFILING_DIR=directory, PROFILING_SAMPLE_RATE=1.0):
+            for _ in range(3):
+                self.client.get(self.url)
+            metas = self.profiles()
+            self.assertEqual(len(metas), 2)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             sorted(f"{m['id']}.{ext}" for m in metas for ext in ("json", "prof")))
+            meta, data = profiling.get_sink().load(metas[0]["id"])
+            self.assertEqual(meta, metas[0])
+            self.assertIsInstance(marshal.loads(profiling.render(data, "prof")), dict)
+            self.assertEqual(profiling.get_sink().load("../" + metas[0]["id"]), (None, None))
+
+    def test_memory_sink_and_queue_are_bounded(self):
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            for _ in range(3):
+                self.client.get(self.url)
+            self.assertEqual(len(self.profiles()), 2)
+        with override_settings(PROFILING_QUEUE_SIZE=1):
+            sink = profiling.get_sink()
+            with mock.patch.object(sink, "_start"):
+                self.assertTrue(sink.submit({"id": "a"}, cProfile.Profile()))
+                self.assertFalse(sink.submit({"id": "b"}, cProfile.Profile()))
+            self.assertEqual(sink.dropped, 1)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_DIR="", METRICS_TOKEN="")
+class MetricsTests(QaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(mock.patch.object(metrics.REGISTRY, "_store", metrics.MemoryStore()))
+        self.enterContext(mock.patch.object(metrics.REGISTRY, "_pid", os.getpid()))
+
+    def scrape(self, **headers):
+        response = self.client.get("/metrics", **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_requests_labelled_by_route_method_and_status(self):
+        topic = self.make_topic()
+        self.client.get("/api/v1/categories/")
+        self.client.get("/api/v1/categories/")
+        self.client.get(f"/api/v1/topics/{topic.pk + 1000}/")
+        self.client.get("/no-such-page/")
+        lines = self.scrape()
+        for line in (
+            '# TYPE questudio_http_requests_total counter',
+            'questudio_http_requests_total{view="qa:category-list",method="GET",status="200"} 2',
+            'questudio_http_requests_total{view="qa:topic-detail",method="GET",status="404"} 1',
+            'questudio_http_requests_total{view="unmatched",method="GET",status="404"} 1',
+            '# TYPE questudio_http_request_duration_seconds histogram',
+            'questudio_http_request_duration_seconds_bucket{view="qa:category-list",le="+Inf"} 2',
+            'questudio_http_request_duration_seconds_count{view="qa:category-list"} 2',
+            'questudio_http_queries_count{view="qa:category-list"} 2',
+        ):
+            self.assertIn(line, lines)
+        # Корзины накопительные: значения не убывают до +Inf.
+        buckets = [int(line.rsplit(" ", 1)[1]) for line in lines
+                   if line.startswith('questudio_http_response_size_bytes_bucket{view="qa:category-list"')]
+        self.assertEqual((len(buckets), buckets[-1]), (len(metrics.SIZE_BUCKETS) + 1, 2))
+        self.assertEqual(buckets, sorted(buckets))
+        # Сам /metrics учитывается после отдачи ответа.
+        self.assertIn('questudio_http_requests_total{view="metrics",method="GET",status="200"} 1', self.scrape())
+
+    def test_token_required_when_configured(self):
+        with override_settings(METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.scrape(HTTP_AUTHORIZATION="Bearer s3cret")
+
+    def test_labels_validated_and_escaped(self):
+        requests = metrics.HTTP_REQUESTS
+        with self.assertRaises(ValueError):
+            requests.inc(view="x", method="GET")
+        requests.inc(view='a"b\\c\nd', method="GET", status=200)
+        self.assertIn('questudio_http_requests_total{view="a\\"b\\\\c\\nd",method="GET",status="200"} 1',
+                      metrics.REGISTRY.exposition().splitlines())
+
+    def test_file_store_sums_worker_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS_DIR=directory):
+            metrics.HTTP_REQUESTS.inc(view="qa:tag-list", method="GET", status=200)
+            other = metrics.MmapStore(os.path.join(directory, "1.db"), initial_size=64)
+            for n in range(20):
+                other.inc(metrics.encode_key("questudio_http_requests_total", "",
+                                             [["view", f"qa:view-{n}"], ["method", "GET"], ["status", "200"]]), n)
+            key = metrics.encode_key("questudio_http_requests_total", "",
+                                     [["view", "qa:tag-list"], ["method", "GET"], ["status", "200"]])
+            other.inc(key, 2)
+            # Файл вырос и читается заново с теми же позициями.
+            self.assertEqual(metrics.MmapStore(other.path).positions, other.positions)
+            lines = metrics.REGISTRY.exposition().splitlines()
+        self.assertIn('questudio_http_requests_total{view="qa:tag-list",method="GET",status="200"} 3', lines)
+        self.assertIn('questudio_http_requests_total{view="qa:view-19",method="GET",status="200"} 19', lines)
+
+
+class SparseFieldsetTests(QaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.topic = self.make_topic(body="Тело темы для разреженных полей.")
+        TopicTag.objects.create(topic=self.topic, tag=Tag.objects.create(name="django", slug="django"))
+        self.post = self.make_post(self.topic, author=self.other)
+        Comment.objects.create(topic=self.topic, author=self.other, body="Комментарий к теме")
+
+    def results(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_list_keeps_only_requested_fields(self):
+        [row] = self.results("/api/v1/topics/?fields=id,title,tags")
+        self.assertEqual(row, {"id": self.topic.pk, "title": self.topic.title,
+                               "tags": [{"id": Tag.objects.get().pk, "name": "django", "slug": "django"}]})
+        [row] = self.results(f"/api/v1/posts/?topic={self.topic.pk}&fields=body, id")
+        self.assertEqual(set(row), {"id", "body"})
+
+    def test_unknown_fields_are_ignored(self):
+        [row] = self.results("/api/v1/topics/?fields=id,password,author__password")
+        self.assertEqual(row, {"id": self.topic.pk})
+        self.assertEqual(self.results("/api/v1/topics/?fields=nope"), [{}])
+
+    def test_queryset_follows_requested_fields(self):
+        with CaptureQueriesContext(connection) as narrow:
+            self.results("/api/v1/topics/?fields=id,title")
+        sql = " ".join(q["sql"] for q in narrow)
+        self.assertNotIn('"qa_topic"."body"', sql)
+        self.assertNotIn("auth_user", sql)
+        self.assertNotIn("qa_tag", sql)
+        with CaptureQueriesContext(connection) as wide:
+            self.results("/api/v1/topics/?fields=id,author_name,tags")
+        sql = " ".join(q["sql"] for q in wide)
+        self.assertIn('INNER JOIN "auth_user"', sql)
+        self.assertIn("qa_tag", sql)
+
+    def test_detail_fields_combine_with_expand(self):
+        response = self.client.get(f"/api/v1/topics/{self.topic.pk}/?fields=id,body&expand=comments,unknown")
+        data = response.json()
+        self.assertEqual(set(data), {"id", "body", "comments"})
+        self.assertEqual([c["body"] for c in data["comments"]], ["Комментарий к теме"])
+
+    def test_writes_return_full_representation(self):
+        response = self.client.patch(f"/api/v1/topics/{self.topic.pk}/?fields=id", {"title": "Новое название"},
+                                     content_type="application/json",
+                                     HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.author)}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Новое название")
+        self.assertIn("body", response.json())
+
+
+class ExportTests(QaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author.is_staff = True
+        self.author.save()
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.author)}"}
+        self.topic = self.make_topic("Экспорт «кавычки», запятые")
+        self.posts = [self.make_post(self.topic, author=self.other, body=f"Ответ {i}") for i in range(2)]
+        other = Category.objects.create(name="Другая", slug="other")
+        self.make_post(Topic.objects.create(category=other, author=self.other, title="Чужая тема", slug="foreign",
+                                            body="Тема из другой категории."))
+
+    def export(self, url):
+        response = self.client.get(url, **self.headers)
+        self.assertEqual(response.status_code, 200, response.content if not response.streaming else "")
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_stream(self):
+        response, body = self.export("/api/v1/export/posts/?category=general")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        last = self.posts[-1].pk
+        self.assertEqual(response["X-Export-Max-Id"], str(last))
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="posts_1-{last}.ndjson"')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([(r["id"], r["topic_id"], r["body"]) for r in rows],
+                         [(p.pk, self.topic.pk, p.body) for p in self.posts])
+        self.assertEqual(list(rows[0]), list(export.DATASETS["posts"].columns))
+        _, body = self.export("/api/v1/export/topics/?category=general")
+        self.assertIn("«кавычки»".encode(), body)
+
+    def test_csv_and_gzip_carry_the_same_rows(self):
+        _, plain = self.export("/api/v1/export/topics/?fmt=csv")
+        rows = list(csv.reader(io.StringIO(plain.decode())))
+        self.assertEqual(rows[0], list(export.DATASETS["topics"].columns))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][3], self.topic.title)
+        created = dict(zip(rows[0], rows[1]))["created_at"]
+        self.assertEqual(timezone.datetime.fromisoformat(created), Topic.objects.get(pk=self.topic.pk).created_at)
+
+        response, packed = self.export("/api/v1/export/topics/?fmt=csv&gzip=1")
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith('.csv.gz"'))
+        self.assertEqual(gzip.decompress(packed), plain)
+
+    def test_since_id_resumes_and_max_id_is_fixed(self):
+        response, _ = self.export("/api/v1/export/posts/")
+        max_id = int(response["X-Export-Max-Id"])
+        job = export.Export("posts", since_id=max_id)
+        new = self.make_post(self.topic, body="Новый ответ")
+        self.assertEqual(list(job.rows()), [])
+        response, body = self.export(f"/api/v1/export/posts/?since_id={max_id}")
+        self.assertEqual([json.loads(line)["id"] for line in body.decode().splitlines()], [new.pk])
+        self.assertEqual(response["X-Export-Max-Id"], str(new.pk))
+        response, body = self.export(f"/api/v1/export/posts/?since_id={new.pk}")
+        self.assertEqual((body, response["X-Export-Max-Id"]), (b"", str(new.pk)))
+
+    def test_rejected_requests(self):
+        for url in ("/api/v1/export/users/", "/api/v1/export/posts/?fmt=xml", "/api/v1/export/posts/?since_id=x",
+                    "/api/v1/export/posts/?created_from=not-a-date"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, **self.headers).status_code, 400)
+        other = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.other)}"}
+        self.assertEqual(self.client.get("/api/v1/export/posts/", **other).status_code, 403)
+
+    def test_command_writes_files_and_advances_watermark(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        state = os.path.join(directory, "state.json")
+        args = ("topics", "posts", "--output-dir", directory, "--state", state, "--gzip", "--filter", "category=general")
+        call_command("export_data", *args, stdout=io.StringIO())
+        with open(state, encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh), {"topics": self.topic.pk, "posts": self.posts[-1].pk})
+        with open(os.path.join(directory, f"posts_1-{self.posts[-1].pk}.ndjson.gz"), "rb") as fh:
+            self.assertEqual(len(gzip.decompress(fh.read()).splitlines()), 2)
+        out = io.StringIO()
+        call_command("export_data", *args, stdout=out)
+        self.assertIn(f"posts: нет новых строк (id > {self.posts[-1].pk})", out.getvalue())
+        self.assertFalse([name for name in os.listdir(directory) if name.endswith(".part")])
+
+
+class ConditionalGetTests(QaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.topic = self.make_topic()
+        self.post = self.make_post(self.topic, author=self.other)
+        self.path = f"/api/v1/topics/{self.topic.pk}/"
+        self.posts_path = f"/api/v1/posts/?topic={self.topic.pk}"
+
+    def assertNotModified(self, path, etag, **headers):
+        with self.assertNumQueries(1):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def assertModified(self, path, etag):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response["ETag"]
+
+    def test_not_modified_without_running_the_view(self):
+        response = self.client.get(self.path)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertNotModified(self.path, response["ETag"])
+        self.assertEqual(self.client.get(self.path, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code,
+                         304)
+        self.assertNotModified(self.posts_path, self.client.get(self.posts_path)["ETag"])
+
+    def test_etag_follows_topic_posts_and_votes(self):
+        topic_etag = self.client.get(self.path)["ETag"]
+        posts_etag = self.client.get(self.posts_path)["ETag"]
+
+        self.make_post(self.topic, body="Новый ответ")
+        topic_etag = self.assertModified(self.path, topic_etag)
+        posts_etag = self.assertModified(self.posts_path, posts_etag)
+
+        votes.apply_vote(votes.POST, self.post.pk, self.author.pk, 1)
+        topic_etag = self.assertModified(self.path, topic_etag)
+        posts_etag = self.assertModified(self.posts_path, posts_etag)
+
+        Topic.objects.filter(pk=self.topic.pk).update(title="Изменённый заголовок", updated_at=timezone.now())
+        self.assertModified(self.path, topic_etag)
+        self.assertNotModified(self.posts_path, posts_etag)
+
+    def test_etag_depends_on_user_and_params(self):
+        etag = self.client.get(self.path)["ETag"]
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.author)}"}
+        self.assertEqual(self.client.get(self.path, HTTP_IF_NONE_MATCH=etag, **headers).status_code, 200)
+        self.assertEqual(self.client.get(self.path + "?fields=id,title", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f"/api/v1/topics/{self.topic.pk + 100}/").status_code, 404)
+
+
+class AsyncReadViewsTests(QaTestCase):
+    """Асинхронные представления отвечают байт в байт как синхронные и делят с ними ETag и кэш."""
+
+    paths = ["/api/v1/topics/", "/api/v1/topics/?page=2", "/api/v1/topics/?cursor=",
+             "/api/v1/topics/?fields=id,title,rating", "/api/v1/topics/hot/", "/api/v1/topics/new/",
+             "/api/v1/categories/", "/api/v1/tags/cloud/"]
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tag = Tag.objects.create(name="django", slug="django")
+        for i in range(25):
+            topic = Topic.objects.create(category=cls.category, author=cls.author, title=f"Тема {i}",
+                                         slug=f"async-topic-{i}", body="Текст темы.", rating=i % 4)
+            Post.objects.create(topic=topic, author=cls.other, body="Ответ", rating=1)
+            if i % 3 == 0:
+                TopicTag.objects.create(topic=topic, tag=tag)
+        cls.topic = topic
+
+    def setUp(self):
+        super().setUp()
+        self.fallbacks = []
+
+        def tracking(view):
+            call = sync_to_async(view)
+
+            async def fallback(request, *args, **kwargs):
+                self.fallbacks.append(request.get_full_path())
+                return await call(request, *args, **kwargs)
+
+            return fallback
+
+        with mock.patch.object(async_views, "sync_to_async", tracking):
+            patterns = async_views.urlpatterns(qa_urls.router, qa_urls.tag_cloud) + qa_urls.urlpatterns
+        self.async_urls = types.ModuleType("async_urls")
+        self.async_urls.urlpatterns = [re_path(r"^api/v1/", include((patterns, "qa")))]
+
+    def get_async(self, path, **headers):
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            return self.client.get(path, **headers)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_same_bytes_and_validators(self):
+        # Ответы не сохраняются в кэш: оба пути считают их сами, версии моделей общие.
+        for path in self.paths + [f"/api/v1/topics/{self.topic.pk}/"]:
+            with self.subTest(path=path):
+                expected = self.client.get(path)
+                response = self.get_async(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                for header in ("Content-Type", "ETag", "Last-Modified", "X-Cache"):
+                    self.assertEqual(response.get(header), expected.get(header), header)
+                if response.has_header("ETag"):
+                    self.assertEqual(self.get_async(path, HTTP_IF_NONE_MATCH=expected["ETag"]).status_code, 304)
+        self.assertEqual(self.fallbacks, [])
+
+    def test_shared_cache_entries(self):
+        for path in ("/api/v1/topics/hot/", "/api/v1/topics/new/", "/api/v1/categories/", "/api/v1/tags/cloud/"):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+                self.assertEqual(self.get_async(path)["X-Cache"], "HIT")
+
+    def test_other_requests_fall_back_to_drf(self):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.author)}"}
+        paths = ["/api/v1/topics/?expand=comments", "/api/v1/topics/?ordering=rating",
+                 "/api/v1/topics/?page=99", "/api/v1/topics/?format=api"]
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.get_async(path).status_code, self.client.get(path).status_code)
+        self.assertEqual(self.get_async("/api/v1/topics/hot/", **headers).content,
+                         self.client.get("/api/v1/topics/hot/", **headers).content)
+        self.assertEqual(self.fallbacks, paths + ["/api/v1/topics/hot/"])
+
+
+class FastListSerializationTests(QaTestCase):
+    def test_rows_match_serializers(self):
+        tag = Tag.objects.create(name="django", slug="django")
+        topic = self.make_topic(rating=3)
+        TopicTag.objects.create(topic=topic, tag=tag)
+        post = self.make_post(topic, author=self.other, rating=2)
+        Comment.objects.create(post=post, author=self.author, body="Комментарий")
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.other)}"}
+        paths = ["/api/v1/topics/", "/api/v1/topics/?fields=id,tags,is_editable", "/api/v1/topics/?cursor=",
+                 f"/api/v1/posts/?topic={topic.pk}", "/api/v1/comments/"]
+        for path in paths:
+            for user_headers in ({}, headers):
+                with self.subTest(path=path, authenticated=bool(user_headers)):
+                    with override_settings(FAST_LIST_SERIALIZATION=False):
+                        expected = self.client.get(path, **user_headers).json()
+                    with override_settings(FAST_LIST_SERIALIZATION=True):
+                        self.assertEqual(self.client.get(path, **user_headers).json(), expected)
+
+
+class ExpansionFreshnessTests(QaTestCase):
+    """Данные из ``?expand=`` входят в ETag и в ключ кэша ответа."""
+
+    def setUp(self):
+        super().setUp()
+        self.topic = self.make_topic()
+        self.post = self.make_post(self.topic)
+
+    def test_new_comment_changes_etag_of_expanded_responses_only(self):
+        paths = [f"/api/v1/topics/{self.topic.pk}/", "/api/v1/topics/", f"/api/v1/posts/?topic={self.topic.pk}"]
+        before = {path: self.client.get(path)["ETag"] for path in paths}
+        expanded = {path: self.client.get(f"{path}{'&' if '?' in path else '?'}expand=comments")["ETag"]
+                    for path in paths}
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, topic=self.topic, author=self.other, body="Свежий комментарий")
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path)["ETag"], before[path])
+                expanded_path = f"{path}{'&' if '?' in path else '?'}expand=comments"
+                response = self.client.get(expanded_path, HTTP_IF_NONE_MATCH=expanded[path])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], expanded[path])
+
+    def test_cached_feed_misses_after_comment(self):
+        path = "/api/v1/topics/hot/?expand=comments"
+        self.assertEqual(self.client.get(path)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(path)["X-Cache"], "HIT")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(topic=self.topic, author=self.other, body="Свежий комментарий")
+        response = self.client.get(path)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()["results"][0]["comments"]), 1)
+
+
+class ThreadTests(QaTestCase):
+    def test_is_editable_only_in_thread_posts(self):
+        topic = self.make_topic()
+        post = self.make_post(topic, author=self.other)
+        for user, expected in ((None, False), (self.author, False), (self.other, True)):
+            with self.subTest(user=user):
+                headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"} if user else {}
+                posts = self.client.get(f"/api/v1/topics/{topic.pk}/thread/", **headers).json()["posts"]
+                self.assertEqual(posts["results"][0]["is_editable"], expected)
+        self.assertNotIn("is_editable", self.client.get(f"/api/v1/posts/{post.pk}/").json())
+
+
+class MediaTestCase(QaTestCase):
+    """Файлы тестов — во временном MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.post = self.make_post(self.make_topic())
+
+
+class BlobTests(MediaTestCase):
+    def attach(self, content, name="file.txt"):
+        return blobs.attach(self.post, ContentFile(content, name=name))
+
+    def test_equal_content_shares_blob_until_last_reference(self):
+        first, second = self.attach(b"same bytes", "a.txt"), self.attach(b"same bytes", "b.txt")
+        other = self.attach(b"other bytes")
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        blob = Blob.objects.get(pk=first.blob_id)
+        self.assertEqual((blob.ref_count, blob.size, blob.sha256),
+                         (2, 10, hashlib.sha256(b"same bytes").hexdigest()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(pk=blob.pk).ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+    def test_recount_fixes_drift(self):
+        attachment = self.attach(b"counted bytes")
+        Blob.objects.update(ref_count=5)
+        self.assertEqual(blobs.recount(), 1)
+        self.assertEqual(Blob.objects.get(pk=attachment.blob_id).ref_count, 1)
+
+    def test_download_ranges_and_validators(self):
+        attachment = self.attach(b"0123456789", "digits.txt")
+        path = f"/api/v1/attachments/{attachment.pk}/download/"
+        response = self.client.get(path)
+        self.assertEqual((response.status_code, b"".join(response.streaming_content)), (200, b"0123456789"))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("attachment", response["Content-Disposition"])
+        etag = response["ETag"]
+
+        for header, body, content_range in (("bytes=2-5", b"2345", "bytes 2-5/10"),
+                                            ("bytes=-3", b"789", "bytes 7-9/10"),
+                                            ("bytes=8-", b"89", "bytes 8-9/10")):
+            with self.subTest(range=header):
+                response = self.client.get(path, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), body)
+                self.assertEqual(response["Content-Range"], content_range)
+        self.assertEqual(self.client.get(path, HTTP_RANGE="bytes=10-").status_code, 416)
+        self.assertEqual(self.client.get(path, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(ATTACHMENT_OFFLOAD="accel", ATTACHMENT_ACCEL_PREFIX="/protected-media/")
+    def test_offloaded_download(self):
+        attachment = self.attach(b"<svg></svg>", "picture.svg")
+        response = self.client.get(f"/api/v1/attachments/{attachment.pk}/download/")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/" + attachment.blob.file.name)
+        self.assertEqual(response.content, b"")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+
+@override_settings(UPLOAD_CHUNK_SIZE=4, UPLOAD_USER_QUOTA=16)
+class ChunkedUploadTests(QueryBudgetTestMixin, MediaTestCase):
+    content = b"0123456789"
+
+    def setUp(self):
+        super().setUp()
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.author)}"}
+
+    def create(self, **data):
+        data = {"post": self.post.pk, "name": "digits.txt", "size": len(self.content), **data}
+        response = self.client.post("/api/v1/uploads/", data, content_type="application/json", **self.headers)
+        self.assertWithinBudget(response)
+        return response
+
+    def put(self, session, index, body=None, sha256=None):
+        body = self.content[index * 4:index * 4 + 4] if body is None else body
+        response = self.client.put(f"/api/v1/uploads/{session}/chunks/{index}/", body,
+                                   content_type="application/octet-stream",
+                                   HTTP_X_CHUNK_SHA256=sha256 or hashlib.sha256(body).hexdigest(), **self.headers)
+        self.assertWithinBudget(response)
+        return response
+
+    def complete(self, session):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/v1/uploads/{session}/complete/", **self.headers)
+        self.assertWithinBudget(response)
+        return response
+
+    def test_out_of_order_resumable_upload(self):
+        response = self.create(sha256=hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.status_code, 201)
+        session = response.json()["id"]
+        self.assertEqual((response.json()["chunk_size"], response.json()["chunks_total"]), (4, 3))
+
+        self.assertEqual(self.put(session, 2).status_code, 201)
+        self.assertEqual(self.put(session, 0).status_code, 201)
+        self.assertEqual(self.put(session, 0).status_code, 200)
+        self.assertEqual(self.client.get(f"/api/v1/uploads/{session}/", **self.headers).json()["received"], [0, 2])
+        self.assertEqual(self.complete(session).status_code, 409)
+
+        self.assertEqual(self.put(session, 1).status_code, 201)
+        response = self.complete(session)
+        self.assertEqual(response.status_code, 201)
+        attachment = Attachment.objects.get(pk=response.json()["id"])
+        with default_storage.open(attachment.blob.file.name, "rb") as fh:
+            self.assertEqual(fh.read(), self.content)
+        self.assertEqual(UploadChunk.objects.count(), 0)
+        self.assertEqual(default_storage.listdir("uploads")[1], [])
+
+        again = self.complete(session)
+        self.assertEqual((again.status_code, again.json()["id"]), (200, attachment.pk))
+        self.assertEqual(self.put(session, 0).status_code, 409)
+
+    def test_replaced_chunk_file_deleted_after_commit(self):
+        session = self.create().json()["id"]
+        self.put(session, 0)
+        old = UploadChunk.objects.get().file.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.put(session, 0, body=b"abcd").status_code, 200)
+            self.assertTrue(default_storage.exists(old))
+        chunk = UploadChunk.objects.get()
+        self.assertEqual(chunk.sha256, hashlib.sha256(b"abcd").hexdigest())
+        self.assertNotEqual(chunk.file.name, old)
+        self.assertTrue(default_storage.exists(old))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(default_storage.exists(old))
+        with default_storage.open(chunk.file.name, "rb") as fh:
+            self.assertEqual(fh.read(), b"abcd")
+
+    def test_rejected_chunks_and_sessions(self):
+        session = self.create(sha256="0" * 64).json()["id"]
+        self.assertEqual(self.put(session, 0, sha256="f" * 64).status_code, 400)
+        self.assertEqual(self.put(session, 0, body=b"012").status_code, 400)
+        self.assertEqual(self.put(session, 3, body=b"xx").status_code, 400)
+        for index in range(3):
+            self.put(session, index)
+        self.assertEqual(self.complete(session).status_code, 400)
+
+        self.assertEqual(self.create().status_code, 413)
+        other = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.other)}"}
+        self.assertEqual(self.client.get(f"/api/v1/uploads/{session}/", **other).status_code, 404)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f"/api/v1/uploads/{session}/", **self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertWithinBudget(response)
+        self.assertEqual(default_storage.listdir("uploads")[1], [])
+        self.assertEqual(self.create().status_code, 201)
+
+
+@override_settings(PDF_EXPORT_CHUNK_SIZE=2)
+class PdfExportTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        for n in range(2):
+            self.make_topic(f"Тема для выгрузки {n}")
+        self.progress = []
+        write_pdf = pdfexport.write_pdf
+
+        def spy(stream, rows, progress=None, every=None):
+            return write_pdf(stream, rows, lambda done: (self.progress.append(done), progress(done)), every)
+
+        self.enterContext(mock.patch.object(pdfexport, "write_pdf", spy))
+
+    def make_job(self, status=PdfExport.Status.PENDING):
+        ids = list(Topic.objects.order_by("pk").values_list("pk", flat=True))
+        return PdfExport.objects.create(topic_ids=ids, total=len(ids), status=status)
+
+    def test_submit_queues_job_after_commit(self):
+        executor = mock.Mock()
+        self.enterContext(mock.patch.object(pdfexport, "executor", return_value=executor))
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = pdfexport.submit(Topic.objects.all(), self.author)
+            executor.submit.assert_not_called()
+        self.assertEqual((job.status, job.total, job.created_by), (PdfExport.Status.PENDING, 3, self.author))
+        for callback in callbacks:
+            callback()
+        executor.submit.assert_called_once_with(pdfexport.run_in_thread, job.pk)
+
+    def test_run_claims_job_and_reports_progress(self):
+        job = self.make_job()
+        self.assertTrue(pdfexport.run(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.progress), (PdfExport.Status.DONE, 3, 100))
+        self.assertEqual(self.progress, [2, 3])
+        self.assertIsNotNone(job.finished_at)
+        with job.file.open("rb") as fh:
+            self.assertEqual(fh.read(5), b"%PDF-")
+        # Уже взятая задача повторно не выполняется.
+        self.assertFalse(pdfexport.run(job.pk))
+        self.assertFalse(pdfexport.run(self.make_job(PdfExport.Status.RUNNING).pk))
+        self.assertEqual(self.progress, [2, 3])
+
+    def test_failure_marks_job_failed(self):
+        job = self.make_job()
+        with mock.patch.object(pdfexport, "rows_for_ids", side_effect=RuntimeError("нет шрифта")), \
+                self.assertRaises(RuntimeError):
+            pdfexport.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.file.name), (PdfExport.Status.FAILED, "нет шрифта", ""))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_command_requeues_running_jobs_only_on_request(self):
+        pending, stuck = self.make_job(), self.make_job(PdfExport.Status.RUNNING)
+        done = self.make_job(PdfExport.Status.DONE)
+        out = io.StringIO()
+        call_command("run_pdf_exports", stdout=out)
+        statuses = dict(PdfExport.objects.values_list("pk", "status"))
+        self.assertEqual([statuses[job.pk] for job in (pending, stuck, done)],
+                         [PdfExport.Status.DONE, PdfExport.Status.RUNNING, PdfExport.Status.DONE])
+        self.assertIn(f"#{pending.pk}: 3 тем", out.getvalue())
+
+        out = io.StringIO()
+        call_command("run_pdf_exports", "--requeue-running", stdout=out)
+        stuck.refresh_from_db()
+        self.assertEqual((stuck.status, stuck.processed), (PdfExport.Status.DONE, 3))
+        self.assertIn("Возвращено в очередь: 1", out.getvalue())
+        self.assertNotIn(f"#{done.pk}:", out.getvalue())
+
+
+class ScaleSeederTests(MediaTestCase):
+    def seed(self, prefix, **opts):
+        call_command("seed_demo", scale=0.001, prefix=prefix, batch_size=100, stdout=io.StringIO(), **opts)
+        return Topic.objects.filter(slug__startswith=f"{prefix}-").order_by("pk")
+
+    def test_default_seed_is_reproducible(self):
+        first = list(self.seed("one").values_list("title", "rating", "posts_count"))
+        second = list(self.seed("two").values_list("title", "rating", "posts_count"))
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first, second)
+        self.assertNotEqual(list(self.seed("three", seed=7).values_list("title", flat=True)),
+                            [title for title, _, _ in first])
+
+    def test_counters_and_ratings_match_rows(self):
+        topics = self.seed("load")
+        self.assertEqual(get_user_model().objects.filter(username__startswith="load_").count(), 10)
+        for topic in topics:
+            posts = Post.objects.filter(topic=topic)
+            self.assertEqual(topic.posts_count, posts.count())
+            self.assertEqual(topic.rating, sum(TopicVote.objects.filter(topic=topic).values_list("value", flat=True)))
+            self.assertEqual(topic.hot_score, topic.compute_hot_score())
+        for post in Post.objects.filter(topic__in=topics):
+            self.assertEqual(post.rating, sum(PostVote.objects.filter(post=post).values_list("value", flat=True)))
+        with self.assertRaises(CommandError):
+            self.seed("load")
+
+    def test_search_index_keeps_existing_documents(self):
+        if search.get_backend() is None:
+            self.skipTest("нет поискового индекса")
+        existing = self.make_topic("Существующая тема про асинхронность")
+        with mock.patch.object(search, "rebuild", side_effect=AssertionError("полная пересборка индекса")):
+            topics = self.seed("load")
+        self.assertEqual([r["id"] for r in search.search("асинхронность", kind=search.TOPIC)], [existing.pk])
+        found = {r["id"] for r in search.search("тема", kind=search.TOPIC, limit=100)}
+        self.assertTrue(set(topics.values_list("pk", flat=True)) <= found)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Данные миграции на исторических моделях: ``migrate(before)``, данные, ``migrate(after)``."""
+
+    before = after = None
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        search.reset()
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        search.reset()
+        return executor.loader.project_state(targets).apps
+
+    def make_post(self, apps, title="Тема", body="Ответ"):
+        author = apps.get_model("auth", "User").objects.create(username="author")
+        category = apps.get_model("qa", "Category").objects.create(name="Общее", slug="general")
+        topic = apps.get_model("qa", "Topic").objects.create(category=category, author=author, title=title,
+                                                             slug="topic", body="Текст темы.")
+        return apps.get_model("qa", "Post").objects.create(topic=topic, author=author, body=body)
+
+
+class SearchIndexMigrationTests(MigrationTestCase):
+    before = [("qa", "0004_topic_hot_score")]
+    after = [("qa", "0005_search_index")]
+
+    def test_index_filled_from_existing_rows(self):
+        apps = self.migrate(self.before)
+        post = self.make_post(apps, title="Миграция индекса", body="Существующий ответ")
+        self.migrate(self.after)
+        self.assertEqual([(hit["kind"], hit["id"]) for hit in search.search("миграция")], [("topic", post.topic_id)])
+        self.assertEqual([(hit["kind"], hit["id"]) for hit in search.search("существующий")], [("post", post.pk)])
+
+
+class ContentAddressedMigrationTests(MigrationTestCase):
+    """0007 раскладывает файлы вложений по blob-ам на исторических моделях."""
+
+    before = [("qa", "0006_pdf_export")]
+    after = [("qa", "0007_content_addressed_attachments")]
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def test_equal_files_share_blob(self):
+        apps = self.migrate(self.before)
+        post = self.make_post(apps)
+        Attachment = apps.get_model("qa", "Attachment")
+        names = [default_storage.save(f"attachments/{name}", ContentFile(b"same content"))
+                 for name in ("a.txt", "b.txt")]
+        for name in names + ["attachments/missing.txt"]:
+            Attachment.objects.create(post=post, file=name)
+
+        apps = self.migrate(self.after)
+        sha256 = hashlib.sha256(b"same content").hexdigest()
+        blob = apps.get_model("qa", "Blob").objects.get()
+        self.assertEqual((blob.sha256, blob.size, blob.ref_count), (sha256, 12, 2))
+        self.assertEqual(blob.file.name, f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}")
+        with default_storage.open(blob.file.name, "rb") as fh:
+            self.assertEqual(fh.read(), b"same content")
+        attachments = apps.get_model("qa", "Attachment").objects.order_by("pk")
+        self.assertEqual([(a.name, a.blob_id) for a in attachments],
+                         [("a.txt", blob.pk), ("b.txt", blob.pk), ("", None)])
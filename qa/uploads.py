@@ -0,0 +1,210 @@
+"""
+Загрузка вложений по частям с возобновлением.
+
+Клиент создаёт сессию (пост, имя, размер и, по желанию, SHA-256 всего файла) и
+получает размер части. Каждая часть отправляется ``PUT``-ом с телом как есть и
+заголовком ``X-Chunk-SHA256``: тело читается из потока запроса блоками по
+``BLOCK_SIZE`` и сразу пишется во временный файл, так что память на запрос не
+зависит ни от размера части, ни от размера файла. Части независимы — их можно
+слать параллельно и повторять; список принятых частей в ``GET`` сессии
+показывает, с чего продолжить после обрыва.
+
+Завершение склеивает части тем же потоковым путём в blob (qa.blobs) и создаёт
+``Attachment``. Сессии без новых частей дольше ``UPLOAD_SESSION_TTL_HOURS`` и
+файлы частей без строк в базе удаляет команда ``clean_uploads``.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import blobs
+from .models import Attachment, UploadChunk, UploadSession
+
+PREFIX = "uploads"
+BLOCK_SIZE = 64 * 1024
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(ValueError):
+    """Запрос к сессии загрузки отклонён; ``detail`` — текст, ``status`` — HTTP-код ответа."""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def chunk_size():
+    return int(getattr(settings, "UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+
+def max_size():
+    return int(getattr(settings, "UPLOAD_MAX_SIZE", 1024 * 1024 * 1024))
+
+
+def user_quota():
+    return int(getattr(settings, "UPLOAD_USER_QUOTA", 2 * 1024 * 1024 * 1024))
+
+
+def ttl():
+    return timedelta(hours=int(getattr(settings, "UPLOAD_SESSION_TTL_HOURS", 24)))
+
+
+def chunk_name(session, index):
+    return f"{PREFIX}/{session.pk}.{index:05d}"
+
+
+def open_bytes(user):
+    """Сколько байт заявлено в незавершённых загрузках пользователя."""
+    return (UploadSession.objects.filter(created_by=user, status=UploadSession.Status.OPEN)
+            .aggregate(total=Sum("size"))["total"] or 0)
+
+
+def create(user, post, name, size, sha256=""):
+    if size > max_size():
+        raise UploadError(f"Файл больше допустимых {max_size()} байт.", status=413)
+    with transaction.atomic():
+        # Блокировка строки пользователя: параллельные сессии не обойдут квоту.
+        get_user_model().objects.select_for_update().filter(pk=user.pk).exists()
+        if open_bytes(user) + size > user_quota():
+            raise UploadError(f"Превышена квота незавершённых загрузок ({user_quota()} байт).", status=413)
+        return UploadSession.objects.create(
+            created_by=user, post=post, name=name, size=size, sha256=sha256,
+            chunk_size=chunk_size(), expires_at=timezone.now() + ttl())
+
+
+def received(session):
+    return list(session.chunks.order_by("index").values_list("index", flat=True))
+
+
+def read_body(stream, length):
+    """Тело запроса блоками, ровно ``length`` байт."""
+    remaining = length
+    while remaining:
+        block = stream.read(min(BLOCK_SIZE, remaining))
+        if not block:
+            raise UploadError("Тело запроса короче заявленного Content-Length.")
+        remaining -= len(block)
+        yield block
+
+
+def put_chunk(session, index, stream, length, sha256):
+    """
+    Принимает часть ``index``; возвращает (часть, создана ли). Повтор той же
+    части ничего не меняет, часть с другим содержимым заменяет прежнюю.
+    """
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError("Загрузка уже завершена.", status=409)
+    if index >= session.chunks_total:
+        raise UploadError(f"Номер части должен быть меньше {session.chunks_total}.")
+    expected = session.expected_chunk_size(index)
+    if length != expected:
+        raise UploadError(f"Часть {index} должна быть ровно {expected} байт, получено {length}.")
+    sha256 = (sha256 or "").strip().lower()
+    if not SHA256_RE.match(sha256):
+        raise UploadError("Нужен заголовок X-Chunk-SHA256 с SHA-256 части (64 hex-символа).")
+
+    path, digest, size = blobs.spool(read_body(stream, length))
+    try:
+        if digest != sha256:
+            raise UploadError("SHA-256 части не совпадает с X-Chunk-SHA256.")
+        existing = session.chunks.filter(index=index).first()
+        if existing is not None and existing.sha256 == digest:
+            touch(session)
+            return existing, False
+        with open(path, "rb") as fh:
+            name = default_storage.save(chunk_name(session, index), blobs.TemporaryFile(fh))
+    finally:
+        blobs.discard_temporary(path)
+
+    try:
+        if existing is None:
+            with transaction.atomic():
+                chunk = UploadChunk.objects.create(session=session, index=index, size=size, sha256=digest, file=name)
+        else:
+            with transaction.atomic():
+                # Условие на прежний файл: параллельная замена или удаление части не теряет файлы.
+                if not UploadChunk.objects.filter(pk=existing.pk, file=existing.file.name).update(
+                        size=size, sha256=digest, file=name):
+                    raise UploadError(f"Часть {index} уже принимается другим запросом, повторите позже.",
+                                      status=409)
+                # Прежний файл — после коммита, как в discard_chunks: при откате строка указывает на него.
+                old = existing.file.name
+                transaction.on_commit(lambda: default_storage.delete(old))
+            chunk = existing
+            chunk.size, chunk.sha256, chunk.file = size, digest, name
+    except IntegrityError:
+        # Ту же часть только что принял параллельный запрос.
+        default_storage.delete(name)
+        raise UploadError(f"Часть {index} уже принимается другим запросом, повторите позже.", status=409)
+    except Exception:
+        default_storage.delete(name)
+        raise
+    touch(session)
+    return chunk, existing is None
+
+
+def touch(session):
+    UploadSession.objects.filter(pk=session.pk).update(expires_at=timezone.now() + ttl())
+
+
+def concatenated(names):
+    for name in names:
+        with default_storage.open(name, "rb") as fh:
+            while block := fh.read(BLOCK_SIZE):
+                yield block
+
+
+def complete(session_id):
+    """
+    Склеивает части во вложение; возвращает (вложение, создано ли). Повторный
+    вызов для завершённой сессии возвращает то же вложение.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related("post").get(pk=session_id)
+        if session.status == UploadSession.Status.COMPLETE:
+            if session.attachment_id is None:
+                raise UploadError("Вложение этой загрузки уже удалено.", status=410)
+            return session.attachment, False
+
+        chunks = list(session.chunks.order_by("index").values_list("index", "file"))
+        missing = sorted(set(range(session.chunks_total)) - {index for index, _ in chunks})
+        if missing:
+            shown = ", ".join(map(str, missing[:20])) + (", ..." if len(missing) > 20 else "")
+            raise UploadError(f"Не получены части: {shown}.", status=409)
+        try:
+            blob = blobs.store(concatenated(name for _, name in chunks), expected_sha256=session.sha256 or None)
+        except blobs.ChecksumMismatch:
+            raise UploadError("SHA-256 собранного файла не совпадает с заявленным при создании загрузки.")
+        attachment = Attachment.objects.create(post=session.post, blob=blob, name=session.name)
+        session.status = UploadSession.Status.COMPLETE
+        session.attachment = attachment
+        session.save(update_fields=["status", "attachment"])
+        discard_chunks(session)
+    return attachment, True
+
+
+def discard_chunks(session):
+    """Удаляет части сессии; файлы — после коммита."""
+    names = list(session.chunks.values_list("file", flat=True))
+    session.chunks.all().delete()
+    transaction.on_commit(lambda: delete_files(names))
+
+
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
+
+
+def discard(session):
+    """Удаляет сессию вместе с частями; файлы — после коммита."""
+    with transaction.atomic():
+        names = list(session.chunks.values_list("file", flat=True))
+        session.delete()
+        transaction.on_commit(lambda: delete_files(names))
@@ -1,7 +1,9 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
+from . import async_views
 from .views import CategoryViewSet, TagViewSet, TopicViewSet, PostViewSet, CommentViewSet
-from .views import TagCloudAPIView
+from .views import TagCloudAPIView, SearchAPIView, ExportAPIView, attachment_download
+from .views import UploadSessionListAPIView, UploadSessionAPIView, UploadChunkAPIView, UploadCompleteAPIView
 
 app_name = "qa"
 
@@ -12,7 +14,20 @@ router.register(r"topics", TopicViewSet, basename="topic")
 router.register(r"posts", PostViewSet, basename="post")
 router.register(r"comments", CommentViewSet, basename="comment")
 
+tag_cloud = TagCloudAPIView.as_view()
+
 urlpatterns = [
-    path("tags/cloud/", TagCloudAPIView.as_view(), name="tag-cloud"),
+    path("tags/cloud/", tag_cloud, name="tag-cloud"),
+    path("search/", SearchAPIView.as_view(), name="search"),
+    path("export/<str:dataset>/", ExportAPIView.as_view(), name="export"),
+    path("attachments/<int:pk>/download/", attachment_download, name="attachment-download"),
+    path("uploads/", UploadSessionListAPIView.as_view(), name="upload-list"),
+    path("uploads/<uuid:pk>/", UploadSessionAPIView.as_view(), name="upload-detail"),
+    path("uploads/<uuid:pk>/chunks/<int:index>/", UploadChunkAPIView.as_view(), name="upload-chunk"),
+    path("uploads/<uuid:pk>/complete/", UploadCompleteAPIView.as_view(), name="upload-complete"),
     path("", include(router.urls)),
 ]
+
+if async_views.is_enabled():
+    # Горячие GET-эндпоинты — асинхронные представления на тех же URL (qa.async_views).
+    urlpatterns = async_views.urlpatterns(router, tag_cloud) + urlpatterns
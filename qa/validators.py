@@ -1,9 +1,15 @@
 from django.core.exceptions import ValidationError
 
-BANNED_WORDS = {"spam", "fake", "scam", "дурь", "запрещенка"}
+from .banned_words import find_banned_words, find_banned_words_many
+
 
 def validate_no_banned_words(value: str):
-    low = (value or "").lower()
-    for w in BANNED_WORDS:
-        if w in low:
-            raise ValidationError("Текст содержит запрещенные слова.")
+    found = find_banned_words(value)
+    if found:
+        raise ValidationError("Текст содержит запрещенные слова: %(words)s.",
+                              code="banned_words", params={"words": ", ".join(found)})
+
+
+def validate_many_no_banned_words(values):
+    """Пакетная проверка; возвращает {индекс: [совпавшие термины]} только для текстов с нарушениями."""
+    return {i: found for i, found in enumerate(find_banned_words_many(values)) if found}
@@ -1,19 +1,160 @@
-from django.db.models import Count, Avg, Max, F
+from django.db import transaction
+from django.db.models import BigIntegerField, Count, ExpressionWrapper, F, Max, Prefetch, Sum
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 from rest_framework.permissions import SAFE_METHODS
-from .models import Category, Tag, Topic, Post, Comment, TopicVote, PostVote
+from .models import Category, Tag, Topic, TopicTag, Post, Comment, Attachment, TopicVote, PostVote, UploadSession
 from .serializers import (
     CategorySerializer, TagSerializer,
     TopicListSerializer, TopicDetailSerializer,
     PostSerializer, CommentSerializer,
+    ThreadTopicSerializer, ThreadPostSerializer,
+    TopicListRows, PostRows, CommentRows,
+    AttachmentSerializer, UploadSessionSerializer,
 )
 from .permissions import IsAuthorOrAdmin
+from . import blobs, caching, export, ratings, search, uploads, votes
+from .caching import cache_response
+from .conditional import conditional, latest
 from .filters import TopicFilter
+from .pagination import FeedPagination
+from .rows import RowListMixin
+from .sparse import expansion_models
 from rest_framework.views import APIView
 from django.db.models import Count
+from django.views.decorators.http import require_safe
+
+
+# Имена авторов в лентах: версия меняется только при смене username (qa.apps, caching.track_fields).
+AUTHOR_NAMES_LABEL = "auth.user.username"
+# Модели, от которых зависят ленты тем (hot/new).
+TOPIC_FEED_MODELS = (Topic, Post, TopicVote, PostVote, Category, Tag, TopicTag, AUTHOR_NAMES_LABEL)
+
+
+# Модели, изменения которых видны в темах, но не двигают их updated_at/last_activity.
+TOPIC_RELATED_MODELS = (TopicVote, PostVote, Post, Category, Tag, TopicTag)
+TAXONOMY_LABELS = ["qa.category", "qa.tag", "qa.topictag"]
+# Колонки темы, из которых складывается её отпечаток (topic_state).
+TOPIC_STATE_COLUMNS = ("updated_at", "rating", "posts_count", "post_rating_sum", "last_activity")
+
+
+def rating_checksum():
+    # Сумма rating * id меняется при переносе голоса между объектами, в отличие от суммы rating.
+    return Sum(ExpressionWrapper(F("rating") * F("id"), output_field=BigIntegerField()))
+
+
+def related_state(models):
+    labels = sorted(caching.label_of(model) for model in models)
+    versions = caching.versions(labels) if ratings.is_enabled() else []
+    return versions, caching.changed_at(labels)
+
+
+def with_expansions(state, view, request):
+    """
+    Добавляет к отпечатку версии моделей из ``?expand=`` (комментарии, вложения):
+    их изменения не видны ни в колонках темы, ни в агрегатах сообщений.
+    """
+    labels = sorted({caching.label_of(model) for model in expansion_models(view, request)})
+    if state is None or not labels:
+        return state
+    parts, last_modified = state
+    return [parts, caching.versions(labels)], latest(last_modified, caching.changed_at(labels))
+
+
+def topic_state(view, request, pk=None, **kwargs):
+    """Отпечаток одной темы: одна выборка по первичному ключу."""
+    if not str(pk).isdigit():
+        return None
+    row = Topic.objects.filter(pk=pk).values_list(*TOPIC_STATE_COLUMNS).first()
+    if row is None:
+        return None
+    state = topic_state_of(int(pk), row, caching.versions(TAXONOMY_LABELS), related_state(TOPIC_RELATED_MODELS))
+    return with_expansions(state, view, request)
+
+
+def topic_state_of(pk, row, taxonomy, related):
+    # Общая часть topic_state и его асинхронного варианта (qa.async_views).
+    updated_at, rating, posts_count, post_rating_sum, last_activity = row
+    rating = ratings.merged_rating(ratings.TOPIC, pk, rating)
+    versions, changed = related
+    state = [pk, updated_at, rating, posts_count, post_rating_sum, last_activity, taxonomy, versions]
+    return state, latest(updated_at, last_activity, changed)
+
+
+def topic_list_aggregates(queryset):
+    """Выборка и агрегаты отпечатка списка тем (исполняет вызывающий: aggregate или aaggregate)."""
+    if not queryset.query.is_sliced:
+        queryset = queryset.order_by()
+    return queryset, dict(
+        n=Count("id"), updated=Max("updated_at"), activity=Max("last_activity"),
+        rating=rating_checksum(), posts=Sum("posts_count"), post_rating=Sum("post_rating_sum"))
+
+
+def topic_list_state(queryset):
+    queryset, aggregates = topic_list_aggregates(queryset)
+    agg = queryset.aggregate(**aggregates)
+    return topic_list_state_of(agg, caching.versions(TAXONOMY_LABELS), related_state(TOPIC_RELATED_MODELS))
+
+
+def topic_list_state_of(agg, taxonomy, related):
+    versions, changed = related
+    state = [sorted(agg.items()), taxonomy, versions]
+    return state, latest(agg["updated"], agg["activity"], changed)
+
+
+def topics_state(view, request, *args, **kwargs):
+    return with_expansions(topic_list_state(view.filter_queryset(Topic.objects.all())), view, request)
+
+
+def hot_topics_state(view, request, *args, **kwargs):
+    return with_expansions(topic_list_state(Topic.objects.hot()), view, request)
+
+
+def new_topics_state(view, request, *args, **kwargs):
+    return with_expansions(topic_list_state(Topic.objects.all()), view, request)
+
+
+def posts_state(view, request, *args, **kwargs):
+    """
+    Отпечаток сообщений темы (?topic=): агрегат по индексу (topic, ...).
+    Берутся все сообщения темы — остальные фильтры лишь сужают выборку.
+    """
+    topic = request.query_params.get("topic", "")
+    if not topic.isdigit():
+        return None
+    agg = Post.objects.filter(topic_id=int(topic)).aggregate(
+        n=Count("id"), updated=Max("updated_at"), rating=rating_checksum())
+    versions, changed = related_state((PostVote, Post))
+    return with_expansions(([sorted(agg.items()), versions], latest(agg["updated"], changed)), view, request)
+
+
+def vote_response(kind, pk, request):
+    if not str(pk).isdigit():
+        raise Http404
+    try:
+        value = int(request.data.get("value", 0))
+    except (TypeError, ValueError):
+        return Response({"detail": "value должен быть -1 или 1."}, status=400)
+    try:
+        result = votes.apply_vote(kind, int(pk), request.user.id, value)
+    except votes.VoteRejected as exc:
+        return Response({"detail": str(exc)}, status=400)
+    return Response({"rating": result.rating, "status": result.status})
+
+
+class ThreadPagination(FeedPagination):
+    cursor_only = True
+    page_size = 20
+
+
+def limited_comments(limit):
+    # На один больше лимита — признак has_more_comments без COUNT.
+    return Comment.objects.select_related("author").order_by("created_at", "id")[:limit + 1]
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -21,6 +162,11 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = "slug"
+    query_budgets = {"list": 3, "retrieve": 2}
+
+    @cache_response(Category)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
@@ -33,6 +179,11 @@ class TagViewSet(viewsets.ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = "slug"
+    query_budgets = {"list": 3, "retrieve": 2}
+
+    @cache_response(Tag)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
 
     def get_permissions(self):
         if self.request.method in SAFE_METHODS:
@@ -40,158 +191,343 @@ class TagViewSet(viewsets.ModelViewSet):
         return [permissions.IsAdminUser()]
 
 
-class TopicViewSet(viewsets.ModelViewSet):
+class TopicViewSet(RowListMixin, viewsets.ModelViewSet):
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly, IsAuthorOrAdmin]
+    pagination_class = FeedPagination
     filterset_class = TopicFilter
+    search_kind = search.TOPIC
+    search_indexed_fields = ("title", "body", "tags__name")
     search_fields = ("title", "body", "category__name",
                      "tags__name", "author__username")
     ordering_fields = ("created_at", "updated_at", "rating",
                        "posts_count", "last_activity")
     ordering = ("-created_at",)
+    # Бюджеты с учётом запроса пользователя при аутентификации; каждое ?expand= — ещё один запрос.
+    # Запись обновляет счётчики, hot_score, репутацию и поисковый индекс; удаление — с каскадом
+    # по тегам, голосам, сообщениям и комментариям (не зависит от их числа).
+    query_budgets = {"list": 6, "retrieve": 5, "hot": 5, "new": 6, "thread": 9,
+                     "create": 12, "update": 11, "partial_update": 11, "destroy": 23, "vote": 18}
+    thread_orderings = ("created_at", "-created_at", "-rating")
+    thread_comments_limit = 10
+    thread_attachments_limit = 20
+    row_serializer_class = TopicListRows
 
     def get_queryset(self):
-        qs = (Topic.objects
-              .select_related("category", "author")
-              .prefetch_related("tags")
-              )
-        qs = qs.annotate(
-            posts_count=Count("posts", distinct=True),
-            avg_post_rating=Avg("posts__rating"),
-            last_activity=Max("posts__created_at"),
-        )
-        return qs
+        # Связи, подгрузки и колонки — только для полей из ?fields= и расширений из ?expand=.
+        return self.get_serializer_class().optimize_queryset(
+            Topic.objects.all(), self.request, keep=self.ordering_fields)
 
     def get_serializer_class(self):
         if self.action in ("list",):
             return TopicListSerializer
         return TopicDetailSerializer
 
+    @conditional(topics_state)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional(topic_state)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def vote(self, request, pk=None):
-        topic = self.get_object()
-        if topic.author_id == request.user.id:
-            return Response({"detail": "Нельзя голосовать за свою тему."}, status=400)
-        value = int(request.data.get("value", 0))
-        if value not in (-1, 1):
-            return Response({"detail": "value должен быть -1 или 1."}, status=400)
-
-        vote, created = TopicVote.objects.get_or_create(
-            topic=topic, user=request.user, defaults={"value": value})
-        if not created:
-            if vote.value == value:
-                vote.delete()
-                topic.rating = F("rating") - value
-                topic.save(update_fields=["rating"])
-                topic.refresh_from_db(fields=["rating"])
-                return Response({"rating": topic.rating, "status": "unvoted"})
-            else:
-                vote.value = value
-                vote.save(update_fields=["value"])
-                topic.rating = F("rating") + (2 * value)
-                topic.save(update_fields=["rating"])
-                topic.refresh_from_db(fields=["rating"])
-                return Response({"rating": topic.rating, "status": "switched"})
-        else:
-            topic.rating = F("rating") + value
-            topic.save(update_fields=["rating"])
-            topic.refresh_from_db(fields=["rating"])
-            return Response({"rating": topic.rating, "status": "voted"})
+        return vote_response(votes.TOPIC, pk, request)
+
+    @action(detail=True, methods=["get"], permission_classes=[permissions.AllowAny],
+            pagination_class=ThreadPagination)
+    def thread(self, request, pk=None):
+        """
+        Тема целиком за фиксированное число запросов: тема с тегами и
+        комментариями, keyset-страница сообщений (``?cursor=``,
+        ``?ordering=created_at|-created_at|-rating``) с комментариями,
+        вложениями и собственными голосами пользователя.
+        """
+        ordering = request.query_params.get("ordering", "created_at")
+        if ordering not in self.thread_orderings:
+            return Response({"detail": "ordering должен быть одним из: " + ", ".join(self.thread_orderings)},
+                            status=400)
+        limit = self.thread_comments_limit
+        topic = get_object_or_404(
+            ThreadTopicSerializer.optimize_queryset(Topic.objects.all(), request).prefetch_related(
+                Prefetch("comments", queryset=limited_comments(limit), to_attr="thread_comments")),
+            pk=pk)
+        self.check_object_permissions(request, topic)
 
-    @action(detail=False, methods=["get"], url_path="hot", permission_classes=[permissions.AllowAny])
+        posts = (Post.objects
+                 .filter(topic=topic)
+                 .select_related("author")
+                 .prefetch_related(
+                     Prefetch("comments", queryset=limited_comments(limit), to_attr="thread_comments"),
+                     Prefetch("attachments",
+                              queryset=Attachment.objects.order_by("uploaded_at", "id")[:self.thread_attachments_limit],
+                              to_attr="thread_attachments"))
+                 .order_by(ordering))
+        page = self.paginate_queryset(posts)
+
+        user = request.user
+        topic_vote, post_votes = None, {}
+        if user.is_authenticated:
+            topic_vote = (TopicVote.objects.filter(topic=topic, user=user)
+                          .values_list("value", flat=True).first())
+            if page:
+                post_votes = dict(PostVote.objects
+                                  .filter(user=user, post_id__in=[post.pk for post in page])
+                                  .values_list("post_id", "value"))
+
+        context = {**self.get_serializer_context(), "comments_limit": limit,
+                   "topic_vote": topic_vote, "post_votes": post_votes}
+        return Response({
+            "me": {"id": user.pk, "username": user.username, "is_staff": user.is_staff}
+            if user.is_authenticated else None,
+            "topic": ThreadTopicSerializer(topic, context=context).data,
+            "posts": self.paginator.get_cursor_page(ThreadPostSerializer(page, many=True, context=context).data),
+        })
+
+    @action(detail=False, methods=["get"], url_path="hot", permission_classes=[permissions.AllowAny],
+            pagination_class=PageNumberPagination)
+    @conditional(hot_topics_state)
+    @cache_response(*TOPIC_FEED_MODELS)
     def hot(self, request):
-        qs = (Topic.objects.hot()
-              .select_related("category", "author")
-              .prefetch_related("tags"))
-        page = self.paginate_queryset(qs)
-        ser = TopicListSerializer(page or qs, many=True, context={"request": request})
-        return self.get_paginated_response(ser.data) if page is not None else Response(ser.data)
+        qs = TopicListSerializer.optimize_queryset(Topic.objects.hot(), request, keep=("hot_score",))
+        return self.list_response(qs, TopicListSerializer, keep=())
 
     @action(detail=False, methods=["get"], url_path="new", permission_classes=[permissions.AllowAny])
+    @conditional(new_topics_state)
+    @cache_response(*TOPIC_FEED_MODELS)
     def new(self, request):
         qs = (self.get_queryset().order_by("-created_at"))
-        page = self.paginate_queryset(qs)
-        ser = TopicListSerializer(page or qs, many=True, context={"request": request})
-        return self.get_paginated_response(ser.data) if page is not None else Response(ser.data)
+        return self.list_response(qs, TopicListSerializer)
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(RowListMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
+    row_serializer_class = PostRows
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly, IsAuthorOrAdmin]
+    pagination_class = FeedPagination
     filterset_fields = ("topic", "author")
+    search_kind = search.POST
+    search_indexed_fields = ("body",)
     search_fields = ("body", "author__username", "topic__title")
     ordering_fields = ("created_at", "rating")
+    # +2 на ?expand=comments,attachments.
+    query_budgets = {"list": 7, "retrieve": 5,
+                     "create": 14, "update": 8, "partial_update": 8, "destroy": 19, "vote": 19}
 
     def get_queryset(self):
-        return (Post.objects
-                .select_related("topic", "author")
-                .prefetch_related("comments"))
+        return self.get_serializer_class().optimize_queryset(
+            Post.objects.all(), self.request, keep=("topic",) + self.ordering_fields)
 
+    @conditional(posts_state)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
     @action(detail=True, methods=["post"], permission_classes=[permissions.IsAuthenticated])
     def vote(self, request, pk=None):
-        post = self.get_object()
-        if post.author_id == request.user.id:
-            return Response({"detail": "Нельзя голосовать за своё сообщение."}, status=400)
-        value = int(request.data.get("value", 0))
-        if value not in (-1, 1):
-            return Response({"detail": "value должен быть -1 или 1."}, status=400)
-
-        vote, created = PostVote.objects.get_or_create(
-            post=post, user=request.user, defaults={"value": value})
-        if not created:
-            if vote.value == value:
-                vote.delete()
-                post.rating = F("rating") - value
-                post.save(update_fields=["rating"])
-                post.refresh_from_db(fields=["rating"])
-                return Response({"rating": post.rating, "status": "unvoted"})
-            else:
-                vote.value = value
-                vote.save(update_fields=["value"])
-                post.rating = F("rating") + (2 * value)
-                post.save(update_fields=["rating"])
-                post.refresh_from_db(fields=["rating"])
-                return Response({"rating": post.rating, "status": "switched"})
-        else:
-            post.rating = F("rating") + value
-            post.save(update_fields=["rating"])
-            post.refresh_from_db(fields=["rating"])
-            return Response({"rating": post.rating, "status": "voted"})
+        return vote_response(votes.POST, pk, request)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(RowListMixin, viewsets.ModelViewSet):
     serializer_class = CommentSerializer
+    row_serializer_class = CommentRows
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly, IsAuthorOrAdmin]
+    pagination_class = FeedPagination
     filterset_fields = ("topic", "post", "author")
     search_fields = ("body", "author__username")
     ordering_fields = ("created_at",)
+    query_budgets = {"list": 3, "retrieve": 2, "create": 3, "update": 4, "partial_update": 4, "destroy": 3}
 
     def get_queryset(self):
-        return (Comment.objects
-                .select_related("author", "topic", "post"))
+        return self.get_serializer_class().optimize_queryset(
+            Comment.objects.all(), self.request, keep=self.ordering_fields)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
 class TagCloudAPIView(APIView):
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
+
+    @cache_response(Tag, TopicTag)
     def get(self, request):
-        data = (Tag.objects
-                .annotate(topics=Count("topics"))
-                .values("slug", "name", "topics")
-                .order_by("-topics"))
-        return Response(list(data))
-    
+        return Response([{"slug": slug, "name": name, "topics": n} for slug, name, n in tag_cloud_rows()])
+
+
+def tag_cloud_rows():
+    # Имя "topics" занято обратной связью M2M, поэтому аннотация называется иначе.
+    return (Tag.objects
+            .annotate(topics_count=Count("topics"))
+            .values_list("slug", "name", "topics_count")
+            .order_by("-topics_count", "slug"))
+
+
 class TagSlugsAPIView(APIView):
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
+
     def get(self, request):
         slugs = Tag.objects.values_list("slug", flat=True).order_by("slug")
-        return Response(list(slugs))
\ No newline at end of file
+        return Response(list(slugs))
+
+
+class SearchAPIView(APIView):
+    """
+    Полнотекстовый поиск по темам и сообщениям: ``?q=``, ``?kind=topic|post``, ``?page=``.
+    Результаты ранжированы, сниппеты размечены <mark>; COUNT не выполняется.
+    """
+    permission_classes = [permissions.AllowAny]
+    page_size = 20
+    query_budget = 2
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        kind = request.query_params.get("kind") or None
+        if kind is not None and kind not in search.KINDS:
+            return Response({"detail": "kind должен быть topic или post."}, status=400)
+        try:
+            page = max(1, int(request.query_params.get("page", 1)))
+        except ValueError:
+            page = 1
+
+        rows = search.search(query, kind=kind, limit=self.page_size + 1,
+                             offset=(page - 1) * self.page_size)
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(url, "page", page + 1) if len(rows) > self.page_size else None
+        if page == 1:
+            prev_url = None
+        elif page == 2:
+            prev_url = remove_query_param(url, "page")
+        else:
+            prev_url = replace_query_param(url, "page", page - 1)
+        return Response({"next": next_url, "previous": prev_url, "results": rows[:self.page_size]})
+
+
+class ExportAPIView(APIView):
+    """
+    Выгрузка набора (``topics``, ``posts``, ``comments``, ``topic-votes``, ``post-votes``)
+    для сотрудников: ``?fmt=ndjson|csv``, ``?gzip=1``, ``?since_id=`` и фильтры TopicFilter.
+    Верхняя граница id — в заголовке ``X-Export-Max-Id``: это ``since_id`` следующей выгрузки.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 3
+
+    def get(self, request, dataset):
+        fmt = request.query_params.get("fmt", "ndjson")
+        compress = request.query_params.get("gzip") in ("1", "true")
+        try:
+            since_id = int(request.query_params.get("since_id", 0))
+        except ValueError:
+            return Response({"detail": "since_id должен быть целым числом."}, status=400)
+        if fmt not in export.FORMATS:
+            return Response({"detail": "fmt должен быть одним из: " + ", ".join(export.FORMATS)}, status=400)
+        try:
+            job = export.Export(dataset, request.query_params, since_id=max(0, since_id))
+        except export.ExportError as exc:
+            return Response({"detail": exc.detail}, status=400)
+
+        blocks = export.encoded(job.lines(fmt))
+        if compress:
+            blocks = export.gzipped(blocks)
+        response = StreamingHttpResponse(
+            blocks, content_type="application/gzip" if compress else f"{export.FORMATS[fmt]}; charset=utf-8")
+        name = export.filename(dataset, fmt, job.since_id, job.max_id, gzip=compress)
+        response["Content-Disposition"] = f'attachment; filename="{name}"'
+        response["X-Export-Max-Id"] = str(job.max_id)
+        return response
+
+
+class UploadSessionListAPIView(APIView):
+    """Создание сессии загрузки вложения по частям: пост, имя, размер и, по желанию, sha256 файла."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 8
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = uploads.create(request.user, **serializer.validated_data)
+        except uploads.UploadError as exc:
+            return Response({"detail": exc.detail}, status=exc.status)
+        return Response(UploadSessionSerializer(session, context={"request": request}).data,
+                        status=status.HTTP_201_CREATED)
+
+
+class UploadSessionAPIView(APIView):
+    """Состояние загрузки (принятые части — для возобновления) и её отмена."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 7
+
+    def get_session(self, request, pk):
+        return get_object_or_404(UploadSession.objects.select_related("attachment__blob"),
+                                 pk=pk, created_by=request.user)
+
+    def get(self, request, pk):
+        session = self.get_session(request, pk)
+        return Response(UploadSessionSerializer(session, context={"request": request}).data)
+
+    def delete(self, request, pk):
+        uploads.discard(self.get_session(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadChunkAPIView(APIView):
+    """
+    ``PUT`` части загрузки: тело — байты части как есть, ``X-Chunk-SHA256`` — её SHA-256.
+    Парсеры DRF тело не трогают: оно читается из потока блоками (qa.uploads).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 7
+
+    def put(self, request, pk, index):
+        session = get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return Response({"detail": "Нужен заголовок Content-Length."}, status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            chunk, created = uploads.put_chunk(session, index, request.stream, length,
+                                               request.headers.get("X-Chunk-SHA256"))
+        except uploads.UploadError as exc:
+            return Response({"detail": exc.detail}, status=exc.status)
+        return Response({"index": chunk.index, "size": chunk.size, "sha256": chunk.sha256},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class UploadCompleteAPIView(APIView):
+    """Сборка частей во вложение к посту; повторный вызов возвращает то же вложение."""
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 14
+
+    def post(self, request, pk):
+        get_object_or_404(UploadSession, pk=pk, created_by=request.user)
+        try:
+            attachment, created = uploads.complete(pk)
+        except uploads.UploadError as exc:
+            return Response({"detail": exc.detail}, status=exc.status)
+        return Response(AttachmentSerializer(attachment, context={"request": request}).data,
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+@require_safe
+def attachment_download(request, pk):
+    """Файл вложения: ETag по SHA-256, Range или передача веб-серверу (qa.blobs)."""
+    attachment = get_object_or_404(Attachment.objects.select_related("blob"), pk=pk, blob__isnull=False)
+    return blobs.serve(request, attachment)
@@ -0,0 +1,182 @@
+"""
+Голосование за темы и сообщения.
+
+``apply_vote`` выполняет голос/переключение/отмену и изменение рейтинга
+атомарно. На PostgreSQL это один SQL-запрос (CTE с изменяющими данные
+подзапросами и ON CONFLICT), на остальных СУБД — короткая транзакция с
+блокировкой строки голоса. В режиме write-behind (qa.ratings) пишется только
+строка голоса, а дельта рейтинга уходит в буфер.
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import Http404
+
+from accounts import reputation
+
+from . import caching, metrics, ratings
+from .models import Topic, Post, TopicVote, PostVote
+
+VoteResult = namedtuple("VoteResult", "status rating delta topic_id author_id created_at")
+
+VOTED = "voted"
+SWITCHED = "switched"
+UNVOTED = "unvoted"
+
+# Сколько раз повторять голос, проигравший гонку за вставку первой строки.
+MAX_ATTEMPTS = 5
+
+VOTES = metrics.counter("questudio_votes_total", "Применённые голоса по типу объекта и исходу.",
+                        ("kind", "status"))
+
+
+class VoteRejected(Exception):
+    pass
+
+
+class VoteKind:
+    """Описание голосуемой сущности: модель, модель голоса и имя внешнего ключа."""
+
+    def __init__(self, name, target, vote, fk, own_message, topic_column=None):
+        self.name = name
+        self.target = target
+        self.vote = vote
+        self.fk = fk
+        self.own_message = own_message
+        # Колонка с id темы (для сообщений): туда же применяется post_rating_sum.
+        self.topic_column = topic_column
+
+    @property
+    def target_table(self):
+        return self.target._meta.db_table
+
+    @property
+    def vote_table(self):
+        return self.vote._meta.db_table
+
+
+TOPIC = VoteKind(ratings.TOPIC, Topic, TopicVote, "topic", "Нельзя голосовать за свою тему.")
+POST = VoteKind(ratings.POST, Post, PostVote, "post", "Нельзя голосовать за своё сообщение.",
+                topic_column="topic_id")
+
+
+def delta_for(status, value):
+    return {VOTED: value, SWITCHED: 2 * value, UNVOTED: -value}[status]
+
+
+def apply_vote(kind, object_id, user_id, value):
+    """Применяет голос ``value`` (-1 или 1) пользователя; возвращает VoteResult."""
+    if value not in (-1, 1):
+        raise VoteRejected("value должен быть -1 или 1.")
+    write_behind = ratings.is_enabled()
+    apply = _apply_postgres if connection.vendor == "postgresql" else _apply_orm
+    with transaction.atomic():
+        for _ in range(MAX_ATTEMPTS):
+            result = apply(kind, object_id, user_id, value, write_rating=not write_behind)
+            if result is not None:
+                break
+        else:
+            raise VoteRejected("Не удалось применить голос, повторите попытку.")
+        if not write_behind:
+            # В режиме write-behind репутация начисляется при сбросе буфера.
+            reputation.record(result.author_id, result.created_at, rating=result.delta)
+    caching.bump(kind.vote)
+    VOTES.inc(kind=kind.name, status=result.status)
+    if write_behind:
+        buffer = ratings.get_write_behind()
+        buffer.add(kind.name, object_id, result.delta)
+        # result.rating здесь — записанное значение, без буферизованных дельт.
+        return result._replace(rating=buffer.merged(kind.name, object_id, result.rating))
+    Topic.objects.refresh_hot_score(result.topic_id)
+    return result
+
+
+def _apply_postgres(kind, object_id, user_id, value, write_rating=True):
+    topic_expr = f"t.{kind.topic_column}" if kind.topic_column else "t.id"
+    rating_ctes = ""
+    if write_rating:
+        rating_ctes = (
+            f", bump AS (UPDATE {kind.target_table} t SET rating = t.rating + c.delta "
+            "            FROM change c, allowed a WHERE t.id = a.id "
+            "            RETURNING t.rating, c.delta, a.topic_id)"
+        )
+        if kind.topic_column:
+            rating_ctes += (
+                f", parent AS (UPDATE {Topic._meta.db_table} p "
+                "SET post_rating_sum = p.post_rating_sum + b.delta "
+                "FROM bump b WHERE p.id = b.topic_id RETURNING p.id)"
+            )
+    sql = (
+        f"WITH target AS (SELECT t.id, t.author_id, t.rating, t.created_at, {topic_expr} AS topic_id "
+        f"                FROM {kind.target_table} t WHERE t.id = %(obj)s), "
+        "allowed AS (SELECT id, topic_id FROM target WHERE author_id <> %(user)s), "
+        f"old AS (SELECT v.id, v.value FROM {kind.vote_table} v JOIN allowed a ON v.{kind.fk}_id = a.id "
+        "         WHERE v.user_id = %(user)s FOR UPDATE OF v), "
+        f"del AS (DELETE FROM {kind.vote_table} v USING old "
+        "         WHERE v.id = old.id AND old.value = %(value)s RETURNING v.id), "
+        f"upd AS (UPDATE {kind.vote_table} v SET value = %(value)s FROM old "
+        "         WHERE v.id = old.id AND old.value <> %(value)s RETURNING v.id), "
+        f"ins AS (INSERT INTO {kind.vote_table} ({kind.fk}_id, user_id, value) "
+        "         SELECT id, %(user)s, %(value)s FROM allowed WHERE NOT EXISTS (SELECT 1 FROM old) "
+        f"         ON CONFLICT ({kind.fk}_id, user_id) DO NOTHING RETURNING id), "
+        "outcome AS (SELECT CASE "
+        f"    WHEN EXISTS (SELECT 1 FROM del) THEN '{UNVOTED}' "
+        f"    WHEN EXISTS (SELECT 1 FROM upd) THEN '{SWITCHED}' "
+        f"    WHEN EXISTS (SELECT 1 FROM ins) THEN '{VOTED}' END AS status), "
+        "change AS (SELECT status, CASE status "
+        f"    WHEN '{UNVOTED}' THEN -%(value)s WHEN '{SWITCHED}' THEN 2 * %(value)s "
+        "    ELSE %(value)s END AS delta FROM outcome WHERE status IS NOT NULL)"
+        f"{rating_ctes} "
+        "SELECT (SELECT author_id FROM target), (SELECT status FROM outcome), "
+        f"       (SELECT rating FROM {'bump' if write_rating else 'target'}), (SELECT topic_id FROM target), "
+        "       (SELECT created_at FROM target)"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {"obj": object_id, "user": user_id, "value": value})
+        author_id, status, rating, topic_id, created_at = cursor.fetchone()
+    if author_id is None:
+        raise Http404
+    if author_id == user_id:
+        raise VoteRejected(kind.own_message)
+    if status is None:
+        # Параллельный запрос того же пользователя успел вставить голос — повторяем.
+        return None
+    return VoteResult(status, rating, delta_for(status, value), topic_id, author_id, created_at)
+
+
+def _apply_orm(kind, object_id, user_id, value, write_rating=True):
+    fields = ["author_id", "created_at"] + ([kind.topic_column] if kind.topic_column else [])
+    with transaction.atomic():
+        row = kind.target.objects.filter(pk=object_id).values_list(*fields).first()
+        if row is None:
+            raise Http404
+        if row[0] == user_id:
+            raise VoteRejected(kind.own_message)
+        topic_id = row[2] if kind.topic_column else object_id
+
+        vote = (kind.vote.objects.select_for_update()
+                .filter(**{f"{kind.fk}_id": object_id, "user_id": user_id})
+                .first())
+        if vote is None:
+            try:
+                with transaction.atomic():
+                    kind.vote.objects.create(**{f"{kind.fk}_id": object_id, "user_id": user_id, "value": value})
+            except IntegrityError:
+                return None
+            status = VOTED
+        elif vote.value == value:
+            vote.delete()
+            status = UNVOTED
+        else:
+            vote.value = value
+            vote.save(update_fields=["value"])
+            status = SWITCHED
+
+        delta = delta_for(status, value)
+        if write_rating:
+            kind.target.objects.filter(pk=object_id).update(rating=F("rating") + delta)
+            if kind.topic_column:
+                Topic.objects.on_post_rerated(topic_id, delta)
+        rating = kind.target.objects.filter(pk=object_id).values_list("rating", flat=True).get()
+    return VoteResult(status, rating, delta, topic_id, row[0], row[1])